@@ -0,0 +1 @@
+"""Sistema de revisão de estudos (ver cli.py para a linha de comando)."""
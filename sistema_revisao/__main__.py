@@ -0,0 +1,11 @@
+"""Permite `python -m sistema_revisao <comando>` (ver cli.py)."""
+
+import os
+import sys
+
+# Os módulos do sistema se importam pelo nome (import app, import banco...)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cli import main
+
+main()
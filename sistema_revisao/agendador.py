@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Balanceamento da carga diária de revisões ("fuzz and smooth").
+
+O SM-2 agenda cada cartão para exatamente hoje + intervalo, então cartões
+estudados juntos voltam todos no mesmo dia. Aqui, dentro de uma janela de
+tolerância em torno do intervalo calculado, escolhemos o dia com menos
+revisões já agendadas para o usuário.
+
+A carga por dia vem de um histograma em memória por usuário, carregado
+de `card_state` e atualizado a cada agendamento. Cada processo tem o seu:
+o histograma guarda a versão de dados do usuário (`seq_alteracoes`) de
+quando foi lido e é recarregado quando ela muda por uma escrita que ele
+não acompanhou (de outro processo ou worker). Os dias que já passaram são
+descartados na virada do dia.
+
+Uso (simulação comparando o agendamento fixo com o balanceado):
+    python agendador.py
+"""
+
+import random
+import threading
+from datetime import datetime, timedelta
+
+from consultas import executar
+
+# Janela de tolerância: ±10% do intervalo, no mínimo 1 e no máximo 7 dias.
+# Intervalos curtos (até 2 dias) não são alterados.
+TOLERANCIA_RELATIVA = 0.1
+TOLERANCIA_MAXIMA = 7
+INTERVALO_MINIMO_AJUSTE = 3
+
+
+def tolerancia(intervalo):
+    """Quantos dias o agendamento pode se afastar do intervalo calculado."""
+    if intervalo < INTERVALO_MINIMO_AJUSTE:
+        return 0
+    return min(TOLERANCIA_MAXIMA, max(1, int(round(intervalo * TOLERANCIA_RELATIVA))))
+
+
+def escolher_intervalo(intervalo, carga):
+    """
+    Escolhe o intervalo menos carregado dentro da janela de tolerância.
+
+    Args:
+        intervalo: Intervalo calculado pelo SM-2 (dias)
+        carga: Função que recebe um intervalo (dias a partir de hoje) e
+            retorna quantas revisões já estão agendadas para aquele dia
+
+    Returns:
+        Intervalo escolhido. Em caso de empate, o mais próximo do original.
+    """
+    t = tolerancia(intervalo)
+    candidatos = range(max(1, intervalo - t), intervalo + t + 1)
+    return min(candidatos, key=lambda dias: (carga(dias), abs(dias - intervalo), dias))
+
+
+class _Carga:
+    """Histograma de um usuário: contagens por dia, versão lida e dia da última limpeza."""
+
+    __slots__ = ('contagens', 'versao', 'dia')
+
+    def __init__(self, contagens, versao, dia):
+        self.contagens = contagens
+        self.versao = versao
+        self.dia = dia
+
+    def podar(self, hoje):
+        """Descarta os dias anteriores a `hoje` (uma vez por dia)."""
+        if self.dia != hoje:
+            for data in [data for data in self.contagens if data < hoje]:
+                del self.contagens[data]
+            self.dia = hoje
+
+
+class HistogramaCarga:
+    """Quantidade de revisões agendadas por dia, por usuário, em memória."""
+
+    def __init__(self):
+        self._cargas = {}
+        self._lock = threading.Lock()
+
+    def _carregar(self, cursor, usuario_id, versao, hoje):
+        cursor.execute('''
+            SELECT data_revisao, COUNT(*) FROM card_state
+            WHERE usuario_id = ? AND data_revisao >= ?
+            GROUP BY data_revisao
+        ''', (usuario_id, hoje))
+        return _Carga(dict(cursor.fetchall()), versao, hoje)
+
+    def escolher_data(self, cursor, usuario_id, intervalo):
+        """
+        Escolhe a data da próxima revisão balanceando a carga do usuário.
+
+        Returns:
+            Tupla (data 'YYYY-MM-DD', intervalo efetivo em dias)
+        """
+        versao = executar(cursor, 'versao_dados', (usuario_id,)).fetchone()
+        versao = versao[0] if versao else 0
+        hoje = datetime.now()
+        dia = hoje.strftime("%Y-%m-%d")
+        with self._lock:
+            carga_usuario = self._cargas.get(usuario_id)
+            if carga_usuario is None or carga_usuario.versao != versao:
+                carga_usuario = self._cargas[usuario_id] = self._carregar(cursor, usuario_id, versao, dia)
+            carga_usuario.podar(dia)
+            contagens = carga_usuario.contagens
+
+            def carga(dias):
+                return contagens.get((hoje + timedelta(days=dias)).strftime("%Y-%m-%d"), 0)
+
+            escolhido = escolher_intervalo(intervalo, carga)
+        return (hoje + timedelta(days=escolhido)).strftime("%Y-%m-%d"), escolhido
+
+    def mover(self, usuario_id, data_antiga, data_nova, versao=None):
+        """
+        Registra que um cartão saiu de `data_antiga` e foi para `data_nova`.
+
+        `versao` é a versão de dados gravada junto com o agendamento. Se o
+        histograma estava na versão imediatamente anterior, nenhuma outra
+        escrita aconteceu no meio e ele passa a valer para `versao`; senão,
+        é descartado e relido do banco no próximo uso. Sem `versao`, só a
+        contagem é atualizada e a versão diferente força a releitura.
+        """
+        with self._lock:
+            carga_usuario = self._cargas.get(usuario_id)
+            if carga_usuario is None:
+                # Ainda não carregado: será lido do banco quando necessário
+                return
+            if versao is not None:
+                if carga_usuario.versao != versao - 1:
+                    del self._cargas[usuario_id]
+                    return
+                carga_usuario.versao = versao
+            carga_usuario.podar(datetime.now().strftime("%Y-%m-%d"))
+            contagens = carga_usuario.contagens
+            if data_antiga and contagens.get(data_antiga, 0) > 0:
+                contagens[data_antiga] -= 1
+                if contagens[data_antiga] == 0:
+                    del contagens[data_antiga]
+            if data_nova:
+                contagens[data_nova] = contagens.get(data_nova, 0) + 1
+
+    def descartar(self, usuario_id):
+        """Descarta o histograma do usuário (recarregado no próximo uso)."""
+        with self._lock:
+            self._cargas.pop(usuario_id, None)
+
+
+histograma_carga = HistogramaCarga()
+
+
+def simular(balancear, dias=180, semente=42):
+    """
+    Simula um usuário que cadastra cartões em lotes irregulares.
+
+    A quantidade de cartões novos por dia varia de 0 a 60 (mesma sequência
+    para a mesma semente nos dois modos). Cada revisão recebe uma quality
+    aleatória e é reagendada com o AlgoritmoAdaptativo.
+
+    Returns:
+        Lista com a quantidade de revisões em cada dia.
+    """
+    from docs.algoritmo_adaptativo import AlgoritmoAdaptativo
+
+    algoritmo = AlgoritmoAdaptativo()
+    aleatorio = random.Random(semente)
+    novos = random.Random(semente + 1)
+    agenda = {}  # dia -> lista de (ef, interval, repetition)
+    carga_diaria = []
+
+    for dia in range(dias):
+        cartoes = agenda.pop(dia, []) + [(2.5, 1, 0)] * novos.choice((0, 0, 10, 20, 40, 60))
+        carga_diaria.append(len(cartoes))
+        for ef, interval, repetition in cartoes:
+            quality = aleatorio.choice((2, 3, 4, 4, 5, 5))
+            ef, interval, repetition = algoritmo.calcular_proxima_revisao(
+                quality=quality, nivel_confianca=3, ef=ef, interval=interval, repetition=repetition
+            )
+            if balancear:
+                interval = escolher_intervalo(interval, lambda d: len(agenda.get(dia + d, ())))
+            agenda.setdefault(dia + interval, []).append((ef, interval, repetition))
+    return carga_diaria
+
+
+def pico_sobre_media(carga_diaria, descartar=30):
+    """Razão entre o pico e a média da carga, ignorando o período de aquecimento."""
+    trecho = carga_diaria[descartar:]
+    media = sum(trecho) / len(trecho)
+    return max(trecho) / media if media else 0.0
+
+
+def main():
+    """Compara o agendamento fixo com o balanceado."""
+    print("Simulação: lotes de 0 a 60 cartões novos por dia, 180 dias")
+    for balancear, nome in ((False, "Fixo (hoje + intervalo)"), (True, "Balanceado")):
+        carga = simular(balancear)
+        trecho = carga[30:]
+        print(f"{nome:25} pico={max(trecho):4d}  média={sum(trecho) / len(trecho):7.1f}  "
+              f"pico/média={pico_sobre_media(carga):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Sequência de alterações por usuário (sincronização incremental).
+
+Cada usuário tem um contador `usuarios.seq_alteracoes` que só cresce.
+Toda transação que insere ou altera estudos/revisões do usuário avança o
+contador uma vez e grava, em `alteracoes`, a nova sequência de cada
+registro tocado. A tabela guarda só a última sequência de cada registro,
+então cresce com o número de estudos/revisões, não com o de eventos.
+
+Um cliente que já tem os dados até a sequência N pede
+`/api/sync?since=N` e recebe apenas o que mudou depois disso (varredura
+do índice (usuario_id, seq)).
+"""
+
+import json
+import sqlite3
+
+LIMITE_SYNC = 1000
+
+
+def criar_tabela_alteracoes(cursor):
+    """
+    Cria a tabela `alteracoes` e o contador por usuário (idempotente).
+
+    Na primeira execução, registra todos os estudos e revisões existentes
+    na sequência 1, para que `since=0` devolva o estado completo.
+    """
+    try:
+        cursor.execute("ALTER TABLE usuarios ADD COLUMN seq_alteracoes INTEGER DEFAULT 0")
+    except sqlite3.OperationalError:
+        pass
+
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alteracoes'")
+    existia = cursor.fetchone() is not None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS alteracoes (
+        usuario_id INTEGER NOT NULL,
+        tabela TEXT NOT NULL,
+        registro_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        PRIMARY KEY (usuario_id, tabela, registro_id)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_alteracoes_seq
+    ON alteracoes(usuario_id, seq)
+    ''')
+    if existia:
+        return 0
+
+    cursor.execute('''
+        INSERT OR IGNORE INTO alteracoes (usuario_id, tabela, registro_id, seq)
+        SELECT usuario_id, 'estudos', id, 1 FROM estudos WHERE usuario_id IS NOT NULL
+    ''')
+    migrados = cursor.rowcount
+    cursor.execute('''
+        INSERT OR IGNORE INTO alteracoes (usuario_id, tabela, registro_id, seq)
+        SELECT e.usuario_id, 'revisoes', r.id, 1
+        FROM revisoes r JOIN estudos e ON r.id_estudo = e.id
+        WHERE e.usuario_id IS NOT NULL
+    ''')
+    migrados += cursor.rowcount
+    cursor.execute('''
+        UPDATE usuarios SET seq_alteracoes = 1
+        WHERE COALESCE(seq_alteracoes, 0) = 0
+          AND id IN (SELECT DISTINCT usuario_id FROM alteracoes)
+    ''')
+    return migrados
+
+
+def avancar_sequencia(cursor, usuario_id):
+    """
+    Avança o contador do usuário e devolve a nova sequência, para quem
+    grava as linhas de `alteracoes` em lote (INSERT ... SELECT). Não faz commit.
+    """
+    cursor.execute('''
+        UPDATE usuarios SET seq_alteracoes = COALESCE(seq_alteracoes, 0) + 1
+        WHERE id = ?
+        RETURNING seq_alteracoes
+    ''', (usuario_id,))
+    return cursor.fetchone()[0]
+
+
+def registrar_alteracoes(cursor, usuario_id, registros):
+    """
+    Avança a sequência do usuário e a atribui aos registros alterados.
+
+    Não faz commit: deve rodar na mesma transação da escrita, sob a trava
+    de escrita do app.
+
+    Args:
+        registros: Pares (tabela, id), com tabela 'estudos' ou 'revisoes'.
+
+    Returns:
+        A nova sequência do usuário.
+    """
+    seq = avancar_sequencia(cursor, usuario_id)
+    cursor.executemany('''
+        INSERT INTO alteracoes (usuario_id, tabela, registro_id, seq)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(usuario_id, tabela, registro_id) DO UPDATE SET seq = excluded.seq
+    ''', [(usuario_id, tabela, registro_id, seq) for tabela, registro_id in registros])
+    return seq
+
+
+def alteracoes_desde(cursor, usuario_id, desde=0, limite=LIMITE_SYNC):
+    """
+    Estudos e revisões do usuário alterados depois da sequência `desde`.
+
+    Returns:
+        Dict com `seq` (sequência atual), `estudos`, `revisoes` e `mais`
+        (True se o limite foi atingido; o cliente repete com since=`ate`).
+    """
+    cursor.execute('SELECT COALESCE(seq_alteracoes, 0) FROM usuarios WHERE id = ?', (usuario_id,))
+    row = cursor.fetchone()
+    seq_atual = row[0] if row else 0
+
+    cursor.execute('''
+        SELECT tabela, registro_id, seq FROM alteracoes
+        WHERE usuario_id = ? AND seq > ?
+        ORDER BY seq
+        LIMIT ?
+    ''', (usuario_id, desde, limite + 1))
+    linhas = cursor.fetchall()
+    mais = len(linhas) > limite
+    if mais:
+        # Não corta uma transação ao meio: para antes da última sequência lida
+        ultima = linhas[limite][2]
+        linhas = [l for l in linhas[:limite] if l[2] < ultima] or linhas[:limite]
+    ate = linhas[-1][2] if (mais and linhas) else seq_atual
+
+    ids_estudos = [registro_id for tabela, registro_id, _ in linhas if tabela == 'estudos']
+    ids_revisoes = [registro_id for tabela, registro_id, _ in linhas if tabela == 'revisoes']
+
+    estudos = []
+    if ids_estudos:
+        cursor.execute(f'''
+            SELECT id, materia, topico, data_estudo, COALESCE(tipo_conteudo, 'simples'), pergunta, resposta, opcoes
+            FROM vw_estudos WHERE id IN ({','.join('?' * len(ids_estudos))})
+        ''', ids_estudos)
+        for id_estudo, materia, topico, data_estudo, tipo_conteudo, pergunta, resposta, opcoes in cursor.fetchall():
+            try:
+                opcoes = json.loads(opcoes) if opcoes else None
+            except ValueError:
+                opcoes = None
+            estudos.append({
+                'id': id_estudo, 'materia': materia, 'topico': topico, 'data_estudo': data_estudo,
+                'tipo_conteudo': tipo_conteudo, 'pergunta': pergunta, 'resposta': resposta, 'opcoes': opcoes
+            })
+
+    revisoes = []
+    if ids_revisoes:
+        cursor.execute(f'''
+            SELECT id, id_estudo, data_revisao, tipo, feito, quality, nivel_confianca, ef, interval, repetition
+            FROM revisoes WHERE id IN ({','.join('?' * len(ids_revisoes))})
+        ''', ids_revisoes)
+        colunas = ('id', 'id_estudo', 'data_revisao', 'tipo', 'feito', 'quality',
+                   'nivel_confianca', 'ef', 'interval', 'repetition')
+        revisoes = [dict(zip(colunas, row)) for row in cursor.fetchall()]
+
+    return {'seq': ate, 'desde': desde, 'mais': mais, 'estudos': estudos, 'revisoes': revisoes}
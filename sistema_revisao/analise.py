@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Desempenho por matéria a partir das avaliações registradas.
+
+O bloco "Desempenho por matéria" do dashboard só contava revisões
+concluídas. Aqui cada matéria recebe, em uma única consulta agrupada
+('analise_materias'):
+
+- taxa de acerto: avaliações com quality >= 3, incluindo as arquivadas
+- confiança média (1 a 5)
+- calibração: a confiança vira uma probabilidade esperada de acerto
+  ((confiança - 1) / 4) e é comparada com o acerto real de cada resposta:
+  excesso de confiança (média esperada - taxa real) e Brier score
+- mediana do tempo de resposta (ROW_NUMBER dentro da matéria)
+- EF médio e quantidade de cartões (card_state)
+
+Confiança, calibração e tempo só existem nas revisões ainda não
+arquivadas, então refletem o desempenho recente.
+
+O resultado fica no `cache_usuario` com a versão persistente dos dados
+('versao_dados') na chave: cada escrita do usuário (cadastro, edição,
+avaliação) muda a versão, e outros processos não reaproveitam um
+resultado antigo.
+
+Uso (benchmark com revisões simuladas):
+    python analise.py [revisoes]
+"""
+
+import time
+
+from cache import cache_usuario
+from consultas import executar
+
+
+def analisar_materias(cursor, usuario_id):
+    """
+    Indicadores de desempenho de cada matéria do usuário.
+
+    Returns:
+        Lista de dicts ordenada por matéria.
+    """
+    versao = executar(cursor, 'versao_dados', (usuario_id,)).fetchone()[0]
+    chave = ('analise_materias', versao)
+    analise = cache_usuario.obter(usuario_id, chave)
+    if analise is None:
+        executar(cursor, 'analise_materias', (usuario_id, usuario_id, usuario_id))
+        analise = cache_usuario.guardar(usuario_id, chave, [_formatar(row) for row in cursor.fetchall()])
+    return analise
+
+
+def _arredondar(valor, casas=2):
+    return None if valor is None else round(valor, casas)
+
+
+def _formatar(row):
+    (materia, avaliadas, acertos, com_confianca, confianca_media, acerto_confiantes,
+     confianca_esperada, brier, tempo_mediano, cartoes, ef_medio) = row
+    taxa_acerto = acertos / avaliadas if avaliadas else None
+    # Excesso de confiança: compara só as respostas que têm confiança registrada
+    excesso = (confianca_esperada - acerto_confiantes / com_confianca) if com_confianca else None
+    return {
+        'materia': materia,
+        'avaliadas': avaliadas,
+        'acertos': acertos,
+        'taxa_acerto': _arredondar(100 * taxa_acerto, 1) if taxa_acerto is not None else None,
+        'confianca_media': _arredondar(confianca_media),
+        'calibracao': {
+            'avaliadas': com_confianca,
+            'excesso_confianca': _arredondar(excesso, 3),
+            'brier': _arredondar(brier, 3),
+        },
+        'tempo_mediano': _arredondar(tempo_mediano, 1),
+        'cartoes': cartoes,
+        'ef_medio': _arredondar(ef_medio),
+    }
+
+
+def main():
+    import os
+    import sys
+    import tempfile
+
+    import banco
+    from consultas import conectar
+    from otimizador import gerar_sintetico
+
+    revisoes = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'analise.db')
+        gerar_sintetico(caminho, revisoes, usuarios=1)
+        banco.migrar(caminho)
+        conn = conectar(caminho)
+        cursor = conn.cursor()
+        # O banco simulado não tem confiança: sorteia pela quality
+        cursor.execute('''
+            UPDATE revisoes SET nivel_confianca = MIN(5, MAX(1, quality + (abs(random()) % 3) - 1))
+            WHERE quality IS NOT NULL
+        ''')
+        conn.commit()
+        usuario_id = cursor.execute('SELECT MIN(id) FROM usuarios').fetchone()[0]
+
+        inicio = time.perf_counter()
+        executar(cursor, 'desempenho_materias', (usuario_id, usuario_id)).fetchall()
+        contagem = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        analise = analisar_materias(cursor, usuario_id)
+        frio = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        analisar_materias(cursor, usuario_id)
+        quente = time.perf_counter() - inicio
+        conn.close()
+
+    print(f"{revisoes} revisões, {len(analise)} matéria(s)")
+    print(f"  desempenho_materias (só contagem): {contagem * 1000:8.1f} ms")
+    print(f"  analise_materias (consulta):       {frio * 1000:8.1f} ms")
+    print(f"  analise_materias (cache):          {quente * 1000:8.3f} ms")
+    for item in analise:
+        print(f"  {item['materia']}: acerto {item['taxa_acerto']}%, confiança {item['confianca_media']}, "
+              f"excesso {item['calibracao']['excesso_confianca']}, brier {item['calibracao']['brier']}, "
+              f"tempo mediano {item['tempo_mediano']}s, EF {item['ef_medio']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,167 +1,188 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response
+from flask import (Flask, render_template, request, jsonify, session, redirect, url_for, Response, abort, send_file,
+                   has_request_context)
 import sqlite3
 import hashlib
 import io
 import csv
 import json
+from functools import wraps
 from datetime import datetime, timedelta 
+from config import config
+from estado_cartoes import salvar_card_state
+from estudos import cadastrar_estudo, editar_estudo
+from dedup import IndiceDuplicatas
+from alteracoes import registrar_alteracoes, alteracoes_desde, LIMITE_SYNC
+from busca import buscar, LIMITE_BUSCA
+from cache import cache_usuario
+from analise import analisar_materias
+from atividade import calcular_atividade, descrever_ultima_atividade, series_progresso
+from baralhos import assinar_baralho, listar_baralhos, publicar_baralho
+from limites import montar_fila, obter_cota, registrar_servida, salvar_limites
+from midia import (LARGURAS_MINIATURA, MidiaInvalida, anexar_midia, caminho_blob, desanexar_midia, hash_valido,
+                   midias_por_revisao, obter_miniatura, tipo_se_permitido)
+from perfis import PADRAO, cache_perfis, salvar_perfil, remover_perfil, listar_perfis
+from previsao import calcular_previsao, DIAS_PREVISAO
+from graficos import TIPOS as TIPOS_GRAFICO, chave_grafico, obter_grafico
+from agendador import histograma_carga
+from consultas import conectar, executar, metricas
+import fragmentos
+from fragmentos import ConexaoDaThread, PoolFragmentos, espelhar_usuario
+import leitura
+from leitura import cursor_leitura
+from limitador import FilaCheia, FilaEscrita, LimitadorTaxa, ler_limites, somar_metricas
+from sessoes import ArmazemSessoes, InterfaceSessoes, carregar_preferencias, salvar_preferencias
+import banco
 app = Flask(__name__)
 app.secret_key = 'sua_chave_secreta_aqui'  # Alterar em produção
 
-# Conexão com o banco
-conn = sqlite3.connect('revisao_estudos.db', check_same_thread=False)
-cursor = conn.cursor()
-
-# Tabela de usuários
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS usuarios (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    nome TEXT NOT NULL,
-    email TEXT UNIQUE NOT NULL,
-    senha TEXT NOT NULL,
-    data_criacao TEXT DEFAULT CURRENT_TIMESTAMP
-)
-''')
-
-# Tabela de estudos
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS estudos (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    materia TEXT,
-    topico TEXT,
-    data_estudo TEXT,
-    usuario_id INTEGER,
-    FOREIGN KEY(usuario_id) REFERENCES usuarios(id)
-)
-''')
-
-# Tabela de revisões
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS revisoes (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    id_estudo INTEGER,
-    data_revisao TEXT,
-    tipo TEXT,
-    feito INTEGER DEFAULT 0,
-    ef REAL DEFAULT 2.5,
-    repetition INTEGER DEFAULT 0,
-    interval INTEGER DEFAULT 1,
-    FOREIGN KEY(id_estudo) REFERENCES estudos(id)
-)
-''')
-
-# Tabela de configurações de email
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS configuracoes_email (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    usuario_id INTEGER,
-    email_notificacao TEXT,
-    ativo INTEGER DEFAULT 1,
-    FOREIGN KEY(usuario_id) REFERENCES usuarios(id)
-)
-''')
-
-conn.commit()
-
-# Migração: adicionar coluna quality se não existir
-try:
-    cursor.execute('ALTER TABLE revisoes ADD COLUMN quality INTEGER')
-    conn.commit()
-    print("Migração: coluna 'quality' adicionada")
-except sqlite3.OperationalError:
-    # Coluna já existe, tudo bem
-    pass
-
-# Migração: adicionar coluna ef se não existir
-try:
-    cursor.execute("ALTER TABLE revisoes ADD COLUMN ef REAL DEFAULT 2.5")
-    conn.commit()
-    print("Migração: coluna 'ef' adicionada")
-except sqlite3.OperationalError:
-    # Coluna já existe
-    pass
-
-# Migração: adicionar coluna tempo_resposta (segundos) se não existir
-try:
-    cursor.execute("ALTER TABLE revisoes ADD COLUMN tempo_resposta INTEGER")
-    conn.commit()
-    print("Migração: coluna 'tempo_resposta' adicionada")
-except sqlite3.OperationalError:
-    # Coluna já existe
-    pass
-
-# Migração: adicionar coluna repetition se não existir
-try:
-    cursor.execute("ALTER TABLE revisoes ADD COLUMN repetition INTEGER DEFAULT 0")
-    conn.commit()
-    print("Migração: coluna 'repetition' adicionada")
-except sqlite3.OperationalError:
-    # Coluna já existe
-    pass
-
-# Migração: adicionar coluna interval se não existir
-try:
-    cursor.execute("ALTER TABLE revisoes ADD COLUMN interval INTEGER DEFAULT 1")
-    conn.commit()
-    print("Migração: coluna 'interval' adicionada")
-except sqlite3.OperationalError:
-    # Coluna já existe
-    pass
-
-# Migração: adicionar coluna nivel_confianca se não existir
-try:
-    cursor.execute("ALTER TABLE revisoes ADD COLUMN nivel_confianca INTEGER")
-    conn.commit()
-    print("Migração: coluna 'nivel_confianca' adicionada")
-except sqlite3.OperationalError:
-    # Coluna já existe
-    pass
-
-# Migração: adicionar colunas em estudos se não existirem
-try:
-    cursor.execute("ALTER TABLE estudos ADD COLUMN tipo_conteudo TEXT")
-    conn.commit()
-    print("Migração: coluna 'tipo_conteudo' adicionada em estudos")
-except sqlite3.OperationalError:
-    pass
+# Modo offline (PWA): cartões pré-carregados e tamanho máximo do lote sincronizado
+CARTOES_OFFLINE = 50
+CARTOES_OFFLINE_MAX = 200
+DIAS_OFFLINE = 7
+LOTE_SYNC_MAX = 500
 
-try:
-    cursor.execute("ALTER TABLE estudos ADD COLUMN pergunta TEXT")
-    conn.commit()
-    print("Migração: coluna 'pergunta' adicionada em estudos")
-except sqlite3.OperationalError:
-    pass
+# Conexão com o banco (escrita), aberta por abrir_conexao().
+# Rotas de leitura usam conexões por thread (leitura.py)
+conn = None
+cursor = None
 
-try:
-    cursor.execute("ALTER TABLE estudos ADD COLUMN resposta TEXT")
-    conn.commit()
-    print("Migração: coluna 'resposta' adicionada em estudos")
-except sqlite3.OperationalError:
-    pass
+# Modo fragmentado (fragmentos.py): o banco principal é o catálogo de contas,
+# e `conn`/`cursor` encaminham para a conexão vinculada à thread da requisição
+conn_catalogo = None
+cursor_catalogo = None
+conexao_da_thread = ConexaoDaThread()
+pool_fragmentos = PoolFragmentos()
 
-try:
-    cursor.execute("ALTER TABLE estudos ADD COLUMN opcoes TEXT")
-    conn.commit()
-    print("Migração: coluna 'opcoes' adicionada em estudos")
-except sqlite3.OperationalError:
-    pass
+# SQLite aceita um escritor por vez: as rotas que usam a conexão global são
+# serializadas, com fila limitada (limitador.py): acima do limite, 503
+trava_escrita = FilaEscrita()
+limitador_taxa = LimitadorTaxa()
 
-# Migração: adicionar coluna modo_revisao em revisoes se não existir
-try:
-    cursor.execute("ALTER TABLE revisoes ADD COLUMN modo_revisao TEXT")
-    conn.commit()
-    print("Migração: coluna 'modo_revisao' adicionada em revisoes")
-except sqlite3.OperationalError:
-    pass
+def escrita_serializada(rota):
+    """
+    Executa a rota com acesso exclusivo à conexão global de escrita. No
+    modo fragmentado, com usuário na sessão, a conexão e a trava são as do
+    fragmento dele, e usuários de fragmentos diferentes gravam em paralelo.
+    """
+    @wraps(rota)
+    def wrapper(*args, **kwargs):
+        if fragmentos.ativo() and 'usuario_id' in session:
+            with pool_fragmentos.escrita(pool_fragmentos.indice(session['usuario_id'])) as fragmento, \
+                    conexao_da_thread.vincular(fragmento.conn, fragmento.cursor):
+                return rota(*args, **kwargs)
+        with trava_escrita, conexao_da_thread.vincular(conn_catalogo, cursor_catalogo):
+            return rota(*args, **kwargs)
+    return wrapper
+
+def limitar_taxa(rota=None, custo=None):
+    """
+    Aplica o limite de LIMITES_TAXA da rota (pelo nome da função), por
+    usuário da sessão ou, sem login, por IP. Sem token: 429 com Retry-After.
+    Vem antes de escrita_serializada, para que a requisição rejeitada não
+    entre na fila de escrita. `custo` (opcional) devolve quantos tokens a
+    requisição gasta, ex.: o número de itens de um lote.
+    """
+    if rota is None:
+        return lambda rota: limitar_taxa(rota, custo)
+
+    @wraps(rota)
+    def wrapper(*args, **kwargs):
+        identidade = session.get('usuario_id') or f'ip:{request.remote_addr}'
+        retry_after = limitador_taxa.verificar(rota.__name__, identidade, custo() if custo else 1)
+        if retry_after is not None:
+            return resposta_sobrecarga('Muitas requisições; tente novamente em instantes', 429, retry_after)
+        return rota(*args, **kwargs)
+    return wrapper
+
+def resposta_sobrecarga(mensagem, status, retry_after):
+    """Resposta 429/503 com Retry-After, em JSON para as rotas de API."""
+    if request.is_json or request.path.startswith(('/api/', '/marcar/')):
+        resposta = jsonify({'status': 'erro', 'mensagem': mensagem})
+    else:
+        resposta = Response(mensagem, mimetype='text/plain')
+    resposta.status_code = status
+    resposta.headers['Retry-After'] = str(retry_after)
+    return resposta
+
+@app.errorhandler(FilaCheia)
+def fila_cheia(erro):
+    return resposta_sobrecarga('Servidor ocupado; tente novamente em instantes', 503, erro.retry_after)
+
+def escrita_catalogo(rota):
+    """Como escrita_serializada, mas sempre no banco principal (contas: login e cadastro)."""
+    @wraps(rota)
+    def wrapper(*args, **kwargs):
+        with trava_escrita, conexao_da_thread.vincular(conn_catalogo, cursor_catalogo):
+            return rota(*args, **kwargs)
+    return wrapper
+
+def abrir_conexao(caminho):
+    """Abre a conexão global de escrita deste processo (no modo fragmentado, a do catálogo)."""
+    global conn, cursor, conn_catalogo, cursor_catalogo
+    conn_catalogo = conectar(caminho, check_same_thread=False)
+    cursor_catalogo = conn_catalogo.cursor()
+    if fragmentos.ativo():
+        conn, cursor = conexao_da_thread.conn, conexao_da_thread.cursor
+    else:
+        conn, cursor = conn_catalogo, cursor_catalogo
+
+def caminho_dados():
+    """Banco com os dados do usuário da sessão: o fragmento dele, se ativo, senão o principal."""
+    if fragmentos.ativo() and has_request_context() and 'usuario_id' in session:
+        return pool_fragmentos.preparar(pool_fragmentos.indice(session['usuario_id']))
+    return app.config['DATABASE_PATH']
+
+def compilar_templates():
+    """Compila todos os templates (ficam no cache do Jinja)."""
+    for nome in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(nome)
+
+def preaquecer():
+    """
+    Compila os templates e abre as conexões do processo, para que a
+    primeira requisição não pague esses custos.
+    """
+    compilar_templates()
+    if conn is None:
+        abrir_conexao(app.config['DATABASE_PATH'])
+    cursor_leitura()
+
+def create_app(config_name='default', migrar=True, conectar_banco=True):
+    """
+    Configura e retorna o app.
+
+    Args:
+        config_name: Chave de `config.config` ('development', 'production', 'default')
+        migrar: Se True, aplica as migrações do banco
+        conectar_banco: Se True, abre a conexão de escrita deste processo.
+            O launcher de produção usa False no processo mestre e abre as
+            conexões em cada worker, depois do fork.
+    """
+    app.config.from_object(config[config_name])
+    if not app.config.get('SECRET_KEY'):
+        raise RuntimeError("SECRET_KEY não configurada para o ambiente de produção")
+    app.secret_key = app.config['SECRET_KEY']
+    limitador_taxa.limites = ler_limites(app.config['LIMITES_TAXA'])
+    leitura.configurar(app.config['DATABASE_PATH'], caminho_dados if fragmentos.ativo() else None)
+    # Sessões no banco principal (catálogo), com só o identificador no cookie
+    app.session_interface = InterfaceSessoes(ArmazemSessoes(app.config['DATABASE_PATH']))
+
+    if migrar:
+        banco.migrar(app.config['DATABASE_PATH'])
+    if conectar_banco:
+        abrir_conexao(app.config['DATABASE_PATH'])
+    return app
 
 def hash_senha(senha):
     """Hash da senha usando SHA-256"""
     return hashlib.sha256(senha.encode()).hexdigest()
 
 # Função SM-2 mínima
-def sm2(quality, ef=2.5, interval=1, repetition=0):
+def sm2(quality, ef=2.5, interval=1, repetition=0, perfil=PADRAO):
     """
     quality: 0-5
+    perfil: parâmetros de agendamento (perfis.py): ef_min, ef_max,
+    intervalo_1 e intervalo_2
     retorna (ef, interval_days, repetition)
     """
     if quality < 3:
@@ -169,27 +190,39 @@ def sm2(quality, ef=2.5, interval=1, repetition=0):
         interval = 1
     else:
         if repetition == 0:
-            interval = 1
+            interval = perfil['intervalo_1']
         elif repetition == 1:
-            interval = 6
+            interval = perfil['intervalo_2']
         else:
             interval = max(1, round(interval * ef))
         repetition += 1
-    ef = max(1.3, ef + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)))
+    ef = max(perfil['ef_min'], ef + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)))
+    if perfil['ef_max'] is not None:
+        ef = min(perfil['ef_max'], ef)
     return ef, interval, repetition
 
 def schedule_next_review(id_estudo, current_ef, current_interval, current_repetition, quality):
     """
     Gera uma nova revisao (linha) com a data calculada pelo SM-2.
     """
-    ef, interval_days, repetition = sm2(quality, ef=current_ef, interval=current_interval, repetition=current_repetition)
-    proxima = (datetime.now() + timedelta(days=interval_days)).strftime("%Y-%m-%d")
-    # Descobrir o modo de revisão a partir do estudo
+    # Descobrir o modo de revisão, o dono e a matéria a partir do estudo
     try:
-        cursor.execute('SELECT COALESCE(tipo_conteudo, "simples") FROM estudos WHERE id = ?', (id_estudo,))
-        modo_revisao = cursor.fetchone()[0] or 'simples'
+        cursor.execute('SELECT COALESCE(tipo_conteudo, "simples"), usuario_id, COALESCE(materia, "") FROM estudos WHERE id = ?', (id_estudo,))
+        modo_revisao, usuario_id, materia = cursor.fetchone()
+        modo_revisao = modo_revisao or 'simples'
     except Exception:
-        modo_revisao = 'simples'
+        modo_revisao, usuario_id, materia = 'simples', None, ''
+    perfil = cache_perfis.obter(cursor, usuario_id, materia)
+    ef, interval_days, repetition = sm2(quality, ef=current_ef, interval=current_interval, repetition=current_repetition,
+                                        perfil=perfil)
+
+    if usuario_id is not None:
+        # Escolher o dia menos carregado dentro da tolerância do intervalo
+        proxima, interval_days = histograma_carga.escolher_data(cursor, usuario_id, interval_days)
+        cursor.execute('SELECT data_revisao FROM card_state WHERE id_estudo = ?', (id_estudo,))
+        anterior = cursor.fetchone()
+    else:
+        proxima = (datetime.now() + timedelta(days=interval_days)).strftime("%Y-%m-%d")
 
     try:
         cursor.execute('''
@@ -202,17 +235,25 @@ def schedule_next_review(id_estudo, current_ef, current_interval, current_repeti
             INSERT INTO revisoes (id_estudo, data_revisao, tipo, feito, ef, repetition, interval)
             VALUES (?, ?, ?, 0, ?, ?, ?)
         ''', (id_estudo, proxima, 'SM-2', ef, repetition, interval_days))
+    if usuario_id is not None:
+        nova_revisao_id = cursor.lastrowid
+        salvar_card_state(cursor, id_estudo, usuario_id, ef, interval_days, repetition, proxima, nova_revisao_id)
+        versao = registrar_alteracoes(cursor, usuario_id, [('revisoes', nova_revisao_id)])
     conn.commit()
+    if usuario_id is not None:
+        histograma_carga.mover(usuario_id, anterior[0] if anterior else None, proxima, versao)
+        cache_usuario.invalidar(usuario_id)
     return proxima
 
 @app.route('/export.csv')
 def export_csv():
     if 'usuario_id' not in session:
         return redirect(url_for('login'))
+    cursor = cursor_leitura()
     si = io.StringIO()
     cw = csv.writer(si)
     cw.writerow(['materia', 'topico', 'data_estudo'])
-    cursor.execute("SELECT materia, topico, data_estudo FROM estudos WHERE usuario_id = ?", (session['usuario_id'],))
+    cursor.execute("SELECT materia, topico, data_estudo FROM vw_estudos WHERE usuario_id = ?", (session['usuario_id'],))
     for row in cursor.fetchall():
         cw.writerow(row)
     output = si.getvalue()
@@ -223,45 +264,13 @@ def export_csv():
 def index():
     if 'usuario_id' not in session:
         return redirect(url_for('login'))
+    cursor = cursor_leitura()
     
     hoje = datetime.now().strftime("%Y-%m-%d")
     pre_exam = session.get('pre_exam_mode', False)
-    if pre_exam:
-        # Priorizar baixa confiança quando modo pré-prova ativo (usar coluna só no ORDER BY)
-        cursor.execute('''
-        SELECT 
-            revisoes.id,
-            estudos.materia,
-            estudos.topico,
-            revisoes.tipo,
-            revisoes.data_revisao,
-            COALESCE(estudos.tipo_conteudo, 'simples') as tipo_conteudo,
-            estudos.pergunta,
-            estudos.resposta,
-            estudos.opcoes
-        FROM revisoes
-        JOIN estudos ON revisoes.id_estudo = estudos.id
-        WHERE revisoes.feito = 0 AND estudos.usuario_id = ? AND revisoes.data_revisao <= ?
-        ORDER BY revisoes.data_revisao ASC, COALESCE(revisoes.nivel_confianca, 3) ASC
-        ''', (session['usuario_id'], hoje))
-    else:
-        cursor.execute('''
-        SELECT 
-            revisoes.id,
-            estudos.materia,
-            estudos.topico,
-            revisoes.tipo,
-            revisoes.data_revisao,
-            COALESCE(estudos.tipo_conteudo, 'simples') as tipo_conteudo,
-            estudos.pergunta,
-            estudos.resposta,
-            estudos.opcoes
-        FROM revisoes
-        JOIN estudos ON revisoes.id_estudo = estudos.id
-        WHERE revisoes.feito = 0 AND estudos.usuario_id = ? AND revisoes.data_revisao <= ?
-        ORDER BY revisoes.data_revisao ASC
-        ''', (session['usuario_id'], hoje))
-    revisoes = cursor.fetchall()
+    # Fila: revisões e cartões novos limitados pela cota do dia (limites.py)
+    # (modo pré-prova prioriza baixa confiança)
+    revisoes, cota = montar_fila(cursor, session['usuario_id'], hoje, pre_prova=pre_exam, hoje=hoje)
 
     hoje_dt = datetime.strptime(hoje, "%Y-%m-%d")
     urgentes = []
@@ -281,9 +290,15 @@ def index():
         else:
             proximas.append((rev_id, materia, topico, tipo, dias_restantes, tipo_conteudo, pergunta, resposta, opcoes))
 
-    return render_template('index.html', urgentes=urgentes, proximas=proximas, pre_exam=pre_exam)
+    # Mídias dos cartões da fila: só hash e tipo, os arquivos vêm de /midia
+    midias = midias_por_revisao(cursor, [rev[0] for rev in revisoes])
+
+    return render_template('index.html', urgentes=urgentes, proximas=proximas, pre_exam=pre_exam, cota=cota,
+                           midias=midias)
 
 @app.route('/login', methods=['GET', 'POST'])
+@limitar_taxa
+@escrita_catalogo
 def login():
     if request.method == 'POST':
         email = request.form['email']
@@ -295,9 +310,13 @@ def login():
         usuario = cursor.fetchone()
         
         if usuario:
+            if fragmentos.ativo():
+                espelhar_usuario(pool_fragmentos, cursor, usuario[0])
+            session.clear()
             session['usuario_id'] = usuario[0]
             session['usuario_nome'] = usuario[1]
             session['usuario_email'] = email
+            session.update(carregar_preferencias(cursor, usuario[0]))
             return redirect(url_for('index'))
         else:
             return render_template('login.html', erro='Email ou senha inválidos')
@@ -305,6 +324,8 @@ def login():
     return render_template('login.html')
 
 @app.route('/register', methods=['GET', 'POST'])
+@limitar_taxa
+@escrita_catalogo
 def register():
     if request.method == 'POST':
         nome = request.form['nome']
@@ -330,10 +351,14 @@ def register():
         cursor.execute('INSERT INTO configuracoes_email (usuario_id, email_notificacao) VALUES (?, ?)',
                      (usuario_id, email))
         conn.commit()
+        if fragmentos.ativo():
+            espelhar_usuario(pool_fragmentos, cursor, usuario_id)
         
+        session.clear()
         session['usuario_id'] = usuario_id
         session['usuario_nome'] = nome
         session['usuario_email'] = email
+        session.update(carregar_preferencias(cursor, usuario_id))
         
         return redirect(url_for('index'))
     
@@ -344,30 +369,43 @@ def logout():
     session.clear()
     return redirect(url_for('login'))
 
+def gravar_preferencias(**preferencias):
+    """
+    Grava as preferências em `usuarios` (banco principal) e nas sessões
+    abertas do usuário, para que valham nos outros dispositivos e depois
+    do próximo login. Usar dentro de rotas com @escrita_catalogo.
+    """
+    salvar_preferencias(cursor, session['usuario_id'], preferencias)
+    conn.commit()
+    session.update(preferencias)
+    app.session_interface.propagar(session['usuario_id'], preferencias)
+
 # Rotas para ativar/desativar o Modo pré-prova
 @app.route('/pre-exam/on')
+@escrita_catalogo
 def pre_exam_on():
     if 'usuario_id' not in session:
         return redirect(url_for('login'))
-    session['pre_exam_mode'] = True
+    gravar_preferencias(pre_exam_mode=True)
     return redirect(url_for('index'))
 
 @app.route('/pre-exam/off')
+@escrita_catalogo
 def pre_exam_off():
     if 'usuario_id' not in session:
         return redirect(url_for('login'))
-    session['pre_exam_mode'] = False
+    gravar_preferencias(pre_exam_mode=False)
     return redirect(url_for('index'))
 
 # Página de configurações (GET exibe, POST salva)
 @app.route('/settings', methods=['GET', 'POST'])
+@escrita_catalogo
 def settings():
     if 'usuario_id' not in session:
         return redirect(url_for('login'))
     if request.method == 'POST':
         # Toggle modo pré-prova
         pre_exam = request.form.get('pre_exam') == 'on'
-        session['pre_exam_mode'] = pre_exam
         # Fator pre-exam
         try:
             fator = float(request.form.get('pre_exam_factor', '0.6'))
@@ -375,17 +413,27 @@ def settings():
             fator = 0.6
         # Limites de segurança 0.4–0.8
         fator = max(0.4, min(0.8, fator))
-        session['pre_exam_factor'] = fator
         # Tema (dark mode)
         dark_mode = request.form.get('dark_mode') == 'on'
-        session['theme'] = 'dark' if dark_mode else 'light'
+        # Data da prova (opcional, AAAA-MM-DD)
+        data_prova = request.form.get('data_prova') or None
+        if data_prova:
+            try:
+                datetime.strptime(data_prova, '%Y-%m-%d')
+            except ValueError:
+                data_prova = None
+        gravar_preferencias(pre_exam_mode=pre_exam, pre_exam_factor=fator,
+                            theme='dark' if dark_mode else 'light', data_prova=data_prova)
         return redirect(url_for('settings'))
     # GET
     pre_exam = session.get('pre_exam_mode', False)
     fator = session.get('pre_exam_factor', 0.6)
-    return render_template('settings.html', pre_exam=pre_exam, pre_exam_factor=fator)
+    return render_template('settings.html', pre_exam=pre_exam, pre_exam_factor=fator,
+                           data_prova=session.get('data_prova'))
 
 @app.route('/cadastrar', methods=['GET', 'POST'])
+@limitar_taxa
+@escrita_serializada
 def cadastrar():
     if 'usuario_id' not in session:
         return redirect(url_for('login'))
@@ -400,96 +448,98 @@ def cadastrar():
         tipo_conteudo = (data.get('tipo_conteudo') or 'simples').strip().lower()
         pergunta = data.get('pergunta')
         resposta = data.get('resposta')
-        data_estudo = datetime.now().strftime("%Y-%m-%d")
-        
-        if tipo_conteudo == 'flashcard':
-            cursor.execute('''
-                INSERT INTO estudos (materia, topico, data_estudo, usuario_id, tipo_conteudo, pergunta, resposta)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (materia, topico, data_estudo, session['usuario_id'], 'flashcard', pergunta, resposta))
-        elif tipo_conteudo == 'quiz':
+
+        if tipo_conteudo == 'quiz':
             # Espera: quiz_pergunta, opcoes (dict com A-D), quiz_resposta_correta (A-D)
-            quiz_pergunta = data.get('quiz_pergunta')
-            opcoes = data.get('opcoes') or {}
-            resposta_correta = data.get('quiz_resposta_correta')
-            cursor.execute('''
-                INSERT INTO estudos (materia, topico, data_estudo, usuario_id, tipo_conteudo, pergunta, resposta, opcoes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                materia, topico, data_estudo, session['usuario_id'], 'quiz',
-                quiz_pergunta, resposta_correta, json.dumps(opcoes)
-            ))
-        else:
-            cursor.execute('INSERT INTO estudos (materia, topico, data_estudo, usuario_id, tipo_conteudo) VALUES (?, ?, ?, ?, ?)',
-                           (materia, topico, data_estudo, session['usuario_id'], 'simples'))
-        conn.commit()
-        
-        id_estudo = cursor.lastrowid
-        dias = [1, 3, 7, 14, 30]
-        tipos = ["1ª revisão", "2ª revisão", "3ª revisão", "4ª revisão", "5ª revisão"]
-        modo_revisao = tipo_conteudo if tipo_conteudo in ('flashcard','quiz') else 'simples'
+            pergunta = data.get('quiz_pergunta')
+            resposta = data.get('quiz_resposta_correta')
 
-        # Criar revisão imediata para hoje, para permitir estudar logo após cadastrar
-        hoje = datetime.now().strftime("%Y-%m-%d")
-        try:
-            cursor.execute('INSERT INTO revisoes (id_estudo, data_revisao, tipo, modo_revisao) VALUES (?, ?, ?, ?)',
-                           (id_estudo, hoje, 'Revisão inicial', modo_revisao))
-        except sqlite3.OperationalError:
-            cursor.execute('INSERT INTO revisoes (id_estudo, data_revisao, tipo) VALUES (?, ?, ?)',
-                           (id_estudo, hoje, 'Revisão inicial'))
-        
-        for d, t in zip(dias, tipos):
-            data_revisao = (datetime.now() + timedelta(days=d)).strftime("%Y-%m-%d")
-            try:
-                cursor.execute('INSERT INTO revisoes (id_estudo, data_revisao, tipo, modo_revisao) VALUES (?, ?, ?, ?)',
-                               (id_estudo, data_revisao, t, modo_revisao))
-            except sqlite3.OperationalError:
-                # Caso a coluna não exista no banco legado, insere sem o campo
-                cursor.execute('INSERT INTO revisoes (id_estudo, data_revisao, tipo) VALUES (?, ?, ?)',
-                               (id_estudo, data_revisao, t))
+        # Duplicata exata devolve o estudo existente; quase duplicata é marcada (dedup.py)
+        indice = IndiceDuplicatas(cursor, session['usuario_id'])
+        id_estudo, hoje, duplicata = cadastrar_estudo(cursor, indice, materia, topico, tipo_conteudo,
+                                                      pergunta, resposta, data.get('opcoes') or {},
+                                                      modo=data.get('duplicatas') or 'mesclar')
+        if hoje is None:
+            return jsonify({'status': 'duplicado', 'id_estudo': id_estudo, 'duplicata': duplicata.como_dict()})
         conn.commit()
+        histograma_carga.mover(session['usuario_id'], None, hoje)
+        cache_usuario.invalidar(session['usuario_id'])
         
-        return jsonify({'status': 'sucesso'})
+        resposta_json = {'status': 'sucesso', 'id_estudo': id_estudo}
+        if duplicata:
+            resposta_json['duplicata'] = duplicata.como_dict()
+        return jsonify(resposta_json)
     except Exception as e:
         return jsonify({'status': 'erro', 'mensagem': str(e)})
 
-@app.route('/marcar/<int:revisao_id>', methods=['POST'])
-def marcar_feita(revisao_id):
-    if 'usuario_id' not in session:
-        return jsonify({'status': 'erro', 'mensagem': 'Usuário não autenticado'})
-    
-    # 1. RECEBER a qualidade do front-end
-    data = request.get_json()
+def validar_avaliacao(data):
+    """
+    Valida quality (0-5), nivel_confianca (1-5, padrão 3) e tempo_resposta.
+
+    Returns:
+        (quality, nivel_confianca, tempo_resposta, mensagem de erro ou None)
+    """
     quality = data.get('quality')
     nivel_confianca = data.get('nivel_confianca')
     tempo_resposta = data.get('tempo_resposta')
-    
-    # 2. VALIDAR a qualidade (deve ser 0-5)
+
     if quality is None or not isinstance(quality, int) or quality < 0 or quality > 5:
-        return jsonify({'status': 'erro', 'mensagem': 'Quality deve ser um número entre 0 e 5'})
+        return quality, nivel_confianca, tempo_resposta, 'Quality deve ser um número entre 0 e 5'
     if nivel_confianca is None:
         nivel_confianca = 3
     if not isinstance(nivel_confianca, int) or nivel_confianca < 1 or nivel_confianca > 5:
-        return jsonify({'status': 'erro', 'mensagem': 'Nível de confiança deve ser um número entre 1 e 5'})
-    
-    # 3. BUSCAR dados atuais da revisão
-    cursor.execute('''
-        SELECT id_estudo, ef, repetition, interval, COALESCE(modo_revisao, 'simples')
-        FROM revisoes 
-        WHERE id = ?
-    ''', (revisao_id,))
-    
+        return quality, nivel_confianca, tempo_resposta, 'Nível de confiança deve ser um número entre 1 e 5'
+    return quality, nivel_confianca, tempo_resposta, None
+
+def fator_pre_prova():
+    """Fator de intervalo do modo pré-prova da sessão (None se inativo)."""
+    if not session.get('pre_exam_mode', False):
+        return None
+    pre_exam_factor = session.get('pre_exam_factor', 0.6)
+    try:
+        pre_exam_factor = float(pre_exam_factor)
+    except (TypeError, ValueError):
+        pre_exam_factor = 0.6
+    return max(0.4, min(0.8, pre_exam_factor))
+
+def avaliar_revisao(revisao_id, usuario_id, quality, nivel_confianca, tempo_resposta, pre_exam_factor=None):
+    """
+    Aplica o SM-2 e os ajustes a uma revisão e agenda a próxima, sem commit.
+
+    Usado por marcar_feita e pela sincronização de avaliações offline
+    (/api/sync/avaliacoes), que faz várias avaliações em uma transação.
+    A revisão só é concluída se for de `usuario_id` e ainda estiver
+    pendente, no mesmo UPDATE que a marca como feita: envios repetidos ou
+    simultâneos da mesma avaliação concluem uma vez só.
+
+    Returns:
+        (resposta, movimento): `resposta` é o JSON devolvido ao cliente
+        (status 'ignorada' se a revisão já estava concluída); `movimento` é
+        (usuario_id, data anterior, próxima data, versão de dados) para
+        atualizar o histograma de carga, ou None se nada foi gravado.
+    """
+    # 3. CONCLUIR a revisão (pendente, do usuário, com interação se flashcard/quiz)
+    # e BUSCAR o estado atual do cartão (card_state) no mesmo comando
+    tempo_valido = tempo_resposta if isinstance(tempo_resposta, int) and tempo_resposta >= 0 else None
+    executar(cursor, 'concluir_revisao', (quality, nivel_confianca, tempo_resposta, revisao_id, usuario_id,
+                                          tempo_valido, usuario_id))
     resultado = cursor.fetchone()
     if not resultado:
-        return jsonify({'status': 'erro', 'mensagem': 'Revisão não encontrada'})
-    
-    id_estudo, current_ef, current_repetition, current_interval, modo_revisao = resultado
+        executar(cursor, 'revisao_nao_concluida', (revisao_id, usuario_id))
+        motivo = cursor.fetchone()
+        if motivo is None:
+            return {'status': 'erro', 'mensagem': 'Revisão não encontrada'}, None
+        if motivo[0]:
+            return {'status': 'ignorada', 'mensagem': 'Revisão já concluída'}, None
+        # 3.1 EXIGIR interação para flashcard/quiz (tempo_resposta presente)
+        return {'status': 'erro', 'mensagem': 'Finalize a interação (mostrar resposta ou responder o quiz) antes de concluir.'}, None
+
+    (id_estudo, current_ef, current_repetition, current_interval, modo_revisao, data_anterior,
+     materia, versao_perfis, novo) = resultado
+
+    # Perfil de agendamento do usuário/matéria: em cache, recarregado só se a versão mudou
+    perfil = cache_perfis.obter(cursor, usuario_id, materia, versao_perfis)
 
-    # 3.1 EXIGIR interação para flashcard/quiz (tempo_resposta presente)
-    if modo_revisao in ('flashcard', 'quiz'):
-        if tempo_resposta is None or not isinstance(tempo_resposta, int) or tempo_resposta < 0:
-            return jsonify({'status': 'erro', 'mensagem': 'Finalize a interação (mostrar resposta ou responder o quiz) antes de concluir.'})
-    
     # 4. APLICAR o algoritmo SM-2
     # Usa valores padrão se forem None (revisões antigas)
     current_ef = current_ef if current_ef is not None else 2.5
@@ -501,201 +551,499 @@ def marcar_feita(revisao_id):
         quality=quality,
         ef=current_ef,
         interval=current_interval,
-        repetition=current_repetition
+        repetition=current_repetition,
+        perfil=perfil
     )
     
     # 5.1 AJUSTE LEVE PELO NÍVEL DE CONFIANÇA (1-5)
     # Menor confiança => intervalos menores; Maior confiança => intervalos ligeiramente maiores
-    # Escala suave para não distorcer o SM-2
-    fator_conf = {
-        1: 0.5,   # muito inseguro: revisar mais cedo
-        2: 0.75,  # inseguro
-        3: 1.0,   # neutro
-        4: 1.15,  # confiante
-        5: 1.3    # muito confiante
-    }.get(nivel_confianca, 1.0)
+    # Escala suave para não distorcer o SM-2 (padrão: 0.5, 0.75, 1.0, 1.15, 1.3)
+    fator_conf = perfil['fator_confianca'][nivel_confianca - 1] if nivel_confianca in (1, 2, 3, 4, 5) else 1.0
     new_interval = max(1, int(round(new_interval * fator_conf)))
 
     # 5.2 AJUSTE DO MODO PRÉ-PROVA (se ativo na sessão)
-    if session.get('pre_exam_mode', False):
-        pre_exam_factor = session.get('pre_exam_factor', 0.6)
-        try:
-            pre_exam_factor = float(pre_exam_factor)
-        except (TypeError, ValueError):
-            pre_exam_factor = 0.6
-        pre_exam_factor = max(0.4, min(0.8, pre_exam_factor))
+    if pre_exam_factor is not None:
         new_interval = max(1, int(round(new_interval * pre_exam_factor)))
 
     # 5.3 AJUSTE PELO TEMPO DE RESPOSTA (opcional, suave)
-    # Rápido (<= 5s) => +10% no intervalo; Lento (>= 30s) => -10%
+    # Padrão: rápido (<= 5s) => +10% no intervalo; lento (>= 30s) => -10%
     if isinstance(tempo_resposta, int):
-        if tempo_resposta <= 5:
-            new_interval = max(1, int(round(new_interval * 1.10)))
-        elif tempo_resposta >= 30:
-            new_interval = max(1, int(round(new_interval * 0.90)))
-    
-    # 6. MARCAR revisão atual como feita E salvar a quality
-    cursor.execute('''
-        UPDATE revisoes 
-        SET feito = 1, quality = ?, nivel_confianca = ?, tempo_resposta = ?
-        WHERE id = ?
-    ''', (quality, nivel_confianca, tempo_resposta, revisao_id))
+        if tempo_resposta <= perfil['tempo_rapido']:
+            new_interval = max(1, int(round(new_interval * perfil['fator_rapido'])))
+        elif tempo_resposta >= perfil['tempo_lento']:
+            new_interval = max(1, int(round(new_interval * perfil['fator_lento'])))
     
-    # 7. CRIAR próxima revisão com os novos valores
-    proxima_data = (datetime.now() + timedelta(days=new_interval)).strftime("%Y-%m-%d")
-    cursor.execute('''
-        INSERT INTO revisoes (id_estudo, data_revisao, tipo, feito, ef, repetition, interval)
-        VALUES (?, ?, ?, 0, ?, ?, ?)
-    ''', (id_estudo, proxima_data, 'SM-2', new_ef, new_repetition, new_interval))
+    # 5.4 SUAVIZAR a carga: dentro da tolerância do intervalo, escolher o dia
+    # com menos revisões agendadas para o usuário
+    proxima_data, new_interval = histograma_carga.escolher_data(cursor, usuario_id, new_interval)
     
-    conn.commit()
+    # 6. A revisão atual já foi marcada como feita (com a quality) no passo 3
     
-    # 8. RETORNAR sucesso com informações úteis
-    return jsonify({
+    # 7. CRIAR próxima revisão com os novos valores
+    executar(cursor, 'agendar_revisao_sm2', (id_estudo, proxima_data, new_ef, new_repetition, new_interval, modo_revisao))
+
+    # 7.1 ATUALIZAR o estado do cartão na mesma transação
+    nova_revisao_id = cursor.lastrowid
+    salvar_card_state(cursor, id_estudo, usuario_id, new_ef, new_interval, new_repetition,
+                      proxima_data, nova_revisao_id, nivel_confianca)
+
+    # 7.2 REGISTRAR as duas revisões na sequência de alterações do usuário
+    versao = registrar_alteracoes(cursor, usuario_id, [('revisoes', revisao_id), ('revisoes', nova_revisao_id)])
+
+    # 7.3 CONTAR o cartão na cota diária do usuário (limites.py)
+    registrar_servida(cursor, usuario_id, novo)
+
+    return {
         'status': 'ok',
         'proxima_revisao': proxima_data,
         'intervalo_dias': new_interval,
         'ef': new_ef
-    })
+    }, (usuario_id, data_anterior, proxima_data, versao)
+
+@app.route('/marcar/<int:revisao_id>', methods=['POST'])
+@limitar_taxa
+@escrita_serializada
+def marcar_feita(revisao_id):
+    if 'usuario_id' not in session:
+        return jsonify({'status': 'erro', 'mensagem': 'Usuário não autenticado'})
+    
+    # 1. RECEBER a qualidade do front-end
+    # 2. VALIDAR a qualidade (deve ser 0-5)
+    quality, nivel_confianca, tempo_resposta, erro = validar_avaliacao(request.get_json())
+    if erro:
+        return jsonify({'status': 'erro', 'mensagem': erro})
+    
+    # 3-7. AVALIAR e agendar a próxima revisão (só se pendente e do usuário da sessão)
+    usuario_id = session['usuario_id']
+    try:
+        resposta, movimento = avaliar_revisao(revisao_id, usuario_id, quality, nivel_confianca, tempo_resposta,
+                                              fator_pre_prova())
+    except Exception:
+        # Desfaz a conclusão do passo 3, para não ir no commit da próxima escrita
+        conn.rollback()
+        histograma_carga.descartar(usuario_id)
+        raise
+    if movimento is None:
+        # O UPDATE sem linhas também abriu a transação de escrita: libera o banco
+        conn.rollback()
+        return jsonify(resposta)
+    
+    conn.commit()
+    histograma_carga.mover(*movimento)
+    cache_usuario.invalidar(movimento[0])
+    
+    # 8. RETORNAR sucesso com informações úteis
+    return jsonify(resposta)
+
+@app.route('/api/fila/offline')
+def api_fila_offline():
+    """
+    Próximos N cartões do usuário (com pergunta, resposta e opções), para o
+    service worker guardar no IndexedDB e permitir revisar sem conexão.
+    """
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'})
+    cursor = cursor_leitura()
+    try:
+        limite = int(request.args.get('n', CARTOES_OFFLINE))
+    except ValueError:
+        limite = CARTOES_OFFLINE
+    limite = max(1, min(CARTOES_OFFLINE_MAX, limite))
+    horizonte = (datetime.now() + timedelta(days=DIAS_OFFLINE)).strftime("%Y-%m-%d")
+
+    # Mesmas cotas da fila do dia: o modo offline não contorna os limites
+    linhas, _ = montar_fila(cursor, session['usuario_id'], horizonte, maximo=limite)
+    linhas = linhas[:limite]
+    midias = midias_por_revisao(cursor, [linha[0] for linha in linhas])
+    cartoes = []
+    for rev_id, materia, topico, tipo, data_revisao, tipo_conteudo, pergunta, resposta, opcoes_json in linhas:
+        try:
+            opcoes = json.loads(opcoes_json) if opcoes_json else None
+        except ValueError:
+            opcoes = None
+        cartoes.append({
+            'revisao_id': rev_id, 'materia': materia, 'topico': topico, 'tipo': tipo,
+            'data_revisao': data_revisao, 'tipo_conteudo': tipo_conteudo,
+            'pergunta': pergunta, 'resposta': resposta, 'opcoes': opcoes,
+            'midias': midias.get(rev_id, [])
+        })
+    return jsonify({'cartoes': cartoes, 'gerado_em': datetime.now().isoformat(timespec='seconds')})
+
+def itens_lote_avaliacoes():
+    """Avaliações no corpo de /api/sync/avaliacoes (custo no limite de taxa)."""
+    dados = request.get_json(silent=True)
+    avaliacoes = dados.get('avaliacoes') if isinstance(dados, dict) else None
+    return max(1, len(avaliacoes)) if isinstance(avaliacoes, list) else 1
+
+@app.route('/api/sync/avaliacoes', methods=['POST'])
+@limitar_taxa(custo=itens_lote_avaliacoes)
+@escrita_serializada
+def api_sync_avaliacoes():
+    """
+    Aplica em lote as avaliações feitas offline.
+
+    Cada avaliação traz um `id_operacao` gerado no cliente: reenvios da
+    mesma operação devolvem o resultado já gravado (idempotente) e
+    revisões já concluídas em outro dispositivo são ignoradas. As
+    avaliações são aplicadas na ordem em que foram feitas (`avaliado_em`),
+    independente da ordem de chegada, e em uma única transação.
+    """
+    if 'usuario_id' not in session:
+        return jsonify({'status': 'erro', 'mensagem': 'Usuário não autenticado'})
+    usuario_id = session['usuario_id']
+    avaliacoes = (request.get_json(silent=True) or {}).get('avaliacoes') or []
+    if not isinstance(avaliacoes, list) or len(avaliacoes) > LOTE_SYNC_MAX:
+        return jsonify({'status': 'erro', 'mensagem': f'Envie uma lista de até {LOTE_SYNC_MAX} avaliações'})
+    avaliacoes = sorted((a for a in avaliacoes if isinstance(a, dict)), key=lambda a: str(a.get('avaliado_em') or ''))
+
+    pre_exam_factor = fator_pre_prova()
+    agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    resultados = []
+    movimentos = []
+    try:
+        for avaliacao in avaliacoes:
+            id_operacao = str(avaliacao.get('id_operacao') or '')[:64]
+            revisao_id = avaliacao.get('revisao_id')
+            if not id_operacao or not isinstance(revisao_id, int):
+                resultados.append({'id_operacao': id_operacao, 'status': 'erro', 'mensagem': 'id_operacao e revisao_id são obrigatórios'})
+                continue
+
+            executar(cursor, 'operacao_sincronizada', (usuario_id, id_operacao))
+            ja_aplicada = cursor.fetchone()
+            if ja_aplicada:
+                resultados.append(dict(json.loads(ja_aplicada[0]), id_operacao=id_operacao, status='duplicada'))
+                continue
+
+            quality, nivel_confianca, tempo_resposta, erro = validar_avaliacao(avaliacao)
+            if erro:
+                resposta = {'status': 'erro', 'mensagem': erro}
+            else:
+                # Revisões já concluídas em outro dispositivo voltam como 'ignorada'
+                resposta, movimento = avaliar_revisao(revisao_id, usuario_id, quality, nivel_confianca,
+                                                      tempo_resposta, pre_exam_factor)
+                if movimento is not None:
+                    # Atualiza o histograma já, para as próximas avaliações do lote
+                    histograma_carga.mover(*movimento)
+                    movimentos.append(movimento)
+
+            executar(cursor, 'registrar_operacao', (usuario_id, id_operacao, revisao_id, json.dumps(resposta), agora))
+            resultados.append(dict(resposta, id_operacao=id_operacao))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        # O histograma pode ter avançado com avaliações desfeitas
+        histograma_carga.descartar(usuario_id)
+        return jsonify({'status': 'erro', 'mensagem': str(e)})
+
+    if movimentos:
+        cache_usuario.invalidar(usuario_id)
+    return jsonify({'status': 'ok', 'resultados': resultados})
+
+@app.route('/api/sync')
+def api_sync():
+    """
+    Estudos e revisões alterados depois da sequência `since` (alteracoes.py).
+
+    O cliente guarda o `seq` devolvido e o envia na próxima chamada; com
+    `since=0` recebe o estado completo. Se `mais` for true, há mais
+    alterações: repetir com since=`seq`.
+    """
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'})
+    try:
+        desde = max(0, int(request.args.get('since', 0)))
+        limite = max(1, min(LIMITE_SYNC, int(request.args.get('limite', LIMITE_SYNC))))
+    except ValueError:
+        return jsonify({'error': 'since e limite devem ser inteiros'}), 400
+    return jsonify(alteracoes_desde(cursor_leitura(), session['usuario_id'], desde, limite))
+
+@app.route('/api/search')
+def api_search():
+    """
+    Busca nos estudos do usuário (matéria, tópico, pergunta, resposta e
+    opções), por relevância. `q` é o texto digitado; com `prefixo=1`
+    (padrão) a última palavra casa como prefixo. Os campos voltam com os
+    termos encontrados em <mark> (HTML escapado).
+    """
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'})
+    texto = request.args.get('q', '')
+    try:
+        limite = max(1, min(LIMITE_BUSCA, int(request.args.get('limite', 20))))
+    except ValueError:
+        limite = 20
+    prefixo = request.args.get('prefixo', '1').lower() in ('1', 'true', 'on')
+    resultados = buscar(cursor_leitura(), session['usuario_id'], texto, limite, prefixo)
+    return jsonify({'q': texto, 'resultados': resultados})
+
+@app.route('/api/perfis', methods=['GET'])
+def api_perfis():
+    """
+    Perfis de agendamento do usuário (perfis.py): os gravados, o padrão e o
+    perfil efetivo de `?materia=`. Leitura, fora da trava de escrita.
+    """
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    usuario_id = session['usuario_id']
+    materia = request.args.get('materia', '')
+    leitura = cursor_leitura()
+    leitura.execute('SELECT COALESCE(versao_perfis, 0) FROM usuarios WHERE id = ?', (usuario_id,))
+    row = leitura.fetchone()
+    return jsonify({'padrao': PADRAO, 'perfis': listar_perfis(leitura, usuario_id), 'materia': materia,
+                    'efetivo': cache_perfis.obter(leitura, usuario_id, materia, row[0] if row else 0)})
+
+@app.route('/api/perfis', methods=['PUT', 'DELETE'])
+@escrita_serializada
+def api_alterar_perfil():
+    """
+    PUT: {"materia": "" (geral) ou nome, "parametros": {...}} substitui o perfil.
+    DELETE ?materia=: remove o perfil (volta ao geral/padrão).
+    """
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    usuario_id = session['usuario_id']
+    if request.method == 'PUT':
+        data = request.get_json(silent=True) or {}
+        materia = (data.get('materia') or '').strip()
+        try:
+            parametros = salvar_perfil(cursor, usuario_id, materia, data.get('parametros'))
+        except ValueError as e:
+            conn.rollback()
+            return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
+    else:
+        materia = request.args.get('materia', '')
+        parametros = None
+        if not remover_perfil(cursor, usuario_id, materia):
+            conn.rollback()
+            return jsonify({'status': 'erro', 'mensagem': 'Perfil não encontrado'}), 404
+    conn.commit()
+    # A previsão de carga usa o perfil: descarta o que estiver em cache
+    cache_usuario.invalidar(usuario_id)
+    return jsonify({'status': 'ok', 'materia': materia, 'parametros': parametros,
+                    'efetivo': cache_perfis.obter(cursor, usuario_id, materia)})
+
+@app.route('/api/limites', methods=['GET'])
+def api_limites():
+    """
+    Limites diários da fila (limites.py): limites efetivos, o que já foi
+    avaliado hoje e as cotas restantes. Leitura, fora da trava de escrita.
+    """
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    return jsonify(dict(obter_cota(cursor_leitura(), session['usuario_id']), status='ok'))
+
+@app.route('/api/limites', methods=['PUT'])
+@escrita_serializada
+def api_alterar_limites():
+    """PUT: {"limite_revisoes_dia": N, "limite_novos_dia": N} (null = padrão, 0 = sem limite)."""
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    usuario_id = session['usuario_id']
+    try:
+        salvar_limites(cursor, usuario_id, request.get_json(silent=True) or {})
+    except ValueError as e:
+        conn.rollback()
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
+    conn.commit()
+    return jsonify(dict(obter_cota(cursor, usuario_id), status='ok'))
+
+@app.route('/api/estudos/<int:id_estudo>', methods=['PUT'])
+@escrita_serializada
+def api_editar_estudo(id_estudo):
+    """
+    Edita matéria, tópico, pergunta, resposta e/ou opções do estudo.
+    Cartões de baralho são copiados para o usuário antes (baralhos.py).
+    """
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    usuario_id = session['usuario_id']
+    try:
+        estudo = editar_estudo(cursor, usuario_id, id_estudo, request.get_json(silent=True) or {})
+    except ValueError as e:
+        conn.rollback()
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
+    if estudo is None:
+        conn.rollback()
+        return jsonify({'status': 'erro', 'mensagem': 'Estudo não encontrado'}), 404
+    conn.commit()
+    cache_usuario.invalidar(usuario_id)
+    return jsonify({'status': 'ok', 'estudo': estudo})
+
+@app.route('/api/baralhos', methods=['GET', 'POST'])
+@escrita_serializada
+def api_baralhos():
+    """
+    Baralhos compartilhados (baralhos.py).
+
+    GET: baralhos publicados (cartões e se o usuário assina).
+    POST: {"nome", "materia", "descricao"} publica os estudos da matéria do usuário.
+    """
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    usuario_id = session['usuario_id']
+    if request.method == 'GET':
+        return jsonify({'baralhos': listar_baralhos(cursor_leitura(), usuario_id)})
+    data = request.get_json(silent=True) or {}
+    try:
+        baralho_id, cartoes = publicar_baralho(cursor, usuario_id, data.get('nome'), data.get('materia'),
+                                               data.get('descricao'))
+    except ValueError as e:
+        conn.rollback()
+        return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
+    conn.commit()
+    return jsonify({'status': 'ok', 'baralho_id': baralho_id, 'cartoes': cartoes})
+
+@app.route('/api/baralhos/<int:baralho_id>/assinar', methods=['POST'])
+@escrita_serializada
+def api_assinar_baralho(baralho_id):
+    """Assina o baralho: os cartões entram na fila como novos (sujeitos ao limite diário)."""
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    usuario_id = session['usuario_id']
+    cartoes = assinar_baralho(cursor, usuario_id, baralho_id)
+    if cartoes is None:
+        conn.rollback()
+        return jsonify({'status': 'erro', 'mensagem': 'Baralho não encontrado'}), 404
+    conn.commit()
+    if cartoes:
+        histograma_carga.descartar(usuario_id)
+        cache_usuario.invalidar(usuario_id)
+    return jsonify({'status': 'ok', 'cartoes': cartoes})
+
+@app.route('/api/estudos/<int:id_estudo>/midia', methods=['POST'])
+@app.route('/api/estudos/<int:id_estudo>/midia/<hash_midia>', methods=['DELETE'])
+@escrita_serializada
+def api_midia_estudo(id_estudo, hash_midia=None):
+    """
+    Anexa (POST multipart: `arquivo`, `campo` = pergunta|resposta) ou
+    remove (DELETE ?campo=) uma imagem/áudio do estudo (midia.py).
+    """
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    usuario_id = session['usuario_id']
+    cursor.execute('SELECT 1 FROM estudos WHERE id = ? AND usuario_id = ?', (id_estudo, usuario_id))
+    if cursor.fetchone() is None:
+        return jsonify({'status': 'erro', 'mensagem': 'Estudo não encontrado'}), 404
+
+    if request.method == 'POST':
+        arquivo = request.files.get('arquivo')
+        if arquivo is None:
+            return jsonify({'status': 'erro', 'mensagem': 'Envie o arquivo no campo "arquivo"'}), 400
+        try:
+            midia = anexar_midia(cursor, id_estudo, arquivo.stream, request.form.get('campo', 'pergunta'))
+        except MidiaInvalida as e:
+            conn.rollback()
+            return jsonify({'status': 'erro', 'mensagem': str(e)}), 400
+        midia['url'] = url_for('midia', hash_midia=midia['hash'])
+    else:
+        midia = None
+        if not hash_valido(hash_midia) or not desanexar_midia(cursor, id_estudo, hash_midia, request.args.get('campo')):
+            conn.rollback()
+            return jsonify({'status': 'erro', 'mensagem': 'Mídia não encontrada'}), 404
+    registrar_alteracoes(cursor, usuario_id, [('estudos', id_estudo)])
+    conn.commit()
+    return jsonify({'status': 'ok', 'midia': midia})
+
+def _enviar_midia(caminho, tipo, etag):
+    # O conteúdo de um hash nunca muda: ETag forte, cache imutável e
+    # requisições condicionais/Range pelo send_file
+    resposta = send_file(caminho, mimetype=tipo, conditional=True, etag=etag, max_age=365 * 24 * 3600)
+    resposta.cache_control.public = False
+    resposta.cache_control.private = True
+    resposta.cache_control.immutable = True
+    return resposta
+
+@app.route('/midia/<hash_midia>')
+def midia(hash_midia):
+    """Arquivo de mídia, se algum estudo do usuário o usa."""
+    if 'usuario_id' not in session:
+        abort(401)
+    if not hash_valido(hash_midia):
+        abort(404)
+    tipo = tipo_se_permitido(cursor_leitura(), session['usuario_id'], hash_midia)
+    if tipo is None:
+        abort(404)
+    return _enviar_midia(caminho_blob(hash_midia), tipo, hash_midia)
+
+@app.route('/midia/<hash_midia>/miniatura/<int:largura>')
+def midia_miniatura(hash_midia, largura):
+    """Miniatura JPEG de uma imagem, gerada na primeira vez que é pedida."""
+    if 'usuario_id' not in session:
+        abort(401)
+    if not hash_valido(hash_midia) or largura not in LARGURAS_MINIATURA:
+        abort(404)
+    tipo = tipo_se_permitido(cursor_leitura(), session['usuario_id'], hash_midia)
+    if tipo is None or not tipo.startswith('image/'):
+        abort(404)
+    caminho = obter_miniatura(hash_midia, largura)
+    if caminho is None:
+        # Sem Pillow (ou imagem ilegível): serve o original
+        return _enviar_midia(caminho_blob(hash_midia), tipo, hash_midia)
+    return _enviar_midia(caminho, 'image/jpeg', f'{hash_midia}-{largura}')
+
+@app.route('/sw.js')
+def service_worker():
+    """Service worker servido na raiz, para controlar todas as páginas."""
+    resposta = app.send_static_file('js/sw.js')
+    resposta.headers['Content-Type'] = 'application/javascript'
+    resposta.cache_control.no_cache = True
+    return resposta
 
 @app.route('/dashboard')
 def dashboard():
     if 'usuario_id' not in session:
         return redirect(url_for('login'))
+    cursor = cursor_leitura()
     
     usuario_id = session['usuario_id']
     
     # Estatísticas básicas
-    cursor.execute('''
-        SELECT COUNT(*) FROM estudos WHERE usuario_id = ?
-    ''', (usuario_id,))
+    executar(cursor, 'total_estudos', (usuario_id,))
     total_estudos = cursor.fetchone()[0]
     
-    cursor.execute('''
-        SELECT COUNT(*) FROM revisoes r 
-        JOIN estudos e ON r.id_estudo = e.id 
-        WHERE e.usuario_id = ? AND r.feito = 1
-    ''', (usuario_id,))
+    executar(cursor, 'total_concluidas', (usuario_id,))
     revisoes_concluidas = cursor.fetchone()[0]
     
-    cursor.execute('''
-        SELECT COUNT(*) FROM revisoes r 
-        JOIN estudos e ON r.id_estudo = e.id 
-        WHERE e.usuario_id = ? AND r.feito = 0
-    ''', (usuario_id,))
+    executar(cursor, 'total_pendentes', (usuario_id,))
     revisoes_pendentes = cursor.fetchone()[0]
     
     # Novos estudos na última semana
-    cursor.execute('''
-        SELECT COUNT(*) FROM estudos 
-        WHERE usuario_id = ? AND data_estudo >= date('now', '-7 days')
-    ''', (usuario_id,))
+    executar(cursor, 'novos_estudos_7d', (usuario_id,))
     novos_estudos_7d = cursor.fetchone()[0]
     
     # Revisões urgentes (vencem hoje)
     hoje = datetime.now().strftime("%Y-%m-%d")
-    cursor.execute('''
-        SELECT COUNT(*) FROM revisoes r 
-        JOIN estudos e ON r.id_estudo = e.id 
-        WHERE e.usuario_id = ? AND r.data_revisao = ? AND r.feito = 0
-    ''', (usuario_id, hoje))
+    executar(cursor, 'pendentes_no_dia', (usuario_id, hoje))
     revisoes_urgentes = cursor.fetchone()[0]
     
     # Percentual de conclusão
     total_revisoes = revisoes_concluidas + revisoes_pendentes
     percentual_concluidas = round((revisoes_concluidas / total_revisoes * 100) if total_revisoes > 0 else 0, 1)
     
-    # Dias ativos (dias desde o primeiro estudo)
-    cursor.execute('''
-        SELECT MIN(data_estudo) FROM estudos WHERE usuario_id = ?
-    ''', (usuario_id,))
-    primeiro_estudo = cursor.fetchone()[0]
-    
-    if primeiro_estudo:
-        primeiro_dia = datetime.strptime(primeiro_estudo, "%Y-%m-%d")
-        dias_ativos = (datetime.now() - primeiro_dia).days + 1
-        ultima_atividade = "Hoje" if dias_ativos == 1 else f"{dias_ativos} dias"
-    else:
-        dias_ativos = 0
-        ultima_atividade = "Nunca"
-    
-    # Dados para gráficos
-    datas_progresso = []
-    valores_progresso = []
-    datas_progresso_30 = []
-    valores_progresso_30 = []
-    datas_total = []
-    valores_total = []
-
-    # Últimos 7 dias
-    for i in range(6, -1, -1):
-        data = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-        datas_progresso.append(data)
-        
-        cursor.execute('''
-            SELECT COUNT(*) FROM revisoes r 
-            JOIN estudos e ON r.id_estudo = e.id 
-            WHERE e.usuario_id = ? AND r.data_revisao = ? AND r.feito = 1
-        ''', (usuario_id, data))
-        valor = cursor.fetchone()[0]
-        valores_progresso.append(valor)
+    # Atividade: dias com revisões, sequência e séries (atividade.py)
+    atividade = calcular_atividade(cursor, usuario_id)
+    dias_ativos = atividade['dias_ativos']
+    ultima_atividade = descrever_ultima_atividade(atividade['ultimo_dia'])
+    sequencia_atual = atividade['sequencia_atual']
 
-    # Últimos 30 dias
-    for i in range(29, -1, -1):
-        data = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-        datas_progresso_30.append(data)
-        
-        cursor.execute('''
-            SELECT COUNT(*) FROM revisoes r 
-            JOIN estudos e ON r.id_estudo = e.id 
-            WHERE e.usuario_id = ? AND r.data_revisao = ? AND r.feito = 1
-        ''', (usuario_id, data))
-        valor = cursor.fetchone()[0]
-        valores_progresso_30.append(valor)
-
-    # Total acumulado desde o primeiro estudo
-    cursor.execute('''
-        SELECT MIN(data_estudo) FROM estudos WHERE usuario_id = ?
-    ''', (usuario_id,))
-    primeiro_estudo = cursor.fetchone()[0]
-
-    if primeiro_estudo:
-        primeiro_dia = datetime.strptime(primeiro_estudo, "%Y-%m-%d")
-        dias_totais = (datetime.now() - primeiro_dia).days + 1
-        acumulado = 0
-        for i in range(dias_totais):
-            data = (primeiro_dia + timedelta(days=i)).strftime("%Y-%m-%d")
-            datas_total.append(data)
-            cursor.execute('''
-                SELECT COUNT(*) FROM revisoes r 
-                JOIN estudos e ON r.id_estudo = e.id 
-                WHERE e.usuario_id = ? AND r.data_revisao = ? AND r.feito = 1
-            ''', (usuario_id, data))
-            valor = cursor.fetchone()[0]
-            acumulado += valor
-            valores_total.append(acumulado)
-    else:
-        datas_total = []
-        valores_total = []
+    # Dados para gráficos, sem uma consulta por dia
+    executar(cursor, 'primeiro_estudo', (usuario_id,))
+    series = series_progresso(atividade, cursor.fetchone()[0])
     
     # Desempenho por matéria
-    cursor.execute('''
-        SELECT e.materia, 
-               COUNT(r.id) as total_revisoes,
-               SUM(CASE WHEN r.feito = 1 THEN 1 ELSE 0 END) as concluidas
-        FROM estudos e
-        LEFT JOIN revisoes r ON e.id = r.id_estudo
-        WHERE e.usuario_id = ?
-        GROUP BY e.materia
-    ''', (usuario_id,))
+    executar(cursor, 'desempenho_materias', (usuario_id, usuario_id))
     
+    linhas_desempenho = cursor.fetchall()
+    analise = {item['materia']: item for item in analisar_materias(cursor, usuario_id)}
+
     materias_desempenho = []
-    for materia, total, concluidas in cursor.fetchall():
+    for materia, total, concluidas in linhas_desempenho:
         percentual = round((concluidas / total * 100) if total > 0 else 0, 1)
         materias_desempenho.append({
             'nome': materia,
             'total_revisoes': total,
-            'percentual': percentual
+            'percentual': percentual,
+            'analise': analise.get(materia or '')
         })
     
     # Dados para tendências
@@ -706,11 +1054,7 @@ def dashboard():
         inicio_semana = (datetime.now() - timedelta(weeks=3-semana)).strftime("%Y-%m-%d")
         fim_semana = (datetime.now() - timedelta(weeks=2-semana)).strftime("%Y-%m-%d")
         
-        cursor.execute('''
-            SELECT COUNT(*) FROM revisoes r 
-            JOIN estudos e ON r.id_estudo = e.id 
-            WHERE e.usuario_id = ? AND r.data_revisao BETWEEN ? AND ? AND r.feito = 1
-        ''', (usuario_id, inicio_semana, fim_semana))
+        executar(cursor, 'concluidas_no_periodo', (usuario_id, inicio_semana, fim_semana))
         valor = cursor.fetchone()[0]
         dados_tendencias.append(valor * 10)  # Escalar para melhor visualização
     
@@ -757,12 +1101,8 @@ def dashboard():
                          percentual_concluidas=percentual_concluidas,
                          dias_ativos=dias_ativos,
                          ultima_atividade=ultima_atividade,
-                         datas_progresso=datas_progresso,
-                         valores_progresso=valores_progresso,
-                         datas_progresso_30=datas_progresso_30,
-                         valores_progresso_30=valores_progresso_30,
-                         datas_total=datas_total,
-                         valores_total=valores_total,
+                         sequencia_atual=sequencia_atual,
+                         **series,
                          materias_desempenho=materias_desempenho,
                          labels_tendencias=labels_tendencias,
                          dados_tendencias=dados_tendencias,
@@ -772,107 +1112,35 @@ def dashboard():
 def api_dashboard_data():
     if 'usuario_id' not in session:
         return jsonify({'error': 'Não autenticado'})
+    cursor = cursor_leitura()
     
     usuario_id = session['usuario_id']
     
     # Dados básicos para atualização em tempo real
-    cursor.execute('SELECT COUNT(*) FROM estudos WHERE usuario_id = ?', (usuario_id,))
+    executar(cursor, 'total_estudos', (usuario_id,))
     total_estudos = cursor.fetchone()[0]
     
-    cursor.execute('''
-        SELECT COUNT(*) FROM revisoes r 
-        JOIN estudos e ON r.id_estudo = e.id 
-        WHERE e.usuario_id = ? AND r.feito = 1
-    ''', (usuario_id,))
+    executar(cursor, 'total_concluidas', (usuario_id,))
     revisoes_concluidas = cursor.fetchone()[0]
     
-    cursor.execute('''
-        SELECT COUNT(*) FROM revisoes r 
-        JOIN estudos e ON r.id_estudo = e.id 
-        WHERE e.usuario_id = ? AND r.feito = 0
-    ''', (usuario_id,))
+    executar(cursor, 'total_pendentes', (usuario_id,))
     revisoes_pendentes = cursor.fetchone()[0]
     
-    cursor.execute('''
-        SELECT COUNT(*) FROM estudos 
-        WHERE usuario_id = ? AND data_estudo >= date('now', '-7 days')
-    ''', (usuario_id,))
+    executar(cursor, 'novos_estudos_7d', (usuario_id,))
     novos_estudos_7d = cursor.fetchone()[0]
     
-    cursor.execute('''
-        SELECT COUNT(*) FROM revisoes r 
-        JOIN estudos e ON r.id_estudo = e.id 
-        WHERE e.usuario_id = ? AND r.data_revisao = date('now') AND r.feito = 0
-    ''', (usuario_id,))
+    executar(cursor, 'pendentes_no_dia', (usuario_id, datetime.now().strftime("%Y-%m-%d")))
     revisoes_urgentes = cursor.fetchone()[0]
     
-    cursor.execute('''
-        SELECT MIN(data_estudo) FROM estudos WHERE usuario_id = ?
-    ''', (usuario_id,))
-    primeiro_estudo = cursor.fetchone()[0]
-    
-    if primeiro_estudo:
-        primeiro_dia = datetime.strptime(primeiro_estudo, "%Y-%m-%d")
-        dias_ativos = (datetime.now() - primeiro_dia).days + 1
-    else:
-        dias_ativos = 0
+    atividade = calcular_atividade(cursor, usuario_id)
+    dias_ativos = atividade['dias_ativos']
     
     total_revisoes = revisoes_concluidas + revisoes_pendentes
     percentual_concluidas = round((revisoes_concluidas / total_revisoes * 100) if total_revisoes > 0 else 0, 1)
     
-    # Dados para gráficos
-    datas_progresso = []
-    valores_progresso = []
-    datas_progresso_30 = []
-    valores_progresso_30 = []
-    datas_total = []
-    valores_total = []
-    
-    # Últimos 7 dias
-    for i in range(6, -1, -1):
-        data = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-        datas_progresso.append(data)
-        
-        cursor.execute('''
-            SELECT COUNT(*) FROM revisoes r 
-            JOIN estudos e ON r.id_estudo = e.id 
-            WHERE e.usuario_id = ? AND r.data_revisao = ? AND r.feito = 1
-        ''', (usuario_id, data))
-        valor = cursor.fetchone()[0]
-        valores_progresso.append(valor)
-    
-    # Últimos 30 dias
-    for i in range(29, -1, -1):
-        data = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-        datas_progresso_30.append(data)
-        
-        cursor.execute('''
-            SELECT COUNT(*) FROM revisoes r 
-            JOIN estudos e ON r.id_estudo = e.id 
-            WHERE e.usuario_id = ? AND r.data_revisao = ? AND r.feito = 1
-        ''', (usuario_id, data))
-        valor = cursor.fetchone()[0]
-        valores_progresso_30.append(valor)
-    
-    # Total acumulado desde o primeiro estudo
-    if primeiro_estudo:
-        primeiro_dia = datetime.strptime(primeiro_estudo, "%Y-%m-%d")
-        dias_totais = (datetime.now() - primeiro_dia).days + 1
-        acumulado = 0
-        for i in range(dias_totais):
-            data = (primeiro_dia + timedelta(days=i)).strftime("%Y-%m-%d")
-            datas_total.append(data)
-            cursor.execute('''
-                SELECT COUNT(*) FROM revisoes r 
-                JOIN estudos e ON r.id_estudo = e.id 
-                WHERE e.usuario_id = ? AND r.data_revisao = ? AND r.feito = 1
-            ''', (usuario_id, data))
-            valor = cursor.fetchone()[0]
-            acumulado += valor
-            valores_total.append(acumulado)
-    else:
-        datas_total = []
-        valores_total = []
+    # Dados para gráficos, sem uma consulta por dia (atividade.py)
+    executar(cursor, 'primeiro_estudo', (usuario_id,))
+    series = series_progresso(atividade, cursor.fetchone()[0])
     
     # Dados para tendências
     labels_tendencias = ['Semana 1', 'Semana 2', 'Semana 3', 'Semana 4']
@@ -882,11 +1150,7 @@ def api_dashboard_data():
         inicio_semana = (datetime.now() - timedelta(weeks=3-semana)).strftime("%Y-%m-%d")
         fim_semana = (datetime.now() - timedelta(weeks=2-semana)).strftime("%Y-%m-%d")
         
-        cursor.execute('''
-            SELECT COUNT(*) FROM revisoes r 
-            JOIN estudos e ON r.id_estudo = e.id 
-            WHERE e.usuario_id = ? AND r.data_revisao BETWEEN ? AND ? AND r.feito = 1
-        ''', (usuario_id, inicio_semana, fim_semana))
+        executar(cursor, 'concluidas_no_periodo', (usuario_id, inicio_semana, fim_semana))
         valor = cursor.fetchone()[0]
         dados_tendencias.append(valor * 10)  # Escalar para melhor visualização
     
@@ -898,20 +1162,161 @@ def api_dashboard_data():
         'revisoes_urgentes': revisoes_urgentes,
         'percentual_concluidas': percentual_concluidas,
         'dias_ativos': dias_ativos,
-        'datas_progresso': datas_progresso,
-        'valores_progresso': valores_progresso,
-        'datas_progresso_30': datas_progresso_30,
-        'valores_progresso_30': valores_progresso_30,
-        'datas_total': datas_total,
-        'valores_total': valores_total,
+        'sequencia_atual': atividade['sequencia_atual'],
+        **series,
         'labels_tendencias': labels_tendencias,
-        'dados_tendencias': dados_tendencias
+        'dados_tendencias': dados_tendencias,
+        'analise_materias': analisar_materias(cursor, usuario_id)
+    })
+
+@app.route('/api/atividade')
+def api_atividade():
+    """Sequência atual e recorde, dias ativos e mapa de calor dos últimos 365 dias."""
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'})
+    atividade = calcular_atividade(cursor_leitura(), session['usuario_id'])
+    return jsonify({chave: valor for chave, valor in atividade.items() if chave != 'acumulado'})
+
+@app.route('/api/analise/materias')
+def api_analise_materias():
+    """Acerto, confiança, calibração, tempo mediano e EF médio por matéria (analise.py)."""
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'})
+    return jsonify(analisar_materias(cursor_leitura(), session['usuario_id']))
+
+@app.route('/api/forecast')
+def api_forecast():
+    """Previsão de revisões por dia e por matéria para os próximos dias."""
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'})
+    cursor = cursor_leitura()
+
+    usuario_id = session['usuario_id']
+    try:
+        dias = int(request.args.get('dias', DIAS_PREVISAO))
+    except ValueError:
+        dias = DIAS_PREVISAO
+    dias = max(1, min(365, dias))
+    projetar = request.args.get('projetar', '0').lower() in ('1', 'true', 'on')
+
+    # Cache por usuário com o dia (a previsão parte de hoje) e a versão
+    # persistente dos dados, que muda em toda escrita, em qualquer processo
+    versao = executar(cursor, 'versao_dados', (usuario_id,)).fetchone()[0]
+    chave = ('previsao', datetime.now().strftime("%Y-%m-%d"), versao, dias, projetar)
+    previsao = cache_usuario.obter(usuario_id, chave)
+    if previsao is None:
+        previsao = cache_usuario.guardar(usuario_id, chave, calcular_previsao(cursor, usuario_id, dias, projetar))
+    return jsonify(previsao)
+
+@app.route('/grafico/<tipo>.png')
+def grafico(tipo):
+    """Redireciona para a URL versionada do gráfico (sem cache)."""
+    if 'usuario_id' not in session:
+        return redirect(url_for('login'))
+    if tipo not in TIPOS_GRAFICO:
+        abort(404)
+    chave = chave_grafico(cursor_leitura(), session['usuario_id'])
+    resposta = redirect(url_for('grafico_versao', tipo=tipo, chave=chave))
+    resposta.cache_control.no_cache = True
+    return resposta
+
+@app.route('/grafico/<tipo>/<chave>.png')
+def grafico_versao(tipo, chave):
+    """
+    PNG do gráfico renderizado no servidor (graficos.py). A URL muda a
+    cada escrita do usuário, então a imagem pode ficar em cache no cliente.
+    """
+    if 'usuario_id' not in session:
+        return redirect(url_for('login'))
+    if tipo not in TIPOS_GRAFICO:
+        abort(404)
+    cursor = cursor_leitura()
+    usuario_id = session['usuario_id']
+    atual = chave_grafico(cursor, usuario_id)
+    if chave != atual:
+        return redirect(url_for('grafico_versao', tipo=tipo, chave=atual))
+
+    caminho = obter_grafico(cursor, usuario_id, tipo, atual)
+    resposta = send_file(caminho, mimetype='image/png', etag=f'{usuario_id}-{tipo}-{atual}', max_age=365 * 24 * 3600)
+    # Dados do usuário: cache só no cliente, nunca em proxies compartilhados
+    resposta.cache_control.public = False
+    resposta.cache_control.private = True
+    resposta.cache_control.immutable = True
+    return resposta
+
+@app.route('/api/resumo')
+def api_resumo():
+    """Estatísticas da consolidação noturna (consolidacao.py): sequência, últimos dias e matérias."""
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'})
+    cursor = cursor_leitura()
+    usuario_id = session['usuario_id']
+    dias = min(max(request.args.get('dias', 30, type=int), 1), 366)
+
+    cursor.execute('''
+        SELECT sequencia_atual, sequencia_recorde, ultimo_dia, data_calculo
+        FROM consolidado_usuarios WHERE usuario_id = ?
+    ''', (usuario_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return jsonify({'consolidado': False})
+
+    inicio = (datetime.now() - timedelta(days=dias - 1)).strftime("%Y-%m-%d")
+    cursor.execute('''
+        SELECT data, concluidas, avaliadas, acertos FROM consolidado_diario
+        WHERE usuario_id = ? AND data >= ? ORDER BY data
+    ''', (usuario_id, inicio))
+    diario = [{'data': d, 'concluidas': c, 'avaliadas': a, 'acertos': ac} for d, c, a, ac in cursor.fetchall()]
+
+    cursor.execute('''
+        SELECT materia, concluidas, avaliadas, acertos, confianca_media, tempo_medio, cartoes, ef_medio
+        FROM consolidado_materias WHERE usuario_id = ? ORDER BY materia
+    ''', (usuario_id,))
+    materias = [{
+        'materia': m, 'concluidas': c, 'avaliadas': a,
+        'taxa_acerto': round(100 * ac / a, 1) if a else None,
+        'confianca_media': confianca, 'tempo_medio': tempo, 'cartoes': cartoes, 'ef_medio': ef,
+    } for m, c, a, ac, confianca, tempo, cartoes, ef in cursor.fetchall()]
+
+    return jsonify({
+        'consolidado': True,
+        'sequencia_atual': row[0],
+        'sequencia_recorde': row[1],
+        'ultimo_dia': row[2],
+        'data_calculo': row[3],
+        'diario': diario,
+        'materias': materias,
     })
 
+def metricas_permitidas():
+    """As métricas são do processo inteiro: só os e-mails de METRICAS_ADMINS as veem."""
+    admins = {email.strip().lower() for email in app.config['METRICAS_ADMINS'].split(',') if email.strip()}
+    return session.get('usuario_email', '').lower() in admins
+
+@app.route('/api/metricas/escrita')
+def api_metricas_escrita():
+    """Requisições aceitas/rejeitadas pelo limite de taxa e estado da fila de escrita (limitador.py)."""
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'})
+    if not metricas_permitidas():
+        abort(403)
+    filas = [trava_escrita] + (pool_fragmentos.filas() if fragmentos.ativo() else [])
+    return jsonify({'taxa': limitador_taxa.metricas(), 'fila': somar_metricas(filas)})
+
+@app.route('/api/metricas/consultas')
+def api_metricas_consultas():
+    """Contadores de chamadas e tempo por consulta registrada (consultas.py)."""
+    if 'usuario_id' not in session:
+        return jsonify({'error': 'Não autenticado'})
+    if not metricas_permitidas():
+        abort(403)
+    return jsonify(metricas())
+
 # Nova rota para listar todos os usuários cadastrados
 @app.route('/usuarios', methods=['GET'])
 def listar_usuarios():
-    """Lista todos os usuários cadastrados no sistema"""
+    """Lista todos os usuários cadastrados no sistema (do catálogo, no modo fragmentado)"""
+    cursor = cursor_leitura(app.config['DATABASE_PATH'])
     cursor.execute('SELECT id, nome, email, data_criacao FROM usuarios ORDER BY data_criacao DESC')
     usuarios = cursor.fetchall()
 
@@ -924,8 +1329,10 @@ def listar_usuarios():
             'email': usuario[2],
             'data_criacao': usuario[3]
         })
+        if fragmentos.ativo():
+            usuarios_formatados[-1]['fragmento'] = pool_fragmentos.indice(usuario[0])
 
     return jsonify(usuarios_formatados)
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app('development').run(debug=True)
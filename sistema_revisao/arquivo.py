@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Arquivamento do histórico de revisões concluídas.
+
+Move revisões concluídas (feito = 1) mais antigas que N dias da tabela
+`revisoes` para um arquivo compacto e append-only:
+
+- revisoes_arquivo: um registro por estudo e por execução, com as colunas
+  do histórico empacotadas em arrays (formato colunar) dentro de um BLOB
+- revisoes_arquivo_diario: agregados por usuário/dia/matéria, usados pelas
+  estatísticas do dashboard
+
+A view `vw_concluidas_diarias` une as revisões concluídas ainda na tabela
+quente com os agregados arquivados, de modo que as consultas de
+estatística não precisam saber o que já foi arquivado.
+
+Uso:
+    python arquivo.py [dias]
+"""
+
+import os
+import sqlite3
+import struct
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta, date
+
+from alteracoes import criar_tabela_alteracoes
+
+# Cabeçalho do BLOB: versão do formato e quantidade de registros
+_CABECALHO = struct.Struct('<BI')
+_VERSAO_FORMATO = 1
+
+# Colunas empacotadas (nome, typecode do array). Valores ausentes viram -1.
+_COLUNAS = (
+    ('id', 'q'),
+    ('data_revisao', 'i'),   # ordinal do dia (date.toordinal)
+    ('quality', 'b'),
+    ('nivel_confianca', 'b'),
+    ('tempo_resposta', 'i'),
+    ('ef', 'f'),
+    ('repetition', 'i'),
+    ('interval', 'i'),
+)
+
+# Estudos por transação do arquivamento
+LOTE_ARQUIVAMENTO = 1000
+
+
+def criar_tabelas_arquivo(cursor):
+    """Cria as tabelas e a view do arquivo de revisões (idempotente)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS revisoes_arquivo (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_estudo INTEGER NOT NULL,
+        usuario_id INTEGER,
+        data_inicio TEXT,
+        data_fim TEXT,
+        quantidade INTEGER,
+        dados BLOB,
+        data_arquivamento TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(id_estudo) REFERENCES estudos(id)
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_revisoes_arquivo_estudo
+    ON revisoes_arquivo(id_estudo)
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS revisoes_arquivo_diario (
+        usuario_id INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        materia TEXT NOT NULL DEFAULT '',
+        concluidas INTEGER DEFAULT 0,
+        avaliadas INTEGER DEFAULT 0,
+        soma_quality INTEGER DEFAULT 0,
+        acertos INTEGER DEFAULT 0,
+        PRIMARY KEY (usuario_id, data, materia)
+    )
+    ''')
+    cursor.execute('''
+    CREATE VIEW IF NOT EXISTS vw_concluidas_diarias AS
+    SELECT e.usuario_id AS usuario_id,
+           r.data_revisao AS data,
+           COALESCE(e.materia, '') AS materia,
+           COUNT(*) AS concluidas
+    FROM revisoes r
+    JOIN estudos e ON r.id_estudo = e.id
+    WHERE r.feito = 1
+    GROUP BY e.usuario_id, r.data_revisao, COALESCE(e.materia, '')
+    UNION ALL
+    SELECT usuario_id, data, materia, concluidas
+    FROM revisoes_arquivo_diario
+    ''')
+
+
+def _empacotar(linhas):
+    """Empacota as linhas do histórico de um estudo em um BLOB colunar."""
+    colunas = [array(tipo) for _, tipo in _COLUNAS]
+    for linha in linhas:
+        rev_id, data_revisao, quality, confianca, tempo, ef, repetition, interval = linha
+        colunas[0].append(rev_id)
+        colunas[1].append(datetime.strptime(data_revisao, "%Y-%m-%d").toordinal())
+        colunas[2].append(quality if quality is not None else -1)
+        colunas[3].append(confianca if confianca is not None else -1)
+        colunas[4].append(tempo if tempo is not None else -1)
+        colunas[5].append(ef if ef is not None else -1.0)
+        colunas[6].append(repetition if repetition is not None else -1)
+        colunas[7].append(interval if interval is not None else -1)
+    partes = [_CABECALHO.pack(_VERSAO_FORMATO, len(linhas))]
+    partes.extend(coluna.tobytes() for coluna in colunas)
+    return b''.join(partes)
+
+
+def desempacotar(blob):
+    """
+    Desempacota um BLOB do arquivo.
+
+    Returns:
+        Lista de dicts (um por revisão), com None nos valores ausentes.
+    """
+    versao, quantidade = _CABECALHO.unpack_from(blob, 0)
+    if versao != _VERSAO_FORMATO:
+        raise ValueError(f"Formato de arquivo desconhecido: {versao}")
+    pos = _CABECALHO.size
+    colunas = {}
+    for nome, tipo in _COLUNAS:
+        coluna = array(tipo)
+        tamanho = coluna.itemsize * quantidade
+        coluna.frombytes(blob[pos:pos + tamanho])
+        pos += tamanho
+        colunas[nome] = coluna
+
+    registros = []
+    for i in range(quantidade):
+        registro = {}
+        for nome, _ in _COLUNAS:
+            valor = colunas[nome][i]
+            if nome == 'data_revisao':
+                valor = date.fromordinal(valor).strftime("%Y-%m-%d")
+            elif nome == 'ef':
+                valor = round(valor, 4) if valor >= 0 else None
+            elif valor == -1:
+                valor = None
+            registro[nome] = valor
+        registros.append(registro)
+    return registros
+
+
+def historico_arquivado(cursor, id_estudo):
+    """Retorna o histórico arquivado de um estudo, em ordem cronológica."""
+    cursor.execute('''
+        SELECT dados FROM revisoes_arquivo WHERE id_estudo = ? ORDER BY id
+    ''', (id_estudo,))
+    registros = []
+    for (blob,) in cursor.fetchall():
+        registros.extend(desempacotar(blob))
+    return registros
+
+
+def medir_tabela_quente(cursor):
+    """
+    Mede o tamanho da tabela `revisoes` e a latência da fila de pendentes.
+
+    Returns:
+        Dict com total de linhas, concluídas e latência (ms) da consulta
+        de revisões pendentes de todos os usuários.
+    """
+    cursor.execute('SELECT COUNT(*), COALESCE(SUM(feito = 1), 0) FROM revisoes')
+    total, concluidas = cursor.fetchone()
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    inicio = time.perf_counter()
+    cursor.execute('''
+        SELECT r.id, e.usuario_id, r.data_revisao
+        FROM revisoes r
+        JOIN estudos e ON r.id_estudo = e.id
+        WHERE r.feito = 0 AND r.data_revisao <= ?
+    ''', (hoje,))
+    cursor.fetchall()
+    latencia_ms = (time.perf_counter() - inicio) * 1000
+    return {'linhas': total, 'concluidas': concluidas, 'latencia_fila_ms': round(latencia_ms, 3)}
+
+
+def arquivar_revisoes(conn, dias=90, lote=LOTE_ARQUIVAMENTO):
+    """
+    Move para o arquivo as revisões concluídas com data anterior a hoje - `dias`.
+
+    Percorre os estudos em faixas de `lote` ids, com uma transação (BEGIN
+    IMMEDIATE) e um commit por faixa: a memória fica limitada a uma faixa
+    e a trava de escrita é liberada entre elas, então o app continua
+    gravando durante um arquivamento longo. Cada estudo cai numa única
+    faixa, e o histórico dele vira um registro só por execução.
+
+    Returns:
+        Quantidade de revisões arquivadas.
+    """
+    cursor = conn.cursor()
+    limite = (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d")
+    cursor.execute('SELECT MIN(id), MAX(id) FROM estudos')
+    primeiro, ultimo = cursor.fetchone()
+    if primeiro is None:
+        return 0
+    arquivadas = 0
+    for inicio in range(primeiro, ultimo + 1, lote):
+        arquivadas += _arquivar_faixa(conn, limite, inicio, inicio + lote - 1)
+    return arquivadas
+
+
+def _arquivar_faixa(conn, limite, inicio, fim):
+    """
+    Arquiva as revisões concluídas antes de `limite` dos estudos com id
+    entre `inicio` e `fim`, numa única transação: o histórico é empacotado
+    por estudo, os agregados diários são somados e as linhas são removidas
+    da tabela quente. Faz commit.
+    """
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('''
+            SELECT r.id_estudo, e.usuario_id, COALESCE(e.materia, ''),
+                   r.id, r.data_revisao, r.quality, r.nivel_confianca,
+                   r.tempo_resposta, r.ef, r.repetition, r.interval
+            FROM revisoes r
+            JOIN estudos e ON r.id_estudo = e.id
+            WHERE r.id_estudo BETWEEN ? AND ? AND r.feito = 1 AND r.data_revisao < ?
+            ORDER BY r.id_estudo, r.data_revisao, r.id
+        ''', (inicio, fim, limite))
+        linhas = cursor.fetchall()
+        if not linhas:
+            conn.rollback()
+            return 0
+
+        por_estudo = {}
+        agregados = {}
+        for id_estudo, usuario_id, materia, *historico in linhas:
+            por_estudo.setdefault((id_estudo, usuario_id), []).append(historico)
+            data_revisao, quality = historico[1], historico[2]
+            chave = (usuario_id, data_revisao, materia)
+            concluidas, avaliadas, soma_quality, acertos = agregados.get(chave, (0, 0, 0, 0))
+            if quality is not None:
+                avaliadas += 1
+                soma_quality += quality
+                acertos += 1 if quality >= 3 else 0
+            agregados[chave] = (concluidas + 1, avaliadas, soma_quality, acertos)
+
+        cursor.executemany('''
+            INSERT INTO revisoes_arquivo (id_estudo, usuario_id, data_inicio, data_fim, quantidade, dados)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (id_estudo, usuario_id, historico[0][1], historico[-1][1], len(historico), _empacotar(historico))
+            for (id_estudo, usuario_id), historico in por_estudo.items()
+        ])
+        cursor.executemany('''
+            INSERT INTO revisoes_arquivo_diario (usuario_id, data, materia, concluidas, avaliadas, soma_quality, acertos)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(usuario_id, data, materia) DO UPDATE SET
+                concluidas = concluidas + excluded.concluidas,
+                avaliadas = avaliadas + excluded.avaliadas,
+                soma_quality = soma_quality + excluded.soma_quality,
+                acertos = acertos + excluded.acertos
+        ''', [chave + valores for chave, valores in agregados.items()])
+        cursor.executemany('DELETE FROM revisoes WHERE id = ?', [(linha[3],) for linha in linhas])
+        # Revisões arquivadas saem também da sequência de alterações (alteracoes.py)
+        cursor.executemany("DELETE FROM alteracoes WHERE usuario_id = ? AND tabela = 'revisoes' AND registro_id = ?",
+                           [(linha[1], linha[3]) for linha in linhas])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(linhas)
+
+
+def main():
+    """Executa o arquivamento e mostra as medições antes e depois."""
+    database_path = os.getenv('DATABASE_PATH', 'revisao_estudos.db')
+    dias = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.getenv('DIAS_ARQUIVAMENTO', '90'))
+
+    conn = sqlite3.connect(database_path)
+    cursor = conn.cursor()
+    criar_tabelas_arquivo(cursor)
+    criar_tabela_alteracoes(cursor)
+    conn.commit()
+
+    antes = medir_tabela_quente(cursor)
+    arquivadas = arquivar_revisoes(conn, dias)
+    depois = medir_tabela_quente(cursor)
+    conn.close()
+
+    print(f"Revisões arquivadas (concluídas há mais de {dias} dias): {arquivadas}")
+    print(f"Antes:  {antes['linhas']} linhas ({antes['concluidas']} concluídas), fila em {antes['latencia_fila_ms']} ms")
+    print(f"Depois: {depois['linhas']} linhas ({depois['concluidas']} concluídas), fila em {depois['latencia_fila_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Modo ASGI do sistema.
+
+Expõe o app Flask como aplicação ASGI para servidores como o uvicorn,
+pela fábrica `criar_asgi_app`, chamada uma vez em cada worker. Cada
+requisição roda em uma thread própria; as rotas de leitura usam conexões
+SQLite da thread (leitura.py), devolvidas no fim da requisição para a
+próxima, de modo que o event loop nunca bloqueia em I/O do banco e
+leituras concorrentes não disputam a conexão global de escrita.
+
+As migrações rodam uma única vez, no processo que inicia o uvicorn, antes
+de os workers subirem; a fábrica não migra.
+
+Uso:
+    python asgi.py      # migra e inicia o uvicorn com Config.WORKERS processos
+
+    # equivalente, direto pelo uvicorn:
+    python -m sistema_revisao migrate
+    uvicorn asgi:criar_asgi_app --factory --workers 4
+
+Variáveis de ambiente: FLASK_CONFIG (padrão 'production'), SECRET_KEY,
+DATABASE_PATH, HOST, PORT, WEB_CONCURRENCY (processos).
+"""
+
+import asyncio
+import contextvars
+import os
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+
+import leitura
+from config import config
+
+
+class AdaptadorAsgi(WsgiToAsgi):
+    """
+    `WsgiToAsgi` com um contexto por requisição. Sem ele, o adaptador
+    executa todas as requisições do processo em uma única thread.
+    """
+
+    async def __call__(self, scope, receive, send):
+        # Tarefa com contexto vazio: numa conexão keep-alive o uvicorn cria a
+        # tarefa da próxima requisição dentro do `send` da anterior, e o
+        # executor já encerrado que ela herdaria do asgiref derruba a requisição
+        await contextvars.Context().run(asyncio.ensure_future, self._atender(scope, receive, send))
+
+    async def _atender(self, scope, receive, send):
+        async with ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+
+def _devolvendo_conexoes(wsgi_app):
+    # Ao fim da resposta, as conexões de leitura da thread da requisição
+    # ficam para a próxima (leitura.devolver_conexoes)
+    def aplicacao(environ, start_response):
+        resposta = wsgi_app(environ, start_response)
+        try:
+            yield from resposta
+        finally:
+            if hasattr(resposta, 'close'):
+                resposta.close()
+            leitura.devolver_conexoes()
+    return aplicacao
+
+
+def criar_asgi_app():
+    """Fábrica do uvicorn: configura e aquece o app do worker, sem migrar."""
+    import app as modulo_app
+    app = modulo_app.create_app(os.getenv('FLASK_CONFIG', 'production'), migrar=False)
+    modulo_app.preaquecer()
+    leitura.devolver_conexoes()
+    return AdaptadorAsgi(_devolvendo_conexoes(app))
+
+
+def main():
+    """Aplica as migrações e inicia o uvicorn com a configuração de host, porta e processos."""
+    import uvicorn
+
+    import banco
+    configuracao = config[os.getenv('FLASK_CONFIG', 'production')]
+    banco.migrar(configuracao.DATABASE_PATH)
+    uvicorn.run('asgi:criar_asgi_app', factory=True, host=configuracao.HOST, port=configuracao.PORT,
+                workers=configuracao.WORKERS, lifespan='off')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Atividade do usuário: sequência de dias, mapa de calor e série acumulada.
+
+A tabela `atividade_diaria` guarda quantas revisões cada usuário concluiu
+por dia. Triggers em `revisoes` a mantêm em dia (revisão inserida já
+concluída ou marcada como feita), e o arquivamento só apaga revisões já
+contadas, então ela equivale a `vw_concluidas_diarias` agrupada por dia,
+com uma linha por dia ativo em vez de uma por revisão.
+
+As estatísticas saem de consultas sobre essa tabela com funções de janela:
+
+- 'sequencias_atividade': sequência atual e recorde de dias seguidos com
+  revisões (dias consecutivos formam grupos por
+  `julianday(data) - ROW_NUMBER()`), total de dias ativos e último dia
+- 'acumulado_por_dia': revisões por dia ativo e o total acumulado
+  (SUM ... OVER)
+
+Antes, o dashboard fazia uma consulta por dia desde o primeiro estudo
+para montar a série acumulada. Agora o banco devolve uma linha por dia
+com revisões, e os dias sem revisões só são preenchidos em memória.
+
+O resultado fica no `cache_usuario` com o dia atual e a versão
+persistente dos dados ('versao_dados') na chave.
+
+Uso (benchmark com uma conta de 5 anos):
+    python atividade.py [anos] [revisoes_por_dia]
+"""
+
+import time
+from datetime import date, datetime, timedelta
+
+from cache import cache_usuario
+from consultas import executar
+
+DIAS_MAPA = 365
+
+
+def criar_tabela_atividade(cursor):
+    """
+    Cria a contagem diária e os triggers (idempotente). Na criação,
+    preenche com o histórico (revisões concluídas e arquivadas).
+
+    Returns:
+        Quantidade de dias preenchidos.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'atividade_diaria'")
+    existia = cursor.fetchone() is not None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS atividade_diaria (
+        usuario_id INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        concluidas INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (usuario_id, data)
+    ) WITHOUT ROWID
+    ''')
+    contar = '''
+        INSERT INTO atividade_diaria (usuario_id, data, concluidas)
+        SELECT usuario_id, new.data_revisao, 1 FROM estudos WHERE id = new.id_estudo
+        ON CONFLICT(usuario_id, data) DO UPDATE SET concluidas = concluidas + 1;
+    '''
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS atividade_revisao_inserida AFTER INSERT ON revisoes
+    WHEN new.feito = 1 BEGIN {contar} END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS atividade_revisao_feita AFTER UPDATE OF feito ON revisoes
+    WHEN new.feito = 1 AND COALESCE(old.feito, 0) = 0 BEGIN {contar} END
+    ''')
+    if existia:
+        return 0
+    cursor.execute('''
+        INSERT INTO atividade_diaria (usuario_id, data, concluidas)
+        SELECT usuario_id, data, SUM(concluidas) FROM vw_concluidas_diarias
+        WHERE data IS NOT NULL
+        GROUP BY usuario_id, data
+        HAVING SUM(concluidas) > 0
+    ''')
+    return cursor.rowcount
+
+
+def calcular_atividade(cursor, usuario_id, dias=DIAS_MAPA):
+    """
+    Sequências, mapa de calor dos últimos `dias` e série acumulada.
+
+    Returns:
+        Dict com sequencia_atual, sequencia_recorde, dias_ativos,
+        ultimo_dia, mapa ({'inicio', 'revisoes': [uma contagem por dia]})
+        e acumulado ({'datas', 'valores'}, só os dias com revisões).
+    """
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    versao = executar(cursor, 'versao_dados', (usuario_id,)).fetchone()[0]
+    chave = ('atividade', hoje, versao, dias)
+    atividade = cache_usuario.obter(usuario_id, chave)
+    if atividade is not None:
+        return atividade
+
+    atual, recorde, ativos, ultimo = executar(cursor, 'sequencias_atividade',
+                                              (usuario_id, hoje, hoje)).fetchone()
+    linhas = executar(cursor, 'acumulado_por_dia', (usuario_id,)).fetchall()
+
+    inicio = datetime.now().date() - timedelta(days=dias - 1)
+    mapa = [0] * dias
+    for data, concluidas, _ in linhas:
+        posicao = (date.fromisoformat(data) - inicio).days
+        if 0 <= posicao < dias:
+            mapa[posicao] = concluidas
+
+    return cache_usuario.guardar(usuario_id, chave, {
+        'sequencia_atual': atual,
+        'sequencia_recorde': recorde,
+        'dias_ativos': ativos,
+        'ultimo_dia': ultimo,
+        'mapa': {'inicio': inicio.strftime("%Y-%m-%d"), 'revisoes': mapa},
+        'acumulado': {'datas': [l[0] for l in linhas], 'valores': [l[2] for l in linhas]},
+    })
+
+
+def serie_diaria(acumulado, primeiro_dia, ultimo_dia):
+    """
+    Série acumulada com um ponto por dia entre `primeiro_dia` e
+    `ultimo_dia` (datetime.date), repetindo o total nos dias sem revisões.
+    """
+    totais = dict(zip(acumulado['datas'], acumulado['valores']))
+    datas, valores = [], []
+    total = 0
+    # Revisões com data anterior à do primeiro estudo entram no ponto inicial
+    for data, valor in zip(acumulado['datas'], acumulado['valores']):
+        if data >= primeiro_dia.isoformat():
+            break
+        total = valor
+    for i in range((ultimo_dia - primeiro_dia).days + 1):
+        texto = (primeiro_dia + timedelta(days=i)).isoformat()  # YYYY-MM-DD
+        total = totais.get(texto, total)
+        datas.append(texto)
+        valores.append(total)
+    return datas, valores
+
+
+def series_progresso(atividade, primeiro_estudo):
+    """
+    Séries dos gráficos do dashboard: últimos 7 e 30 dias (do mapa) e o
+    total acumulado desde `primeiro_estudo` ("YYYY-MM-DD" ou None).
+
+    Returns:
+        Dict com datas/valores de cada série, nos nomes usados pelo dashboard.
+    """
+    mapa = atividade['mapa']
+    inicio = date.fromisoformat(mapa['inicio'])
+    datas_mapa = [(inicio + timedelta(days=i)).isoformat() for i in range(len(mapa['revisoes']))]
+    if primeiro_estudo:
+        datas_total, valores_total = serie_diaria(atividade['acumulado'], date.fromisoformat(primeiro_estudo),
+                                                  datetime.now().date())
+    else:
+        datas_total, valores_total = [], []
+    return {
+        'datas_progresso': datas_mapa[-7:],
+        'valores_progresso': mapa['revisoes'][-7:],
+        'datas_progresso_30': datas_mapa[-30:],
+        'valores_progresso_30': mapa['revisoes'][-30:],
+        'datas_total': datas_total,
+        'valores_total': valores_total,
+    }
+
+
+def descrever_ultima_atividade(ultimo_dia):
+    """Texto do último dia com revisões ('Hoje', 'Ontem', 'há N dias', 'Nunca')."""
+    if not ultimo_dia:
+        return "Nunca"
+    dias = (datetime.now().date() - datetime.strptime(ultimo_dia, "%Y-%m-%d").date()).days
+    if dias <= 0:
+        return "Hoje"
+    return "Ontem" if dias == 1 else f"há {dias} dias"
+
+
+def main():
+    import os
+    import random
+    import sys
+    import tempfile
+
+    import banco
+    from consultas import conectar
+
+    anos = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    por_dia = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'atividade.db')
+        banco.migrar(caminho)
+        conn = conectar(caminho)
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO usuarios (nome, email, senha) VALUES ('Bench', 'bench@atividade', '')")
+        usuario_id = cursor.lastrowid
+        hoje = datetime.now().date()
+        primeiro = hoje - timedelta(days=365 * anos)
+        cursor.executemany('INSERT INTO estudos (materia, topico, data_estudo, usuario_id) VALUES (?, ?, ?, ?)',
+                           [(f'Matéria {i % 8}', f'Tópico {i}', primeiro.strftime("%Y-%m-%d"), usuario_id)
+                            for i in range(500)])
+        estudos = [row[0] for row in cursor.execute('SELECT id FROM estudos WHERE usuario_id = ?', (usuario_id,))]
+        revisoes = []
+        dia = primeiro
+        while dia <= hoje:
+            if random.random() < 0.8:   # 80% dos dias com revisões
+                texto = dia.strftime("%Y-%m-%d")
+                revisoes.extend((random.choice(estudos), texto, 'SM-2', 1, 4) for _ in range(por_dia))
+            dia += timedelta(days=1)
+        cursor.executemany('INSERT INTO revisoes (id_estudo, data_revisao, tipo, feito, quality) VALUES (?, ?, ?, ?, ?)',
+                           revisoes)
+        conn.commit()
+
+        # Antes: uma consulta por dia desde o primeiro estudo
+        inicio = time.perf_counter()
+        acumulado = 0
+        dia = primeiro
+        while dia <= hoje:
+            acumulado += executar(cursor, 'concluidas_no_dia', (usuario_id, dia.strftime("%Y-%m-%d"))).fetchone()[0]
+            dia += timedelta(days=1)
+        por_consulta = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        atividade = calcular_atividade(cursor, usuario_id)
+        datas, valores = serie_diaria(atividade['acumulado'], primeiro, hoje)
+        janela = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        calcular_atividade(cursor, usuario_id)
+        quente = time.perf_counter() - inicio
+        conn.close()
+
+    assert valores[-1] == acumulado == len(revisoes)
+    print(f"Conta com {anos} anos: {len(revisoes)} revisões em {atividade['dias_ativos']} dias ativos")
+    print(f"  uma consulta por dia ({len(datas)} consultas): {por_consulta * 1000:8.1f} ms")
+    print(f"  funções de janela (2 consultas):     {janela * 1000:8.1f} ms")
+    print(f"  em cache:                            {quente * 1000:8.3f} ms")
+    print(f"  sequência atual {atividade['sequencia_atual']}, recorde {atividade['sequencia_recorde']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+"""
+Esquema e migrações do banco de dados.
+
+Separado do app para que a CLI (`python -m sistema_revisao migrate`) e
+os jobs em lote possam migrar o banco sem importar o Flask.
+"""
+
+import sqlite3
+
+from arquivo import criar_tabelas_arquivo
+from estado_cartoes import criar_tabela_card_state, popular_card_state, remover_pendentes_antigas
+from alteracoes import criar_tabela_alteracoes
+from busca import criar_indice_busca
+from dedup import criar_tabelas_dedup, popular_impressoes
+from perfis import criar_tabela_perfis
+from consolidacao import criar_tabelas_consolidacao
+from atividade import criar_tabela_atividade
+from limites import criar_tabelas_limites
+from midia import criar_tabelas_midia
+from baralhos import criar_tabelas_baralhos
+from consultas import conectar
+
+
+def ativar_wal(conn):
+    """Coloca o banco em modo WAL (persistente no arquivo)."""
+    conn.execute('PRAGMA journal_mode=WAL')
+
+
+def migrar_banco(conn):
+    """
+    Cria as tabelas e aplica as migrações pendentes (idempotente).
+
+    Roda uma vez na inicialização (create_app), pelo launcher de
+    produção antes de criar os workers ou pelo comando `migrate` da CLI.
+    """
+    cursor = conn.cursor()
+
+    # Tabela de usuários
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        senha TEXT NOT NULL,
+        data_criacao TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # Tabela de estudos
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS estudos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        materia TEXT,
+        topico TEXT,
+        data_estudo TEXT,
+        usuario_id INTEGER,
+        FOREIGN KEY(usuario_id) REFERENCES usuarios(id)
+    )
+    ''')
+
+    # Tabela de revisões
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS revisoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_estudo INTEGER,
+        data_revisao TEXT,
+        tipo TEXT,
+        feito INTEGER DEFAULT 0,
+        ef REAL DEFAULT 2.5,
+        repetition INTEGER DEFAULT 0,
+        interval INTEGER DEFAULT 1,
+        FOREIGN KEY(id_estudo) REFERENCES estudos(id)
+    )
+    ''')
+
+    # Tabela de configurações de email
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS configuracoes_email (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER,
+        email_notificacao TEXT,
+        ativo INTEGER DEFAULT 1,
+        FOREIGN KEY(usuario_id) REFERENCES usuarios(id)
+    )
+    ''')
+
+    conn.commit()
+
+    # Migração: adicionar coluna quality se não existir
+    try:
+        cursor.execute('ALTER TABLE revisoes ADD COLUMN quality INTEGER')
+        conn.commit()
+        print("Migração: coluna 'quality' adicionada")
+    except sqlite3.OperationalError:
+        # Coluna já existe, tudo bem
+        pass
+
+    # Migração: adicionar coluna ef se não existir
+    try:
+        cursor.execute("ALTER TABLE revisoes ADD COLUMN ef REAL DEFAULT 2.5")
+        conn.commit()
+        print("Migração: coluna 'ef' adicionada")
+    except sqlite3.OperationalError:
+        # Coluna já existe
+        pass
+
+    # Migração: adicionar coluna tempo_resposta (segundos) se não existir
+    try:
+        cursor.execute("ALTER TABLE revisoes ADD COLUMN tempo_resposta INTEGER")
+        conn.commit()
+        print("Migração: coluna 'tempo_resposta' adicionada")
+    except sqlite3.OperationalError:
+        # Coluna já existe
+        pass
+
+    # Migração: adicionar coluna repetition se não existir
+    try:
+        cursor.execute("ALTER TABLE revisoes ADD COLUMN repetition INTEGER DEFAULT 0")
+        conn.commit()
+        print("Migração: coluna 'repetition' adicionada")
+    except sqlite3.OperationalError:
+        # Coluna já existe
+        pass
+
+    # Migração: adicionar coluna interval se não existir
+    try:
+        cursor.execute("ALTER TABLE revisoes ADD COLUMN interval INTEGER DEFAULT 1")
+        conn.commit()
+        print("Migração: coluna 'interval' adicionada")
+    except sqlite3.OperationalError:
+        # Coluna já existe
+        pass
+
+    # Migração: adicionar coluna nivel_confianca se não existir
+    try:
+        cursor.execute("ALTER TABLE revisoes ADD COLUMN nivel_confianca INTEGER")
+        conn.commit()
+        print("Migração: coluna 'nivel_confianca' adicionada")
+    except sqlite3.OperationalError:
+        # Coluna já existe
+        pass
+
+    # Migração: adicionar colunas em estudos se não existirem
+    try:
+        cursor.execute("ALTER TABLE estudos ADD COLUMN tipo_conteudo TEXT")
+        conn.commit()
+        print("Migração: coluna 'tipo_conteudo' adicionada em estudos")
+    except sqlite3.OperationalError:
+        pass
+
+    try:
+        cursor.execute("ALTER TABLE estudos ADD COLUMN pergunta TEXT")
+        conn.commit()
+        print("Migração: coluna 'pergunta' adicionada em estudos")
+    except sqlite3.OperationalError:
+        pass
+
+    try:
+        cursor.execute("ALTER TABLE estudos ADD COLUMN resposta TEXT")
+        conn.commit()
+        print("Migração: coluna 'resposta' adicionada em estudos")
+    except sqlite3.OperationalError:
+        pass
+
+    try:
+        cursor.execute("ALTER TABLE estudos ADD COLUMN opcoes TEXT")
+        conn.commit()
+        print("Migração: coluna 'opcoes' adicionada em estudos")
+    except sqlite3.OperationalError:
+        pass
+
+    # Migração: adicionar coluna modo_revisao em revisoes se não existir
+    try:
+        cursor.execute("ALTER TABLE revisoes ADD COLUMN modo_revisao TEXT")
+        conn.commit()
+        print("Migração: coluna 'modo_revisao' adicionada em revisoes")
+    except sqlite3.OperationalError:
+        pass
+
+    # Arquivo compacto do histórico de revisões concluídas (ver arquivo.py)
+    criar_tabelas_arquivo(cursor)
+    conn.commit()
+
+    # Estado atual de agendamento por estudo (ver estado_cartoes.py)
+    criar_tabela_card_state(cursor)
+    migrados = popular_card_state(cursor)
+    # Bancos legados: as revisões pendentes de datas fixas saem do log
+    removidas = remover_pendentes_antigas(cursor) if migrados > 0 else 0
+    conn.commit()
+    if migrados > 0:
+        print(f"Migração: {migrados} estudos adicionados em 'card_state'")
+    if removidas > 0:
+        print(f"Migração: {removidas} revisões pendentes antigas removidas de 'revisoes'")
+
+    # Sequência de alterações por usuário (ver alteracoes.py)
+    migrados = criar_tabela_alteracoes(cursor)
+    conn.commit()
+    if migrados > 0:
+        print(f"Migração: {migrados} registros adicionados em 'alteracoes'")
+
+    # Avaliações offline já aplicadas (idempotência de /api/sync/avaliacoes)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS avaliacoes_sincronizadas (
+        usuario_id INTEGER NOT NULL,
+        id_operacao TEXT NOT NULL,
+        revisao_id INTEGER,
+        resposta TEXT,
+        data_registro TEXT,
+        PRIMARY KEY (usuario_id, id_operacao)
+    ) WITHOUT ROWID
+    ''')
+    conn.commit()
+
+    # Hash do conteúdo e índice MinHash para detectar duplicatas (ver dedup.py)
+    criar_tabelas_dedup(cursor)
+    migrados = popular_impressoes(cursor)
+    conn.commit()
+    if migrados > 0:
+        print(f"Migração: {migrados} estudos com hash de conteúdo calculado")
+
+    # Histórico de um estudo em ordem (otimizador.py lê as revisões por estudo)
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_revisoes_estudo
+    ON revisoes(id_estudo, data_revisao)
+    ''')
+    conn.commit()
+
+    # Perfis de agendamento por usuário/matéria (ver perfis.py)
+    criar_tabela_perfis(cursor)
+    conn.commit()
+
+    # Agregados da consolidação noturna (ver consolidacao.py)
+    criar_tabelas_consolidacao(cursor)
+    conn.commit()
+
+    # Revisões concluídas por usuário/dia, mantidas por triggers (ver atividade.py)
+    migrados = criar_tabela_atividade(cursor)
+    conn.commit()
+    if migrados > 0:
+        print(f"Migração: {migrados} dias adicionados em 'atividade_diaria'")
+
+    # Limites diários da fila e contador de cartões avaliados (ver limites.py)
+    criar_tabelas_limites(cursor)
+    conn.commit()
+
+    # Metadados e vínculos das mídias dos cartões (ver midia.py)
+    criar_tabelas_midia(cursor)
+    conn.commit()
+
+    # Baralhos compartilhados e a view de conteúdo dos estudos (ver baralhos.py)
+    criar_tabelas_baralhos(cursor)
+    conn.commit()
+
+    # Índice de busca textual com triggers, sobre a view acima (ver busca.py)
+    if not criar_indice_busca(cursor):
+        print("Aviso: SQLite sem FTS5; a busca usará LIKE")
+    conn.commit()
+
+    # Preferências do usuário (antes só na sessão) e sessões no servidor (ver sessoes.py)
+    for coluna, tipo in (('modo_intensivo', 'INTEGER DEFAULT 0'), ('data_prova', 'TEXT'),
+                         ('fator_pre_prova', 'REAL'), ('tema', 'TEXT')):
+        try:
+            cursor.execute(f"ALTER TABLE usuarios ADD COLUMN {coluna} {tipo}")
+        except sqlite3.OperationalError:
+            pass
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sessoes (
+        chave TEXT PRIMARY KEY,
+        usuario_id INTEGER,
+        dados TEXT NOT NULL,
+        expira REAL NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessoes_usuario ON sessoes(usuario_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessoes_expira ON sessoes(expira)')
+    conn.commit()
+
+
+def migrar(caminho):
+    """Abre o banco em `caminho`, ativa o WAL e aplica as migrações."""
+    conn = conectar(caminho)
+    try:
+        ativar_wal(conn)
+        migrar_banco(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Baralhos compartilhados: conteúdo guardado uma vez, agendamento por usuário.
+
+Sem baralhos, uma turma de 500 alunos com o mesmo material de 2.000
+cartões cria 1 milhão de linhas em `estudos`, cada uma com uma cópia da
+pergunta e da resposta (e do índice de busca).
+
+- `baralhos` e `cartoes_baralho` guardam o conteúdo publicado, uma vez só;
+- ao assinar um baralho, o usuário recebe linhas leves em `estudos` (só
+  matéria, data e `cartao_baralho_id`), mais a revisão inicial e o
+  card_state. Cada tabela é preenchida por um único INSERT ... SELECT, com
+  custo fixo de ida e volta, qualquer que seja o tamanho do baralho;
+- a view `vw_estudos` resolve o conteúdo (próprio ou do baralho) para
+  quem lê: fila, sincronização, exportação e lembretes;
+- cópia na escrita: ao editar um cartão assinado, o conteúdo do baralho é
+  copiado para a linha do usuário (`copiar_do_baralho`) e só então
+  alterado. Os demais assinantes continuam lendo o original.
+
+A matéria fica na linha do usuário porque perfis, análise e consolidação
+agrupam por ela. O hash de conteúdo também: o cadastro de um cartão que
+já está num baralho assinado é reconhecido como duplicata.
+
+Uso (benchmark: assinatura contra cópia do conteúdo para cada aluno):
+    python baralhos.py [alunos] [cartoes]
+"""
+
+import sqlite3
+import time
+from datetime import datetime
+
+from alteracoes import avancar_sequencia
+
+
+def criar_tabelas_baralhos(cursor):
+    """Cria as tabelas, a coluna de referência em `estudos` e a view (idempotente)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS baralhos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        materia TEXT NOT NULL,
+        descricao TEXT,
+        autor_id INTEGER,
+        data_criacao TEXT,
+        FOREIGN KEY(autor_id) REFERENCES usuarios(id)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS cartoes_baralho (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        baralho_id INTEGER NOT NULL,
+        id_estudo_origem INTEGER,
+        topico TEXT,
+        tipo_conteudo TEXT,
+        pergunta TEXT,
+        resposta TEXT,
+        opcoes TEXT,
+        hash_conteudo TEXT,
+        FOREIGN KEY(baralho_id) REFERENCES baralhos(id)
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_cartoes_baralho
+    ON cartoes_baralho(baralho_id)
+    ''')
+    # Mídias dos cartões publicados (copiadas de estudos_midias na publicação)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS cartoes_baralho_midias (
+        cartao_id INTEGER NOT NULL,
+        hash TEXT NOT NULL,
+        campo TEXT NOT NULL,
+        PRIMARY KEY (cartao_id, hash, campo)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_cartoes_baralho_midias_hash
+    ON cartoes_baralho_midias(hash)
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS assinaturas_baralho (
+        usuario_id INTEGER NOT NULL,
+        baralho_id INTEGER NOT NULL,
+        data_assinatura TEXT,
+        PRIMARY KEY (usuario_id, baralho_id)
+    ) WITHOUT ROWID
+    ''')
+    try:
+        cursor.execute("ALTER TABLE estudos ADD COLUMN cartao_baralho_id INTEGER REFERENCES cartoes_baralho(id)")
+    except sqlite3.OperationalError:
+        pass
+    # Reassinatura (só cartões novos do baralho) e acesso às mídias do baralho
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_estudos_cartao_baralho
+    ON estudos(usuario_id, cartao_baralho_id)
+    ''')
+    # Conteúdo próprio (cadastrado ou já copiado) tem precedência sobre o do baralho
+    cursor.execute('''
+    CREATE VIEW IF NOT EXISTS vw_estudos AS
+    SELECT e.id AS id,
+           e.usuario_id AS usuario_id,
+           e.materia AS materia,
+           COALESCE(e.topico, c.topico) AS topico,
+           e.data_estudo AS data_estudo,
+           COALESCE(e.tipo_conteudo, c.tipo_conteudo) AS tipo_conteudo,
+           COALESCE(e.pergunta, c.pergunta) AS pergunta,
+           COALESCE(e.resposta, c.resposta) AS resposta,
+           COALESCE(e.opcoes, c.opcoes) AS opcoes,
+           e.hash_conteudo AS hash_conteudo,
+           e.cartao_baralho_id AS cartao_baralho_id
+    FROM estudos e
+    LEFT JOIN cartoes_baralho c ON c.id = e.cartao_baralho_id
+    ''')
+
+
+def publicar_baralho(cursor, autor_id, nome, materia, descricao=None):
+    """
+    Publica os estudos de `materia` do autor como um baralho (cópia do
+    conteúdo e das mídias no momento da publicação). Não faz commit.
+
+    Returns:
+        (baralho_id, quantidade de cartões)
+
+    Raises:
+        ValueError: nome/matéria vazios ou nenhum estudo na matéria.
+    """
+    nome, materia = (nome or '').strip(), (materia or '').strip()
+    if not nome or not materia:
+        raise ValueError('Informe o nome e a matéria do baralho')
+    cursor.execute('INSERT INTO baralhos (nome, materia, descricao, autor_id, data_criacao) VALUES (?, ?, ?, ?, ?)',
+                   (nome, materia, descricao, autor_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    baralho_id = cursor.lastrowid
+    cursor.execute('''
+        INSERT INTO cartoes_baralho (baralho_id, id_estudo_origem, topico, tipo_conteudo, pergunta, resposta,
+                                     opcoes, hash_conteudo)
+        SELECT ?, id, topico, COALESCE(tipo_conteudo, 'simples'), pergunta, resposta, opcoes, hash_conteudo
+        FROM vw_estudos
+        WHERE usuario_id = ? AND materia = ?
+        ORDER BY id
+    ''', (baralho_id, autor_id, materia))
+    cartoes = cursor.rowcount
+    if cartoes == 0:
+        raise ValueError(f'Nenhum estudo de "{materia}" para publicar')
+    cursor.execute('''
+        INSERT OR IGNORE INTO cartoes_baralho_midias (cartao_id, hash, campo)
+        SELECT c.id, em.hash, em.campo
+        FROM cartoes_baralho c
+        JOIN estudos_midias em ON em.id_estudo = c.id_estudo_origem
+        WHERE c.baralho_id = ?
+    ''', (baralho_id,))
+    return baralho_id, cartoes
+
+
+def listar_baralhos(cursor, usuario_id):
+    """Baralhos publicados, com o total de cartões e se o usuário já assina."""
+    cursor.execute('''
+        SELECT b.id, b.nome, b.materia, b.descricao, u.nome, b.data_criacao,
+               (SELECT COUNT(*) FROM cartoes_baralho c WHERE c.baralho_id = b.id),
+               EXISTS (SELECT 1 FROM assinaturas_baralho a WHERE a.baralho_id = b.id AND a.usuario_id = ?)
+        FROM baralhos b
+        LEFT JOIN usuarios u ON u.id = b.autor_id
+        ORDER BY b.id DESC
+    ''', (usuario_id,))
+    colunas = ('id', 'nome', 'materia', 'descricao', 'autor', 'data_criacao', 'cartoes', 'assinado')
+    return [dict(zip(colunas, row), assinado=bool(row[7])) for row in cursor.fetchall()]
+
+
+def assinar_baralho(cursor, usuario_id, baralho_id, hoje=None):
+    """
+    Assina o baralho: cria, em lote, os estudos leves, as revisões iniciais
+    (para hoje), o card_state (cartões novos) e as alterações de sincronização.
+    Reassinar só acrescenta os cartões incluídos no baralho depois.
+
+    Não faz commit: deve rodar sob a trava de escrita do app, que garante
+    que os ids acima dos máximos lidos no início são todos desta assinatura.
+
+    Returns:
+        Quantidade de cartões acrescentados, ou None se o baralho não existe.
+    """
+    hoje = hoje or datetime.now().strftime("%Y-%m-%d")
+    cursor.execute('SELECT materia FROM baralhos WHERE id = ?', (baralho_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    materia = row[0]
+    cursor.execute('''
+        INSERT OR IGNORE INTO assinaturas_baralho (usuario_id, baralho_id, data_assinatura) VALUES (?, ?, ?)
+    ''', (usuario_id, baralho_id, hoje))
+
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM estudos')
+    ultimo_estudo = cursor.fetchone()[0]
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM revisoes')
+    ultima_revisao = cursor.fetchone()[0]
+
+    cursor.execute('''
+        INSERT INTO estudos (materia, data_estudo, usuario_id, cartao_baralho_id, hash_conteudo)
+        SELECT ?, ?, ?, c.id, c.hash_conteudo
+        FROM cartoes_baralho c
+        WHERE c.baralho_id = ?
+          AND NOT EXISTS (SELECT 1 FROM estudos e WHERE e.usuario_id = ? AND e.cartao_baralho_id = c.id)
+        ORDER BY c.id
+    ''', (materia, hoje, usuario_id, baralho_id, usuario_id))
+    cartoes = cursor.rowcount
+    if cartoes == 0:
+        return 0
+
+    cursor.execute('''
+        INSERT INTO revisoes (id_estudo, data_revisao, tipo, modo_revisao)
+        SELECT e.id, ?, 'Revisão inicial', COALESCE(c.tipo_conteudo, 'simples')
+        FROM estudos e
+        JOIN cartoes_baralho c ON c.id = e.cartao_baralho_id
+        WHERE e.id > ? AND e.usuario_id = ?
+        ORDER BY e.id
+    ''', (hoje, ultimo_estudo, usuario_id))
+    cursor.execute('''
+        INSERT INTO card_state (id_estudo, usuario_id, ef, interval, repetition, data_revisao, revisao_id, novo)
+        SELECT id_estudo, ?, 2.5, 1, 0, data_revisao, id, 1
+        FROM revisoes WHERE id > ?
+    ''', (usuario_id, ultima_revisao))
+
+    seq = avancar_sequencia(cursor, usuario_id)
+    cursor.execute('''
+        INSERT INTO alteracoes (usuario_id, tabela, registro_id, seq)
+        SELECT ?, 'estudos', id, ? FROM estudos WHERE id > ? AND usuario_id = ?
+        UNION ALL
+        SELECT ?, 'revisoes', id, ? FROM revisoes WHERE id > ?
+    ''', (usuario_id, seq, ultimo_estudo, usuario_id, usuario_id, seq, ultima_revisao))
+    return cartoes
+
+
+def copiar_do_baralho(cursor, usuario_id, id_estudo):
+    """
+    Cópia na escrita: traz o conteúdo (e as mídias) do cartão do baralho
+    para o estudo do usuário, que passa a ter conteúdo próprio. Não faz commit.
+
+    Returns:
+        True se copiou; False se o estudo já tinha conteúdo próprio.
+    """
+    cursor.execute('''
+        UPDATE estudos
+        SET topico = c.topico, tipo_conteudo = COALESCE(c.tipo_conteudo, 'simples'),
+            pergunta = c.pergunta, resposta = c.resposta, opcoes = c.opcoes
+        FROM cartoes_baralho c
+        WHERE c.id = estudos.cartao_baralho_id
+          AND estudos.id = ? AND estudos.usuario_id = ? AND estudos.tipo_conteudo IS NULL
+    ''', (id_estudo, usuario_id))
+    if cursor.rowcount == 0:
+        return False
+    cursor.execute('''
+        INSERT OR IGNORE INTO estudos_midias (id_estudo, hash, campo)
+        SELECT e.id, cm.hash, cm.campo
+        FROM estudos e
+        JOIN cartoes_baralho_midias cm ON cm.cartao_id = e.cartao_baralho_id
+        WHERE e.id = ?
+    ''', (id_estudo,))
+    return True
+
+
+def _tamanho(cursor):
+    cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    cursor.execute('PRAGMA page_count')
+    paginas = cursor.fetchone()[0]
+    cursor.execute('PRAGMA page_size')
+    return paginas * cursor.fetchone()[0]
+
+
+def main():
+    import os
+    import random
+    import sys
+    import tempfile
+
+    import banco
+    from consultas import conectar
+
+    alunos = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    total_cartoes = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    random.seed(42)
+    palavras = ['célula', 'membrana', 'energia', 'proteína', 'enzima', 'núcleo', 'síntese', 'transporte',
+                'mitocôndria', 'ribossomo', 'gene', 'cromossomo', 'divisão', 'metabolismo', 'respiração']
+
+    def frase(n):
+        return ' '.join(random.choice(palavras) for _ in range(n))
+
+    cartoes = [(f'Tópico {i}', frase(20), frase(30)) for i in range(total_cartoes)]
+    print(f"Turma de {alunos} alunos, baralho de {total_cartoes} cartões")
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for modo in ('copia', 'assinatura'):
+            caminho = os.path.join(tmp, f'{modo}.db')
+            banco.migrar(caminho)
+            conn = conectar(caminho)
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO usuarios (nome, email, senha) VALUES ('Professor', 'prof@baralhos', '')")
+            autor_id = cursor.lastrowid
+            cursor.executemany('''
+                INSERT INTO estudos (materia, topico, data_estudo, usuario_id, tipo_conteudo, pergunta, resposta,
+                                     hash_conteudo)
+                VALUES ('Biologia', ?, '2024-01-01', ?, 'flashcard', ?, ?, ?)
+            ''', [(topico, autor_id, pergunta, resposta, f'h{i}')
+                  for i, (topico, pergunta, resposta) in enumerate(cartoes)])
+            baralho_id, _ = publicar_baralho(cursor, autor_id, 'Biologia celular', 'Biologia')
+            cursor.executemany("INSERT INTO usuarios (nome, email, senha) VALUES (?, ?, '')",
+                               [(f'Aluno {i}', f'aluno{i}@baralhos') for i in range(alunos)])
+            conn.commit()
+            cursor.execute("SELECT id FROM usuarios WHERE email LIKE 'aluno%'")
+            ids = [row[0] for row in cursor.fetchall()]
+            antes = _tamanho(cursor)
+
+            tempos = []
+            for usuario_id in ids:
+                inicio = time.perf_counter()
+                if modo == 'assinatura':
+                    assinar_baralho(cursor, usuario_id, baralho_id)
+                else:
+                    # Antes: cada aluno recebe uma cópia completa do conteúdo
+                    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM estudos')
+                    ultimo = cursor.fetchone()[0]
+                    cursor.execute('''
+                        INSERT INTO estudos (materia, topico, data_estudo, usuario_id, tipo_conteudo, pergunta,
+                                             resposta, opcoes, hash_conteudo)
+                        SELECT 'Biologia', topico, date('now'), ?, tipo_conteudo, pergunta, resposta, opcoes,
+                               hash_conteudo
+                        FROM cartoes_baralho WHERE baralho_id = ?
+                    ''', (usuario_id, baralho_id))
+                    cursor.execute('''
+                        INSERT INTO revisoes (id_estudo, data_revisao, tipo, modo_revisao)
+                        SELECT id, date('now'), 'Revisão inicial', tipo_conteudo FROM estudos WHERE id > ?
+                    ''', (ultimo,))
+                    cursor.execute('''
+                        INSERT INTO card_state (id_estudo, usuario_id, data_revisao, revisao_id, novo)
+                        SELECT r.id_estudo, ?, r.data_revisao, r.id, 1 FROM revisoes r WHERE r.id_estudo > ?
+                    ''', (usuario_id, ultimo))
+                conn.commit()
+                tempos.append(time.perf_counter() - inicio)
+            tamanho = _tamanho(cursor) - antes
+
+            # Fila do primeiro aluno (conteúdo resolvido pela view no modo assinatura)
+            from consultas import executar
+            inicio = time.perf_counter()
+            fila = executar(cursor, 'fila_novos', (ids[0], '9999-12-31', 50)).fetchall()
+            leitura = time.perf_counter() - inicio
+            assert len(fila) == 50 and all(linha[6] for linha in fila)
+            resultados[modo] = (sorted(tempos)[len(tempos) // 2], max(tempos), tamanho, leitura)
+            conn.close()
+
+    for modo, (mediana, pior, tamanho, leitura) in resultados.items():
+        print(f"  {modo:10}: assinatura por aluno {mediana * 1000:7.1f} ms (pior {pior * 1000:6.1f} ms), "
+              f"+{tamanho / 2 ** 20:7.1f} MB no banco ({tamanho / (alunos * total_cartoes):5.0f} B/cartão), "
+              f"fila de 50 cartões {leitura * 1000:5.2f} ms")
+    copia, assinatura = resultados['copia'], resultados['assinatura']
+    print(f"  espaço: {copia[2] / assinatura[2]:.1f}x menor; assinatura: {copia[0] / assinatura[0]:.1f}x mais rápida")
+
+
+if __name__ == '__main__':
+    main()
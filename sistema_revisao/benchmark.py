@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Benchmarks do sistema.
+
+Cada benchmark sobe o que precisa em um banco temporário (o banco real
+nunca é usado) e imprime os resultados.
+
+Uso:
+    python benchmark.py concorrencia [clientes] [segundos]
+    python benchmark.py primeira_resposta
+    python benchmark.py inicializacao [orcamento_ms]
+    python benchmark.py sincronizacao [cartoes]
+    python benchmark.py avaliacao_duplicada [clientes] [revisoes]
+"""
+
+import http.client
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+
+ROTAS_LEITURA = ['/', '/dashboard', '/api/dashboard-data', '/api/forecast']
+
+# Servidor de desenvolvimento do Flask (modo síncrono), sem pré-aquecimento
+_SERVIDOR_DEV = ('import os; from app import create_app; '
+                 'create_app("development").run(port=int(os.environ["PORT"]), threaded=True)')
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class ClienteHttp:
+    """Cliente HTTP mínimo que guarda o cookie de sessão."""
+
+    def __init__(self, porta):
+        self.porta = porta
+        self.cookie = None
+        self.conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+
+    def requisitar(self, metodo, caminho, corpo=None, tipo=None):
+        cabecalhos = {}
+        if self.cookie:
+            cabecalhos['Cookie'] = self.cookie
+        if tipo:
+            cabecalhos['Content-Type'] = tipo
+        try:
+            self.conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+            resposta = self.conexao.getresponse()
+        except (http.client.HTTPException, ConnectionError):
+            # Servidor fechou a conexão keep-alive: reabre e tenta de novo
+            self.conexao.close()
+            self.conexao = http.client.HTTPConnection('127.0.0.1', self.porta, timeout=30)
+            self.conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+            resposta = self.conexao.getresponse()
+        dados = resposta.read()
+        cookie = resposta.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return resposta.status, dados
+
+    def post_form(self, caminho, campos):
+        return self.requisitar('POST', caminho, urllib.parse.urlencode(campos), 'application/x-www-form-urlencoded')
+
+    def post_json(self, caminho, dados):
+        return self.requisitar('POST', caminho, json.dumps(dados), 'application/json')
+
+
+def iniciar_servidor(comando, ambiente_extra, porta):
+    """Inicia o servidor em um subprocesso e espera ele aceitar conexões."""
+    ambiente = dict(os.environ, PORT=str(porta), SECRET_KEY='benchmark', **ambiente_extra)
+    processo = subprocess.Popen(comando, cwd=DIRETORIO, env=ambiente,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    limite = time.time() + 30
+    while time.time() < limite:
+        try:
+            with socket.create_connection(('127.0.0.1', porta), timeout=0.5):
+                return processo
+        except OSError:
+            time.sleep(0.1)
+    processo.kill()
+    raise RuntimeError(f"Servidor não iniciou: {' '.join(comando)}")
+
+
+def popular_usuario(porta, email, cartoes=200):
+    """Registra um usuário e cadastra `cartoes` flashcards; retorna o cookie."""
+    cliente = ClienteHttp(porta)
+    cliente.post_form('/register', {'nome': 'Benchmark', 'email': email, 'senha': 'x', 'confirmar_senha': 'x'})
+    for i in range(cartoes):
+        cliente.post_json('/cadastrar', {
+            'materia': f'Matéria {i % 5}', 'topico': f'Tópico {i}', 'tipo_conteudo': 'flashcard',
+            'pergunta': f'Pergunta {i}', 'resposta': f'Resposta {i}'
+        })
+    return cliente.cookie
+
+
+def medir_vazao(porta, cookie, clientes, segundos, rotas=ROTAS_LEITURA):
+    """Dispara `clientes` threads fazendo GETs nas rotas; retorna (req/s, erros)."""
+    contagens = [0] * clientes
+    erros = [0] * clientes
+    fim = time.time() + segundos
+
+    def trabalhar(indice):
+        cliente = ClienteHttp(porta)
+        cliente.cookie = cookie
+        i = 0
+        while time.time() < fim:
+            status, _ = cliente.requisitar('GET', rotas[i % len(rotas)])
+            if status == 200:
+                contagens[indice] += 1
+            else:
+                erros[indice] += 1
+            i += 1
+
+    threads = [threading.Thread(target=trabalhar, args=(i,)) for i in range(clientes)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(contagens) / segundos, sum(erros)
+
+
+def benchmark_concorrencia(clientes=16, segundos=5):
+    """Compara a vazão das rotas de leitura no modo síncrono e no modo ASGI."""
+    processos = max(2, os.cpu_count() or 1)
+    modos = [
+        ('síncrono (Flask dev server)', 1, [sys.executable, '-c', _SERVIDOR_DEV]),
+        ('ASGI (uvicorn, 1 processo)', 1, [sys.executable, 'asgi.py']),
+        (f'ASGI (uvicorn, {processos} processos)', processos, [sys.executable, 'asgi.py']),
+    ]
+    print(f"{clientes} clientes concorrentes, {segundos}s por modo, rotas: {', '.join(ROTAS_LEITURA)}")
+    for nome, workers, comando in modos:
+        with tempfile.TemporaryDirectory() as tmp:
+            porta = _porta_livre()
+            processo = iniciar_servidor(comando, {
+                'DATABASE_PATH': os.path.join(tmp, 'bench.db'), 'WEB_CONCURRENCY': str(workers)
+            }, porta)
+            try:
+                cookie = popular_usuario(porta, 'bench@exemplo.com')
+                vazao, erros = medir_vazao(porta, cookie, clientes, segundos)
+            finally:
+                processo.terminate()
+                processo.wait()
+        print(f"{nome:32} {vazao:8.1f} req/s  ({erros} erros)")
+
+
+def benchmark_primeira_resposta():
+    """
+    Mede, após o deploy, o tempo até a primeira resposta e a latência das
+    primeiras requisições (cada uma em uma conexão nova) comparadas com a
+    latência em regime.
+    """
+    modos = [
+        ('Flask dev server (sem pré-aquecimento)', [sys.executable, '-c', _SERVIDOR_DEV]),
+        ('servidor.py (gunicorn pré-aquecido)', [sys.executable, 'servidor.py']),
+    ]
+    for nome, comando in modos:
+        with tempfile.TemporaryDirectory() as tmp:
+            porta = _porta_livre()
+            inicio = time.perf_counter()
+            processo = iniciar_servidor(comando, {'DATABASE_PATH': os.path.join(tmp, 'bench.db')}, porta)
+            try:
+                latencias = []
+                primeira = None
+                for _ in range(20):
+                    antes = time.perf_counter()
+                    status, _ = ClienteHttp(porta).requisitar('GET', '/login')
+                    latencias.append((time.perf_counter() - antes) * 1000)
+                    if primeira is None and status == 200:
+                        primeira = time.perf_counter() - inicio
+            finally:
+                processo.terminate()
+                processo.wait()
+        regime = sorted(latencias[5:])[len(latencias[5:]) // 2]
+        print(f"{nome:40} primeira resposta em {primeira:6.2f}s | "
+              f"1ª requisição {latencias[0]:6.1f} ms | mediana em regime {regime:5.1f} ms")
+
+
+def benchmark_sincronizacao(cartoes=500):
+    """
+    Compara o tamanho da resposta (bytes) de um refetch completo (fila em
+    `/` + `/api/dashboard-data`) com o de `/api/sync?since=<seq>` depois
+    de uma avaliação.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        porta = _porta_livre()
+        processo = iniciar_servidor([sys.executable, '-c', _SERVIDOR_DEV],
+                                    {'DATABASE_PATH': os.path.join(tmp, 'bench.db')}, porta)
+        try:
+            cliente = ClienteHttp(porta)
+            cliente.cookie = popular_usuario(porta, 'bench@exemplo.com', cartoes)
+
+            def medir(caminho):
+                antes = time.perf_counter()
+                status, dados = cliente.requisitar('GET', caminho)
+                return len(dados), (time.perf_counter() - antes) * 1000, dados
+
+            fila, t_fila, _ = medir('/')
+            dashboard, t_dashboard, _ = medir('/api/dashboard-data')
+            inicial, t_inicial, dados = medir('/api/sync?since=0')
+            estado = json.loads(dados)
+            pendente = next(r['id'] for r in estado['revisoes'] if not r['feito'])
+            cliente.post_json(f'/marcar/{pendente}', {'quality': 4, 'tempo_resposta': 3})
+            incremental, t_incremental, _ = medir(f"/api/sync?since={estado['seq']}")
+            vazio, t_vazio, _ = medir(f"/api/sync?since={estado['seq'] + 1}")
+        finally:
+            processo.terminate()
+            processo.wait()
+
+    print(f"{cartoes} cartões, 1 avaliação entre as sincronizações")
+    print(f"{'refetch completo (/ + dashboard-data)':40} {fila + dashboard:9d} bytes  {t_fila + t_dashboard:7.1f} ms")
+    print(f"{'/api/sync?since=0 (estado inicial)':40} {inicial:9d} bytes  {t_inicial:7.1f} ms")
+    print(f"{'/api/sync?since=<seq> (1 alteração)':40} {incremental:9d} bytes  {t_incremental:7.1f} ms")
+    print(f"{'/api/sync?since=<seq> (nada mudou)':40} {vazio:9d} bytes  {t_vazio:7.1f} ms")
+    print(f"Redução do payload: {(fila + dashboard) / incremental:.0f}x")
+
+
+def benchmark_avaliacao_duplicada(clientes=16, revisoes=20):
+    """
+    Envia a mesma avaliação de `clientes` conexões ao mesmo tempo, para
+    cada uma de `revisoes` revisões, com o servidor em 2 processos (a trava
+    de escrita de um processo não protege do outro). Cada revisão deve ser
+    concluída uma vez só, e revisões de outro usuário nunca. Sai com
+    código 1 se alguma avaliação for contada em dobro.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        porta = _porta_livre()
+        processo = iniciar_servidor([sys.executable, 'asgi.py'], {
+            'DATABASE_PATH': os.path.join(tmp, 'bench.db'), 'WEB_CONCURRENCY': '2', 'LIMITES_TAXA': ''
+        }, porta)
+        try:
+            dono = ClienteHttp(porta)
+            dono.cookie = popular_usuario(porta, 'dono@exemplo.com', revisoes)
+            outro = ClienteHttp(porta)
+            outro.cookie = popular_usuario(porta, 'outro@exemplo.com', 0)
+            _, dados = dono.requisitar('GET', '/api/sync?since=0')
+            pendentes = [r['id'] for r in json.loads(dados)['revisoes'] if not r['feito']]
+            avaliacao = {'quality': 4, 'nivel_confianca': 3, 'tempo_resposta': 3}
+
+            alheias = sum(json.loads(outro.post_json(f'/marcar/{i}', avaliacao)[1])['status'] == 'ok'
+                          for i in pendentes)
+
+            # Cada envio devolve o seu status; a contagem é somada na thread principal
+            contagem = Counter()
+            inicio = time.perf_counter()
+            for revisao_id in pendentes:
+                largada = threading.Barrier(clientes)
+
+                def avaliar(_):
+                    cliente = ClienteHttp(porta)
+                    cliente.cookie = dono.cookie
+                    largada.wait()
+                    status, corpo = cliente.post_json(f'/marcar/{revisao_id}', avaliacao)
+                    return json.loads(corpo)['status'] if status == 200 else f'HTTP {status}'
+
+                with ThreadPoolExecutor(clientes) as executor:
+                    contagem.update(executor.map(avaliar, range(clientes)))
+            decorrido = time.perf_counter() - inicio
+
+            _, dados = dono.requisitar('GET', '/api/sync?since=0')
+            estado = json.loads(dados)['revisoes']
+        finally:
+            processo.terminate()
+            processo.wait()
+
+    concluidas = sum(1 for r in estado if r['feito'])
+    print(f"{revisoes} revisões x {clientes} envios simultâneos (2 processos) em {decorrido:.2f}s")
+    print(f"  respostas: {', '.join(f'{k} {v}' for k, v in sorted(contagem.items()))}")
+    print(f"  revisões concluídas: {concluidas} (esperado {len(pendentes)}), "
+          f"revisões no total: {len(estado)} (esperado {2 * len(pendentes)})")
+    print(f"  avaliações aceitas em revisões de outro usuário: {alheias} (esperado 0)")
+    if contagem.get('ok') != len(pendentes) or concluidas != len(pendentes) \
+            or len(estado) != 2 * len(pendentes) or alheias:
+        print("FALHOU: avaliação contada em dobro ou aceita para outro usuário")
+        sys.exit(1)
+    print("OK: cada revisão foi concluída uma vez só")
+
+
+# Comandos da CLI que não devem carregar o app web nem dependências pesadas
+COMANDOS_LEVES = [['--help'], ['migrate'], ['stats']]
+MODULOS_PESADOS = ('flask', 'matplotlib', 'gunicorn', 'uvicorn', 'app')
+
+
+def medir_importacoes(argumentos, ambiente_extra=None):
+    """
+    Roda `python -X importtime -m sistema_revisao <argumentos>`.
+
+    Returns:
+        (tempo total de import em ms, conjunto de módulos importados)
+    """
+    comando = [sys.executable, '-X', 'importtime', '-m', 'sistema_revisao'] + argumentos
+    ambiente = dict(os.environ, **(ambiente_extra or {}))
+    processo = subprocess.run(comando, cwd=os.path.dirname(DIRETORIO), env=ambiente,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    total_us = 0
+    modulos = set()
+    for linha in processo.stderr.splitlines():
+        m = re.match(r'import time:\s+(\d+) \|\s+\d+ \| (\s*)(\S+)', linha)
+        if m:
+            total_us += int(m.group(1))
+            modulos.add(m.group(3))
+    return total_us / 1000, modulos
+
+
+def benchmark_inicializacao(orcamento_ms=100):
+    """
+    Verifica o orçamento de inicialização da CLI: cada comando leve deve
+    importar em até `orcamento_ms` e sem carregar os módulos pesados.
+    Sai com código 1 se algum comando estourar o orçamento.
+    """
+    falhas = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        ambiente = {'DATABASE_PATH': os.path.join(tmp, 'bench.db')}
+        for argumentos in COMANDOS_LEVES:
+            tempos = []
+            for _ in range(5):
+                tempo, modulos = medir_importacoes(argumentos, ambiente)
+                tempos.append(tempo)
+            tempo = sorted(tempos)[len(tempos) // 2]
+            pesados = sorted(m for m in modulos if m.split('.')[0] in MODULOS_PESADOS)
+            ok = tempo <= orcamento_ms and not pesados
+            falhas += not ok
+            print(f"{' '.join(argumentos):10} {tempo:7.1f} ms de import (mediana de 5)  "
+                  f"{'OK' if ok else 'FALHOU'}{'  pesados: ' + ', '.join(pesados) if pesados else ''}")
+    print(f"Orçamento: {orcamento_ms} ms por comando leve")
+    if falhas:
+        sys.exit(1)
+
+
+BENCHMARKS = {
+    'concorrencia': benchmark_concorrencia,
+    'primeira_resposta': benchmark_primeira_resposta,
+    'inicializacao': benchmark_inicializacao,
+    'sincronizacao': benchmark_sincronizacao,
+    'avaliacao_duplicada': benchmark_avaliacao_duplicada,
+}
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Uso: python benchmark.py <{'|'.join(BENCHMARKS)}> [argumentos]")
+        return
+    argumentos = [int(a) for a in sys.argv[2:]]
+    BENCHMARKS[sys.argv[1]](*argumentos)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Busca textual nos estudos (SQLite FTS5).
+
+`estudos_fts` é um índice FTS5 de conteúdo externo sobre as colunas
+materia, topico, pergunta, resposta e opcoes da view `vw_estudos`: o texto
+não é duplicado, só o índice invertido. A view resolve o conteúdo dos
+cartões de baralho assinados (baralhos.py), que na linha de `estudos` só
+têm a matéria e `cartao_baralho_id`. Triggers na tabela `estudos` indexam
+esse conteúdo resolvido a cada insert/update/delete, então não há
+reindexação em lote; os cartões de `cartoes_baralho` não mudam depois de
+publicados.
+
+O índice também tem a coluna usuario_id, e a consulta exige o id do
+usuário nela: o FTS5 cruza as listas de documentos do termo e do usuário
+e só ranqueia os estudos do próprio usuário. Filtrar por usuario_id
+depois do MATCH faria cada busca percorrer as ocorrências do termo em
+todas as contas.
+
+O tokenizer ignora acentos ("acao" encontra "Ação") e o índice de
+prefixos (2 e 3 caracteres) deixa a busca incremental (enquanto o
+usuário digita) tão barata quanto a busca por palavra inteira.
+
+Uso (benchmark FTS5 x LIKE em um banco temporário):
+    python busca.py [estudos] [usuarios]
+"""
+
+import html
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+COLUNAS = ('materia', 'topico', 'pergunta', 'resposta', 'opcoes')
+# Última coluna do índice, só para restringir o MATCH ao usuário
+COLUNA_USUARIO = 'usuario_id'
+COLUNAS_INDICE = COLUNAS + (COLUNA_USUARIO,)
+# Pesos do bm25 por coluna: matéria e tópico valem mais que o conteúdo
+PESOS = (4.0, 3.0, 1.0, 1.0, 0.5, 0.0)
+LIMITE_BUSCA = 50
+
+# Marcadores (área de uso privado do Unicode) trocados por <mark> depois do escape
+_INICIO, _FIM = '\ue000', '\ue001'
+
+
+def criar_indice_busca(cursor):
+    """
+    Cria o índice FTS5 e os triggers de sincronização (idempotente).
+
+    Na criação, indexa os estudos já existentes. Um índice anterior (sobre
+    `estudos`, sem o conteúdo dos baralhos) é recriado. Depende da view
+    `vw_estudos` (criar_tabelas_baralhos).
+
+    Returns:
+        True se o índice existe (FTS5 disponível no SQLite), False se não.
+    """
+    cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'estudos_fts'")
+    row = cursor.fetchone()
+    if row is not None and "content='vw_estudos'" not in row[0]:
+        for evento in ('insert', 'delete', 'update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS estudos_fts_{evento}')
+        cursor.execute('DROP TABLE estudos_fts')
+        row = None
+    existia = row is not None
+    try:
+        cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS estudos_fts USING fts5(
+            {', '.join(COLUNAS_INDICE)},
+            content='vw_estudos', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''')
+    except sqlite3.OperationalError:
+        # SQLite compilado sem FTS5: a busca usa LIKE
+        return False
+
+    colunas = ', '.join(COLUNAS_INDICE)
+    novos = _conteudo_resolvido('new')
+    antigos = _conteudo_resolvido('old')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS estudos_fts_insert AFTER INSERT ON estudos BEGIN
+        INSERT INTO estudos_fts(rowid, {colunas}) VALUES (new.id, {novos});
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS estudos_fts_delete AFTER DELETE ON estudos BEGIN
+        INSERT INTO estudos_fts(estudos_fts, rowid, {colunas}) VALUES ('delete', old.id, {antigos});
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS estudos_fts_update AFTER UPDATE OF {colunas}, cartao_baralho_id ON estudos BEGIN
+        INSERT INTO estudos_fts(estudos_fts, rowid, {colunas}) VALUES ('delete', old.id, {antigos});
+        INSERT INTO estudos_fts(rowid, {colunas}) VALUES (new.id, {novos});
+    END
+    ''')
+    if not existia:
+        cursor.execute("INSERT INTO estudos_fts(estudos_fts) VALUES ('rebuild')")
+    return True
+
+
+def _conteudo_resolvido(linha):
+    """
+    Valores indexados da linha `new`/`old` de um trigger: os mesmos da
+    view `vw_estudos` (o conteúdo próprio ou, se não houver, o do cartão
+    do baralho).
+    """
+    valores = []
+    for coluna in COLUNAS_INDICE:
+        if coluna in ('materia', COLUNA_USUARIO):
+            valores.append(f'{linha}.{coluna}')
+        else:
+            valores.append(f'COALESCE({linha}.{coluna}, '
+                           f'(SELECT {coluna} FROM cartoes_baralho WHERE id = {linha}.cartao_baralho_id))')
+    return ', '.join(valores)
+
+
+def fts_disponivel(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'estudos_fts'")
+    return cursor.fetchone() is not None
+
+
+def montar_consulta(texto, prefixo=True, usuario_id=None):
+    """
+    Converte o texto digitado em uma consulta FTS5 segura.
+
+    Cada palavra vira um termo entre aspas (sem operadores do FTS5); todas
+    precisam aparecer, nas colunas de conteúdo. Com `prefixo`, as palavras
+    casam como prefixo ("bio resp" encontra "Biologia - Respiração"). Com
+    `usuario_id`, só casam os estudos desse usuário.
+
+    Returns:
+        A consulta, ou None se o texto não tiver palavras.
+    """
+    palavras = re.findall(r'\w+', texto or '')
+    if not palavras:
+        return None
+    termos = ' '.join(f'"{p}"*' if prefixo else f'"{p}"' for p in palavras)
+    consulta = f"{{{' '.join(COLUNAS)}}} : ({termos})"
+    if usuario_id is None:
+        return consulta
+    return f'{COLUNA_USUARIO} : "{int(usuario_id)}" AND {consulta}'
+
+
+def _destacar(texto):
+    """Escapa o HTML e troca os marcadores do highlight() por <mark>."""
+    if texto is None:
+        return None
+    return html.escape(texto).replace(_INICIO, '<mark>').replace(_FIM, '</mark>')
+
+
+def _resultado(id_estudo, tipo_conteudo, campos, rank):
+    resultado = {'id': id_estudo, 'tipo_conteudo': tipo_conteudo, 'rank': rank}
+    for coluna, valor in zip(COLUNAS, campos):
+        if coluna == 'opcoes':
+            # JSON das alternativas do quiz: destaca cada alternativa
+            try:
+                valor = {alt: _destacar(texto) for alt, texto in json.loads(valor).items()} if valor else None
+            except (ValueError, AttributeError):
+                valor = None
+        else:
+            valor = _destacar(valor)
+        resultado[coluna] = valor
+    return resultado
+
+
+def buscar(cursor, usuario_id, texto, limite=LIMITE_BUSCA, prefixo=True):
+    """
+    Busca nos estudos do usuário, ordenando por relevância (bm25).
+
+    Returns:
+        Lista de dicts com id, tipo_conteudo, os campos com os termos
+        destacados em <mark> (HTML já escapado) e o rank.
+    """
+    consulta = montar_consulta(texto, prefixo, usuario_id)
+    if consulta is None:
+        return []
+    if not fts_disponivel(cursor):
+        return _buscar_like(cursor, usuario_id, texto, limite)
+    return _buscar_fts(cursor, usuario_id, consulta, limite)
+
+
+def _buscar_fts(cursor, usuario_id, consulta, limite):
+    destaques = ', '.join(
+        f"highlight(estudos_fts, {i}, '{_INICIO}', '{_FIM}')" for i in range(len(COLUNAS)))
+    cursor.execute(f'''
+        SELECT e.id, COALESCE(e.tipo_conteudo, 'simples'), {destaques},
+               bm25(estudos_fts, {', '.join(str(p) for p in PESOS)}) AS rank
+        FROM estudos_fts
+        JOIN vw_estudos e ON e.id = estudos_fts.rowid
+        WHERE estudos_fts MATCH ? AND e.usuario_id = ?
+        ORDER BY rank
+        LIMIT ?
+    ''', (consulta, usuario_id, limite))
+    return [_resultado(id_estudo, tipo_conteudo, campos, round(rank, 4))
+            for id_estudo, tipo_conteudo, *campos, rank in cursor.fetchall()]
+
+
+def _buscar_like(cursor, usuario_id, texto, limite):
+    """Busca sem FTS5: LIKE em todas as colunas, sem ranking nem destaque."""
+    palavras = re.findall(r'\w+', texto)
+    condicoes = ' AND '.join(
+        '(' + ' OR '.join(f'{c} LIKE ?' for c in COLUNAS) + ')' for _ in palavras)
+    parametros = [f'%{p}%' for p in palavras for _ in COLUNAS]
+    cursor.execute(f'''
+        SELECT id, COALESCE(tipo_conteudo, 'simples'), {', '.join(COLUNAS)}
+        FROM vw_estudos
+        WHERE usuario_id = ? AND {condicoes}
+        LIMIT ?
+    ''', [usuario_id] + parametros + [limite])
+    return [_resultado(id_estudo, tipo_conteudo, campos, None)
+            for id_estudo, tipo_conteudo, *campos in cursor.fetchall()]
+
+
+def main():
+    """
+    Compara, em um banco temporário com N estudos de U usuários, a busca
+    restrita ao usuário no índice, o MATCH em todos os usuários com o
+    filtro por usuario_id depois (como era antes) e o LIKE.
+    """
+    from banco import migrar
+    from consultas import conectar
+
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    usuarios = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    aleatorio = random.Random(42)
+    vocabulario = [''.join(aleatorio.choice('abcdefghijlmnoprstuv') for _ in range(aleatorio.randint(3, 10)))
+                   for _ in range(5000)]
+
+    def frase(n):
+        return ' '.join(aleatorio.choice(vocabulario) for _ in range(n))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'busca.db')
+        migrar(caminho)
+        conn = conectar(caminho)
+        cursor = conn.cursor()
+        cursor.executemany("INSERT INTO usuarios (nome, email, senha) VALUES (?, ?, 'x')",
+                           [(f'Usuário {i}', f'usuario{i}@exemplo.com') for i in range(usuarios)])
+        cursor.execute('SELECT id FROM usuarios ORDER BY id')
+        ids = [row[0] for row in cursor.fetchall()]
+        inicio = time.perf_counter()
+        # Em lotes, para 1 milhão de estudos caber na memória
+        lote = 50000
+        for comeco in range(0, total, lote):
+            cursor.executemany('''
+                INSERT INTO estudos (materia, topico, data_estudo, usuario_id, tipo_conteudo, pergunta, resposta)
+                VALUES (?, ?, '2025-01-01', ?, 'flashcard', ?, ?)
+            ''', ((frase(1), frase(3), ids[i % usuarios], frase(15), frase(25))
+                  for i in range(comeco, min(total, comeco + lote))))
+            conn.commit()
+        print(f"{total} estudos de {usuarios} usuários inseridos (com triggers do FTS5) "
+              f"em {time.perf_counter() - inicio:.2f}s")
+
+        # Termos existentes e termos que não aparecem (o LIKE varre os estudos do usuário)
+        usuario_id = ids[0]
+        existentes = [aleatorio.choice(vocabulario) for _ in range(200)]
+        ausentes = [f'{t}xq' for t in existentes]
+        print(f"Buscas de um usuário com {len(range(0, total, usuarios))} estudos (p50 / p95)")
+        for nome, funcao in (
+            ('FTS5 (palavra)', lambda t: buscar(cursor, usuario_id, t, prefixo=False)),
+            ('FTS5 (prefixo)', lambda t: buscar(cursor, usuario_id, t)),
+            ('FTS5 (prefixo, MATCH em todos)',
+             lambda t: _buscar_fts(cursor, usuario_id, montar_consulta(t), LIMITE_BUSCA)),
+            ('LIKE %termo%', lambda t: _buscar_like(cursor, usuario_id, t, LIMITE_BUSCA)),
+        ):
+            colunas = []
+            for termos in (existentes, ausentes):
+                tempos = []
+                for termo in termos:
+                    inicio = time.perf_counter()
+                    funcao(termo)
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+                tempos.sort()
+                colunas.append(f"{tempos[len(tempos) // 2]:7.2f} / {tempos[int(len(tempos) * 0.95)]:7.2f} ms")
+            print(f"  {nome:30} termo existente {colunas[0]}   termo ausente {colunas[1]}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Cache em memória por usuário.
+
+Os resultados ficam guardados até a próxima escrita do usuário
+(cadastro ou avaliação de revisão), que chama `invalidar`. Cada
+invalidação também incrementa a versão de dados do usuário, que pode ser
+usada como parte de chaves de cache externas.
+
+As chaves costumam incluir o dia e a versão de dados (lida do banco, que
+muda também com escritas de outros processos), então entradas antigas
+deixam de ser consultadas sem que ninguém as invalide. O cache é LRU e
+limitado: até MAX_CHAVES_USUARIO chaves por usuário e MAX_USUARIOS
+usuários por processo; as menos usadas saem primeiro.
+"""
+
+import threading
+from collections import OrderedDict
+
+MAX_USUARIOS = 1000
+MAX_CHAVES_USUARIO = 16
+
+
+class CacheUsuario:
+    """Cache de resultados calculados, separado por usuário."""
+
+    def __init__(self, max_usuarios=MAX_USUARIOS, max_chaves=MAX_CHAVES_USUARIO):
+        self._dados = OrderedDict()
+        self._versoes = {}
+        self._max_usuarios = max_usuarios
+        self._max_chaves = max_chaves
+        self._lock = threading.Lock()
+
+    def obter(self, usuario_id, chave):
+        """Retorna o valor guardado ou None se não houver."""
+        with self._lock:
+            valores = self._dados.get(usuario_id)
+            if valores is None or chave not in valores:
+                return None
+            self._dados.move_to_end(usuario_id)
+            valores.move_to_end(chave)
+            return valores[chave]
+
+    def guardar(self, usuario_id, chave, valor):
+        """Guarda um valor até a próxima invalidação do usuário (ou até sair pelo LRU)."""
+        with self._lock:
+            valores = self._dados.get(usuario_id)
+            if valores is None:
+                valores = self._dados[usuario_id] = OrderedDict()
+                if len(self._dados) > self._max_usuarios:
+                    self._dados.popitem(last=False)
+            else:
+                self._dados.move_to_end(usuario_id)
+            valores[chave] = valor
+            valores.move_to_end(chave)
+            if len(valores) > self._max_chaves:
+                valores.popitem(last=False)
+        return valor
+
+    def invalidar(self, usuario_id):
+        """Descarta os valores do usuário e avança sua versão de dados."""
+        with self._lock:
+            self._dados.pop(usuario_id, None)
+            self._versoes[usuario_id] = self._versoes.get(usuario_id, 0) + 1
+
+    def versao(self, usuario_id):
+        """Versão atual dos dados do usuário neste processo."""
+        with self._lock:
+            return self._versoes.get(usuario_id, 0)
+
+
+cache_usuario = CacheUsuario()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Linha de comando unificada do sistema.
+
+Cada subcomando importa o que precisa só quando é executado (Flask,
+gunicorn, uvicorn, SMTP...), então `--help` e os comandos de manutenção
+iniciam sem carregar o app web.
+
+Uso:
+    python -m sistema_revisao serve [--producao | --asgi]
+    python -m sistema_revisao reminders
+    python -m sistema_revisao migrate
+    python -m sistema_revisao stats [--email EMAIL]
+    python -m sistema_revisao export EMAIL [arquivo.csv]
+    python -m sistema_revisao import EMAIL arquivo.csv [--duplicatas MODO]
+    python -m sistema_revisao optimize [--processos N] [--simular] [--retencao R]
+    python -m sistema_revisao rollup [--processos N]
+    python -m sistema_revisao archive [--dias N]
+    python -m sistema_revisao midia-limpar [--carencia S]
+    python -m sistema_revisao fragmentar [--fragmentos N]
+    python -m sistema_revisao benchmark <nome> [argumentos]
+
+Variáveis de ambiente: as mesmas de config.py (DATABASE_PATH, SECRET_KEY...).
+Com FRAGMENTOS > 0 (fragmentos.py), os comandos usam o fragmento do
+usuário (export/import) ou percorrem todos os fragmentos (migrate, stats,
+optimize, rollup, archive, midia-limpar).
+"""
+
+import argparse
+import os
+import sys
+
+# Colunas do CSV de exportação/importação
+COLUNAS_CSV = ['materia', 'topico', 'data_estudo', 'tipo_conteudo', 'pergunta', 'resposta', 'opcoes']
+
+
+def _caminho_banco():
+    from config import Config
+    return Config.DATABASE_PATH
+
+
+def _caminhos_dados():
+    """Bancos com dados de usuários: os fragmentos, se ativos, senão o principal."""
+    import fragmentos
+    return fragmentos.caminhos_fragmentos() if fragmentos.ativo() else [_caminho_banco()]
+
+
+def _caminho_usuario(email):
+    """Banco com os dados do usuário (o fragmento dele, se ativo) e o id."""
+    import fragmentos
+    from consultas import conectar
+    conn = conectar(_caminho_banco())
+    try:
+        usuario_id = _id_usuario(conn.cursor(), email)
+    finally:
+        conn.close()
+    if not fragmentos.ativo():
+        return _caminho_banco(), usuario_id
+    caminho = fragmentos.PoolFragmentos().preparar(fragmentos.indice_fragmento(usuario_id))
+    return caminho, usuario_id
+
+
+def _id_usuario(cursor, email):
+    cursor.execute('SELECT id FROM usuarios WHERE email = ?', (email,))
+    row = cursor.fetchone()
+    if row is None:
+        raise SystemExit(f"Usuário não encontrado: {email}")
+    return row[0]
+
+
+def cmd_serve(args):
+    """Servidor web: desenvolvimento (padrão), gunicorn ou uvicorn."""
+    if args.producao:
+        import servidor
+        servidor.main()
+    elif args.asgi:
+        import asgi
+        asgi.main()
+    else:
+        from app import create_app
+        create_app('development').run(debug=True)
+
+
+def cmd_reminders(args):
+    """Loop de lembretes por email."""
+    import lembretes
+    lembretes.main()
+
+
+def cmd_migrate(args):
+    """Aplica as migrações no banco configurado (e nos fragmentos, se ativos)."""
+    import banco
+    import fragmentos
+    caminho = _caminho_banco()
+    banco.migrar(caminho)
+    print(f"Banco migrado: {caminho}")
+    if fragmentos.ativo():
+        caminhos = fragmentos.caminhos_fragmentos()
+        fragmentos.em_paralelo(banco.migrar, caminhos)
+        print(f"{len(caminhos)} fragmentos migrados")
+
+
+def _totais(caminho, usuarios):
+    """{usuario_id: (estudos, concluídas, pendentes)} dos usuários no banco `caminho`."""
+    from consultas import conectar, executar
+    conn = conectar(caminho)
+    cursor = conn.cursor()
+    try:
+        return {usuario_id: tuple(executar(cursor, nome, (usuario_id,)).fetchone()[0]
+                                  for nome in ('total_estudos', 'total_concluidas', 'total_pendentes'))
+                for usuario_id in usuarios}
+    finally:
+        conn.close()
+
+
+def cmd_stats(args):
+    """Totais de estudos e revisões por usuário (fragmentos consultados em paralelo)."""
+    import fragmentos
+    from consultas import conectar
+    conn = conectar(_caminho_banco())
+    cursor = conn.cursor()
+    if args.email:
+        cursor.execute('SELECT id, nome, email FROM usuarios WHERE email = ?', (args.email,))
+    else:
+        cursor.execute('SELECT id, nome, email FROM usuarios ORDER BY id')
+    usuarios = cursor.fetchall()
+    conn.close()
+    grupos = {}
+    for usuario_id, _, _ in usuarios:
+        caminho = (fragmentos.caminho_fragmento(fragmentos.indice_fragmento(usuario_id)) if fragmentos.ativo()
+                   else _caminho_banco())
+        grupos.setdefault(caminho, []).append(usuario_id)
+    caminhos = [caminho for caminho in grupos if os.path.exists(caminho)]
+    totais = {}
+    for parcial in fragmentos.em_paralelo(lambda caminho: _totais(caminho, grupos[caminho]), caminhos):
+        totais.update(parcial)
+    print(f"{'ID':>4}  {'Nome':20} {'Email':30} {'Estudos':>8} {'Concluídas':>10} {'Pendentes':>9}")
+    for usuario_id, nome, email in usuarios:
+        estudos, concluidas, pendentes = totais.get(usuario_id, (0, 0, 0))
+        print(f"{usuario_id:>4}  {nome[:20]:20} {email[:30]:30} {estudos:>8} {concluidas:>10} {pendentes:>9}")
+
+
+def cmd_export(args):
+    """Exporta os estudos de um usuário para CSV."""
+    import csv
+    from consultas import conectar
+    caminho, usuario_id = _caminho_usuario(args.email)
+    conn = conectar(caminho)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(COLUNAS_CSV)} FROM vw_estudos WHERE usuario_id = ? ORDER BY id", (usuario_id,))
+    saida = open(args.arquivo, 'w', newline='', encoding='utf-8') if args.arquivo else sys.stdout
+    try:
+        escritor = csv.writer(saida)
+        escritor.writerow(COLUNAS_CSV)
+        escritor.writerows(cursor)
+    finally:
+        if saida is not sys.stdout:
+            saida.close()
+        conn.close()
+
+
+def cmd_import(args):
+    """Importa estudos de um CSV (mesmo formato do export) em uma transação."""
+    import csv
+    import banco
+    from consultas import conectar
+    from dedup import IndiceDuplicatas
+    from estudos import cadastrar_estudo
+    banco.migrar(_caminho_banco())
+    caminho, usuario_id = _caminho_usuario(args.email)
+    conn = conectar(caminho)
+    cursor = conn.cursor()
+    # Hashes e bandas do usuário em memória: uma consulta só, não uma por linha
+    indice = IndiceDuplicatas(cursor, usuario_id, carregar=args.duplicatas != 'permitir')
+    total = mescladas = marcadas = 0
+    with open(args.arquivo, newline='', encoding='utf-8') as entrada:
+        for linha in csv.DictReader(entrada):
+            _, hoje, duplicata = cadastrar_estudo(
+                cursor, indice, linha['materia'], linha['topico'],
+                (linha.get('tipo_conteudo') or 'simples').strip().lower(),
+                linha.get('pergunta') or None, linha.get('resposta') or None,
+                linha.get('opcoes') or None, linha.get('data_estudo') or None, args.duplicatas)
+            if hoje is None:
+                mescladas += 1
+                continue
+            total += 1
+            marcadas += duplicata is not None
+    conn.commit()
+    conn.close()
+    print(f"{total} estudos importados para {args.email} "
+          f"({mescladas} duplicatas ignoradas, {marcadas} marcadas como duplicata)")
+
+
+def cmd_optimize(args):
+    """Ajusta os perfis de agendamento a partir do histórico (otimizador.py)."""
+    import banco
+    import otimizador
+    if not 0.7 <= args.retencao <= 0.97:
+        raise SystemExit("--retencao deve estar entre 0.7 e 0.97")
+    for caminho in _caminhos_dados():
+        banco.migrar(caminho)
+        otimizador.relatorio(*otimizador.otimizar(caminho, args.processos, not args.simular, args.retencao))
+
+
+def cmd_rollup(args):
+    """Recalcula as estatísticas consolidadas de todos os usuários (consolidacao.py)."""
+    import banco
+    import consolidacao
+    for caminho in _caminhos_dados():
+        banco.migrar(caminho)
+        medicoes = consolidacao.consolidar(caminho, args.processos)
+        print(f"{caminho}: {medicoes['gravados']} usuários consolidados em {medicoes['tempo_total']:.2f}s "
+              f"({medicoes['processos']} processos, {medicoes['transacoes']} transações)")
+
+
+def cmd_archive(args):
+    """Move o histórico de revisões concluídas antigas para o arquivo (arquivo.py)."""
+    import time
+
+    import arquivo
+    import banco
+    from consultas import conectar
+    for caminho in _caminhos_dados():
+        banco.migrar(caminho)
+        conn = conectar(caminho)
+        try:
+            inicio = time.perf_counter()
+            arquivadas = arquivo.arquivar_revisoes(conn, args.dias, args.lote)
+        finally:
+            conn.close()
+        print(f"{caminho}: {arquivadas} revisões arquivadas (concluídas há mais de {args.dias} dias) "
+              f"em {time.perf_counter() - inicio:.2f}s")
+
+
+def cmd_midia_limpar(args):
+    """Apaga as mídias sem vínculo (midia.py), conferindo todos os bancos."""
+    import banco
+    import midia
+    from consultas import conectar
+    # O diretório de mídias é comum a todos os fragmentos (e ao catálogo)
+    caminhos = list(dict.fromkeys([_caminho_banco()] + _caminhos_dados()))
+    for caminho in caminhos:
+        banco.migrar(caminho)
+    conexoes = [conectar(caminho) for caminho in caminhos]
+    try:
+        removidas = midia.remover_orfas(conexoes, args.carencia)
+    finally:
+        for conn in conexoes:
+            conn.close()
+    print(f"{removidas} mídias órfãs removidas ({len(caminhos)} bancos conferidos)")
+
+
+def cmd_fragmentar(args):
+    """Copia os dados do banco único para os fragmentos (fragmentos.py)."""
+    import banco
+    import fragmentos
+    from config import Config
+    total = args.fragmentos or Config.FRAGMENTOS
+    if total <= 0:
+        raise SystemExit("Informe --fragmentos N ou FRAGMENTOS no ambiente")
+    caminho = _caminho_banco()
+    banco.migrar(caminho)
+    try:
+        resultado = fragmentos.fragmentar(caminho, total)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    for destino, usuarios in resultado.items():
+        print(f"{destino}: {usuarios} usuários")
+    print(f"Defina FRAGMENTOS={total} para usar os fragmentos ({caminho} continua como catálogo de contas)")
+
+
+def cmd_benchmark(args):
+    """Executa um benchmark de benchmark.py."""
+    import benchmark
+    if args.nome not in benchmark.BENCHMARKS:
+        raise SystemExit(f"Benchmark desconhecido: {args.nome} (opções: {', '.join(benchmark.BENCHMARKS)})")
+    benchmark.BENCHMARKS[args.nome](*[int(a) for a in args.argumentos])
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog='sistema_revisao', description='Sistema de revisão de estudos')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p = sub.add_parser('serve', help='inicia o servidor web')
+    modo = p.add_mutually_exclusive_group()
+    modo.add_argument('--producao', action='store_true', help='gunicorn com workers pré-aquecidos')
+    modo.add_argument('--asgi', action='store_true', help='uvicorn (modo ASGI)')
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser('reminders', help='envia lembretes por email em loop')
+    p.set_defaults(func=cmd_reminders)
+
+    p = sub.add_parser('migrate', help='aplica as migrações do banco')
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser('stats', help='estatísticas por usuário')
+    p.add_argument('--email', help='apenas este usuário')
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser('export', help='exporta os estudos de um usuário para CSV')
+    p.add_argument('email')
+    p.add_argument('arquivo', nargs='?', help='arquivo de saída (padrão: stdout)')
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('import', help='importa estudos de um CSV')
+    p.add_argument('email')
+    p.add_argument('arquivo')
+    p.add_argument('--duplicatas', choices=('mesclar', 'marcar', 'permitir'), default='mesclar',
+                   help='mesclar: ignora duplicatas exatas e marca as parecidas (padrão); '
+                        'marcar: importa tudo e marca; permitir: sem verificação')
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser('optimize', help='ajusta os perfis de agendamento pelo histórico')
+    p.add_argument('--processos', type=int, default=None, help='processos (padrão: núcleos)')
+    p.add_argument('--simular', action='store_true', help='só mostra o resultado, sem gravar perfis')
+    p.add_argument('--retencao', type=float, default=0.9, help='retenção alvo (padrão 0.9)')
+    p.set_defaults(func=cmd_optimize)
+
+    p = sub.add_parser('rollup', help='consolida as estatísticas diárias de todos os usuários')
+    p.add_argument('--processos', type=int, default=None, help='processos (padrão: núcleos)')
+    p.set_defaults(func=cmd_rollup)
+
+    p = sub.add_parser('archive', help='arquiva as revisões concluídas antigas, em lotes')
+    p.add_argument('--dias', type=int, default=int(os.getenv('DIAS_ARQUIVAMENTO', '90')),
+                   help='idade mínima das revisões (padrão: DIAS_ARQUIVAMENTO ou 90)')
+    p.add_argument('--lote', type=int, default=1000, help='estudos por transação (padrão 1000)')
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser('midia-limpar', help='apaga as mídias sem vínculo em nenhum banco')
+    p.add_argument('--carencia', type=int, default=3600, metavar='S',
+                   help='preserva os arquivos gravados há menos de S segundos (padrão 3600)')
+    p.set_defaults(func=cmd_midia_limpar)
+
+    p = sub.add_parser('fragmentar', help='copia os dados do banco único para os fragmentos por usuário')
+    p.add_argument('--fragmentos', type=int, default=None, help='quantidade (padrão: FRAGMENTOS)')
+    p.set_defaults(func=cmd_fragmentar)
+
+    p = sub.add_parser('benchmark', help='executa um benchmark')
+    p.add_argument('nome')
+    p.add_argument('argumentos', nargs='*')
+    p.set_defaults(func=cmd_benchmark)
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,28 @@ class Config:
     
     # Configurações do banco de dados
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'revisao_estudos.db')
+    CACHED_STATEMENTS = int(os.getenv('CACHED_STATEMENTS', '128'))  # Cache de statements por conexão
+    GRAFICOS_DIR = os.getenv('GRAFICOS_DIR', 'graficos_cache')  # Cache em disco dos gráficos PNG
+    MIDIA_DIR = os.getenv('MIDIA_DIR', 'midia')  # Imagens e áudios dos cartões (nome = hash do conteúdo)
+    MIDIA_TAMANHO_MAX = int(os.getenv('MIDIA_TAMANHO_MAX', str(10 * 1024 * 1024)))  # Bytes por arquivo
+    SIMILARIDADE_DUPLICATA = float(os.getenv('SIMILARIDADE_DUPLICATA', '0.8'))  # Quase duplicatas (MinHash); 0 desativa
+    LIMITE_REVISOES_DIA = int(os.getenv('LIMITE_REVISOES_DIA', '200'))  # Padrão por usuário; 0 = sem limite
+    LIMITE_NOVOS_DIA = int(os.getenv('LIMITE_NOVOS_DIA', '20'))  # Cartões novos por dia; 0 = sem limite
+    FRAGMENTOS = int(os.getenv('FRAGMENTOS', '0'))  # Bancos por usuário (usuario_id % N); 0 = banco único
+    FRAGMENTOS_DIR = os.getenv('FRAGMENTOS_DIR', 'fragmentos')
+    FRAGMENTOS_ABERTOS = int(os.getenv('FRAGMENTOS_ABERTOS', '32'))  # Conexões mantidas abertas (LRU)
+    # Limite de taxa por rota: rota=N/segundos (rajada de N, reabastecida em `segundos`); vazio desativa
+    LIMITES_TAXA = os.getenv('LIMITES_TAXA', 'login=30/60,register=20/3600,cadastrar=60/60,marcar_feita=120/60,'
+                            'api_sync_avaliacoes=600/600')
+    FILA_ESCRITA_MAX = int(os.getenv('FILA_ESCRITA_MAX', '32'))  # Requisições esperando a trava de escrita; 0 = sem limite
+    FILA_ESCRITA_ESPERA = float(os.getenv('FILA_ESCRITA_ESPERA', '2'))  # Segundos de espera antes de responder 503
+    # E-mails (separados por vírgula) que podem ver /api/metricas/*; vazio = ninguém
+    METRICAS_ADMINS = os.getenv('METRICAS_ADMINS', '')
+    
+    # Configurações do servidor (modo ASGI/produção)
+    HOST = os.getenv('HOST', '127.0.0.1')
+    PORT = int(os.getenv('PORT', '8000'))
+    WORKERS = int(os.getenv('WEB_CONCURRENCY', '2'))  # Processos do servidor
     
     # Configurações de email (opcional)
     EMAIL_REMETENTE = os.getenv('EMAIL_REMETENTE')
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Consolidação noturna das estatísticas por usuário.
+
+Recalcula fora das rotas, para todos os usuários, os agregados que o
+dashboard e os relatórios consultam:
+
+- consolidado_diario: revisões concluídas, avaliadas, acertos
+  (quality >= 3) e soma das qualities por usuário/dia
+- consolidado_materias: o mesmo por matéria, mais confiança média, tempo
+  de resposta, quantidade de cartões e EF médio (card_state)
+- consolidado_usuarios: sequência atual e recorde de dias com revisões
+
+As contas incluem o histórico arquivado (revisoes_arquivo_diario).
+
+Os usuários são divididos em lotes entre processos (ProcessPoolExecutor).
+Cada processo abre a própria conexão de leitura e calcula os agregados de
+seus usuários; os resultados vão por uma fila limitada para um único
+escritor no processo principal, que grava vários usuários por transação
+(o SQLite aceita um escritor por vez). Se o escritor ficar para trás, a
+fila cheia segura os processos de cálculo.
+
+Uso:
+    python consolidacao.py [--processos N]
+    python consolidacao.py --sintetico 1000000 [--processos N]   (benchmark)
+"""
+
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+USUARIOS_POR_TAREFA = 50      # usuários por lote enviado a um processo
+USUARIOS_POR_TRANSACAO = 200  # usuários gravados por commit
+TAMANHO_FILA = 1000           # resultados aguardando o escritor
+
+# Estado de cada processo de cálculo (initializer do pool)
+_conn_leitura = None
+_fila = None
+
+
+def criar_tabelas_consolidacao(cursor):
+    """Cria as tabelas consolidadas (idempotente)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS consolidado_diario (
+        usuario_id INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        concluidas INTEGER DEFAULT 0,
+        avaliadas INTEGER DEFAULT 0,
+        acertos INTEGER DEFAULT 0,
+        soma_quality INTEGER DEFAULT 0,
+        PRIMARY KEY (usuario_id, data)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS consolidado_materias (
+        usuario_id INTEGER NOT NULL,
+        materia TEXT NOT NULL,
+        concluidas INTEGER DEFAULT 0,
+        avaliadas INTEGER DEFAULT 0,
+        acertos INTEGER DEFAULT 0,
+        soma_quality INTEGER DEFAULT 0,
+        confianca_media REAL,
+        tempo_medio REAL,
+        cartoes INTEGER DEFAULT 0,
+        ef_medio REAL,
+        PRIMARY KEY (usuario_id, materia)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS consolidado_usuarios (
+        usuario_id INTEGER PRIMARY KEY,
+        sequencia_atual INTEGER DEFAULT 0,
+        sequencia_recorde INTEGER DEFAULT 0,
+        ultimo_dia TEXT,
+        data_calculo TEXT
+    )
+    ''')
+
+
+def sequencias(dias, hoje=None):
+    """
+    Sequência atual e recorde de dias seguidos com revisões.
+
+    A sequência atual conta se o último dia for hoje ou ontem (o dia de
+    hoje ainda pode ser estudado).
+
+    Args:
+        dias: Datas "YYYY-MM-DD" com revisões, em ordem crescente.
+    """
+    hoje = hoje or datetime.now().date()
+    atual = recorde = 0
+    anterior = None
+    for texto in dias:
+        dia = datetime.strptime(texto, "%Y-%m-%d").date()
+        atual = atual + 1 if anterior is not None and (dia - anterior).days == 1 else 1
+        recorde = max(recorde, atual)
+        anterior = dia
+    if anterior is None or (hoje - anterior).days > 1:
+        atual = 0
+    return atual, recorde
+
+
+def consolidar_usuario(cursor, usuario_id, hoje=None):
+    """
+    Calcula os agregados de um usuário (só leitura).
+
+    Returns:
+        Dict com as linhas de cada tabela consolidada.
+    """
+    cursor.execute('''
+        SELECT data, SUM(concluidas), SUM(avaliadas), SUM(acertos), SUM(soma_quality)
+        FROM (
+            SELECT r.data_revisao AS data, COUNT(*) AS concluidas, COUNT(r.quality) AS avaliadas,
+                   COALESCE(SUM(r.quality >= 3), 0) AS acertos, COALESCE(SUM(r.quality), 0) AS soma_quality
+            FROM estudos e
+            JOIN revisoes r ON r.id_estudo = e.id
+            WHERE e.usuario_id = ? AND r.feito = 1
+            GROUP BY r.data_revisao
+            UNION ALL
+            SELECT data, concluidas, avaliadas, acertos, soma_quality
+            FROM revisoes_arquivo_diario
+            WHERE usuario_id = ?
+        )
+        GROUP BY data
+        ORDER BY data
+    ''', (usuario_id, usuario_id))
+    diario = [(usuario_id,) + row for row in cursor.fetchall()]
+
+    cursor.execute('''
+        SELECT materia, SUM(concluidas), SUM(avaliadas), SUM(acertos), SUM(soma_quality),
+               MAX(confianca_media), MAX(tempo_medio)
+        FROM (
+            SELECT COALESCE(e.materia, '') AS materia, COUNT(*) AS concluidas, COUNT(r.quality) AS avaliadas,
+                   COALESCE(SUM(r.quality >= 3), 0) AS acertos, COALESCE(SUM(r.quality), 0) AS soma_quality,
+                   AVG(r.nivel_confianca) AS confianca_media, AVG(r.tempo_resposta) AS tempo_medio
+            FROM estudos e
+            JOIN revisoes r ON r.id_estudo = e.id
+            WHERE e.usuario_id = ? AND r.feito = 1
+            GROUP BY 1
+            UNION ALL
+            SELECT materia, SUM(concluidas), SUM(avaliadas), SUM(acertos), SUM(soma_quality), NULL, NULL
+            FROM revisoes_arquivo_diario
+            WHERE usuario_id = ?
+            GROUP BY materia
+        )
+        GROUP BY materia
+    ''', (usuario_id, usuario_id))
+    materias = {row[0]: list(row[1:]) + [0, None] for row in cursor.fetchall()}
+
+    cursor.execute('''
+        SELECT COALESCE(e.materia, ''), COUNT(*), AVG(cs.ef)
+        FROM card_state cs
+        JOIN estudos e ON e.id = cs.id_estudo
+        WHERE cs.usuario_id = ?
+        GROUP BY 1
+    ''', (usuario_id,))
+    for materia, cartoes, ef_medio in cursor.fetchall():
+        linha = materias.setdefault(materia, [0, 0, 0, 0, None, None, 0, None])
+        linha[6], linha[7] = cartoes, ef_medio
+
+    dias = [row[1] for row in diario if row[2] > 0]
+    atual, recorde = sequencias(dias, hoje)
+    return {
+        'diario': diario,
+        'materias': [(usuario_id, materia) + tuple(valores) for materia, valores in materias.items()],
+        'usuario': (usuario_id, atual, recorde, dias[-1] if dias else None,
+                    datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+    }
+
+
+def _iniciar_processo(caminho, fila):
+    """Initializer do pool: uma conexão de leitura por processo."""
+    global _conn_leitura, _fila
+    _conn_leitura = sqlite3.connect(f'file:{caminho}?mode=ro', uri=True)
+    _conn_leitura.execute('PRAGMA query_only = ON')
+    _fila = fila
+
+
+def _consolidar_lote(usuarios):
+    """Calcula um lote de usuários e envia cada resultado ao escritor."""
+    cursor = _conn_leitura.cursor()
+    inicio = time.perf_counter()
+    for usuario_id in usuarios:
+        _fila.put(consolidar_usuario(cursor, usuario_id))
+    return len(usuarios), time.perf_counter() - inicio
+
+
+def gravar_resultados(conn, resultados):
+    """Substitui os agregados dos usuários de `resultados` em uma transação."""
+    cursor = conn.cursor()
+    usuarios = [(r['usuario'][0],) for r in resultados]
+    try:
+        for tabela in ('consolidado_diario', 'consolidado_materias'):
+            cursor.executemany(f'DELETE FROM {tabela} WHERE usuario_id = ?', usuarios)
+        cursor.executemany('''
+            INSERT INTO consolidado_diario (usuario_id, data, concluidas, avaliadas, acertos, soma_quality)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [linha for r in resultados for linha in r['diario']])
+        cursor.executemany('''
+            INSERT INTO consolidado_materias (usuario_id, materia, concluidas, avaliadas, acertos, soma_quality,
+                                              confianca_media, tempo_medio, cartoes, ef_medio)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [linha for r in resultados for linha in r['materias']])
+        cursor.executemany('''
+            INSERT OR REPLACE INTO consolidado_usuarios (usuario_id, sequencia_atual, sequencia_recorde, ultimo_dia, data_calculo)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [r['usuario'] for r in resultados])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _escritor(caminho, fila, medicoes):
+    """Único escritor: agrupa os resultados da fila em transações."""
+    conn = sqlite3.connect(caminho, timeout=30)
+    pendentes = []
+    ocupado = 0.0
+    while True:
+        resultado = fila.get()
+        if resultado is not None and 'erro' not in medicoes:
+            pendentes.append(resultado)
+        if pendentes and (resultado is None or len(pendentes) >= USUARIOS_POR_TRANSACAO):
+            inicio = time.perf_counter()
+            try:
+                gravar_resultados(conn, pendentes)
+                medicoes['gravados'] += len(pendentes)
+                medicoes['transacoes'] += 1
+            except Exception as e:
+                # Continua consumindo a fila para não travar os processos de cálculo
+                medicoes['erro'] = e
+            ocupado += time.perf_counter() - inicio
+            pendentes = []
+        if resultado is None:
+            break
+    conn.close()
+    medicoes['tempo_escrita'] = ocupado
+
+
+def consolidar(caminho, processos=None, usuarios=None):
+    """
+    Consolida todos os usuários (ou os de `usuarios`).
+
+    Returns:
+        Dict com usuários gravados, transações e tempos (total, cálculo
+        somado nos processos e escrita).
+    """
+    # Importados aqui: banco.py importa este módulo e `migrate` deve iniciar rápido
+    import multiprocessing
+    import threading
+    from concurrent.futures import ProcessPoolExecutor
+
+    conn = sqlite3.connect(caminho, timeout=30)
+    cursor = conn.cursor()
+    criar_tabelas_consolidacao(cursor)
+    conn.commit()
+    if usuarios is None:
+        cursor.execute('SELECT id FROM usuarios ORDER BY id')
+        usuarios = [row[0] for row in cursor.fetchall()]
+    conn.close()
+
+    processos = processos or os.cpu_count() or 1
+    inicio = time.perf_counter()
+    fila = multiprocessing.Queue(TAMANHO_FILA)
+    medicoes = {'usuarios': len(usuarios), 'gravados': 0, 'transacoes': 0, 'processos': processos}
+    escritor = threading.Thread(target=_escritor, args=(caminho, fila, medicoes), daemon=True)
+    escritor.start()
+
+    lotes = [usuarios[i:i + USUARIOS_POR_TAREFA] for i in range(0, len(usuarios), USUARIOS_POR_TAREFA)]
+    tempo_calculo = 0.0
+    try:
+        with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo,
+                                 initargs=(caminho, fila)) as executor:
+            for _, decorrido in executor.map(_consolidar_lote, lotes):
+                tempo_calculo += decorrido
+    finally:
+        fila.put(None)
+        escritor.join()
+    if 'erro' in medicoes:
+        raise medicoes['erro']
+    medicoes['tempo_total'] = time.perf_counter() - inicio
+    medicoes['tempo_calculo'] = tempo_calculo
+    return medicoes
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Consolida as estatísticas de todos os usuários')
+    parser.add_argument('--processos', type=int, default=None, help='processos de cálculo (padrão: núcleos)')
+    parser.add_argument('--sintetico', type=int, metavar='REVISOES',
+                        help='gera um banco temporário com N revisões simuladas e consolida')
+    args = parser.parse_args()
+
+    if args.sintetico:
+        import tempfile
+        from otimizador import gerar_sintetico
+        with tempfile.TemporaryDirectory() as tmp:
+            caminho = os.path.join(tmp, 'consolidacao.db')
+            gerar_sintetico(caminho, args.sintetico, usuarios=max(1, args.sintetico // 2000))
+            _relatorio(consolidar(caminho, args.processos))
+        return
+    _relatorio(consolidar(os.getenv('DATABASE_PATH', 'revisao_estudos.db'), args.processos))
+
+
+def _relatorio(medicoes):
+    total = medicoes['tempo_total']
+    print(f"{medicoes['gravados']}/{medicoes['usuarios']} usuários consolidados em {total:.2f}s "
+          f"com {medicoes['processos']} processo(s) ({medicoes['gravados'] / total if total else 0:.0f} usuários/s)")
+    print(f"Cálculo (somado nos processos): {medicoes['tempo_calculo']:.2f}s | "
+          f"escrita: {medicoes.get('tempo_escrita', 0):.2f}s em {medicoes['transacoes']} transações")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Registro central das consultas SQL das rotas mais usadas.
+
+Cada consulta tem um nome e um texto fixo e parametrizado. Como o texto
+é sempre o mesmo objeto, o cache de statements do sqlite3 (por conexão,
+tamanho em `Config.CACHED_STATEMENTS`) reaproveita o statement já
+compilado em vez de refazer o parse a cada requisição.
+
+`executar` também acumula, por consulta, o número de chamadas e o tempo
+total gasto, expostos por `metricas()`.
+
+Uso (micro-benchmark do custo de parse):
+    python consultas.py
+"""
+
+import sqlite3
+import threading
+import time
+
+from config import Config
+
+_FILA_BASE = '''
+    SELECT
+        card_state.revisao_id,
+        estudos.materia,
+        estudos.topico,
+        revisoes.tipo,
+        card_state.data_revisao,
+        COALESCE(estudos.tipo_conteudo, 'simples') as tipo_conteudo,
+        estudos.pergunta,
+        estudos.resposta,
+        estudos.opcoes
+    FROM card_state
+    JOIN vw_estudos estudos ON card_state.id_estudo = estudos.id
+    JOIN revisoes ON card_state.revisao_id = revisoes.id
+    WHERE card_state.usuario_id = ? AND card_state.data_revisao <= ?
+'''
+
+CONSULTAS = {
+    # Fila do dia (limites.py): revisões e cartões novos em consultas
+    # separadas, cada uma com LIMIT pela cota restante do dia. O índice
+    # (usuario_id, novo, data_revisao) entrega as linhas já em ordem, então
+    # a leitura para no limite, qualquer que seja o acúmulo
+    'fila_revisoes': _FILA_BASE + '''
+    AND card_state.novo = 0
+    ORDER BY card_state.data_revisao ASC
+    LIMIT ?
+    ''',
+    # Modo pré-prova: prioriza baixa confiança (última avaliação do cartão)
+    'fila_revisoes_pre_prova': _FILA_BASE + '''
+    AND card_state.novo = 0
+    ORDER BY card_state.data_revisao ASC, COALESCE(card_state.nivel_confianca, 3) ASC
+    LIMIT ?
+    ''',
+    'fila_novos': _FILA_BASE + '''
+    AND card_state.novo = 1
+    ORDER BY card_state.data_revisao ASC
+    LIMIT ?
+    ''',
+    # Limites do usuário (ou os padrões, ?) e o que já foi servido no dia
+    'cota_do_dia': '''
+    SELECT COALESCE(u.limite_revisoes_dia, ?), COALESCE(u.limite_novos_dia, ?),
+           COALESCE(f.revisoes, 0), COALESCE(f.novos, 0)
+    FROM usuarios u
+    LEFT JOIN fila_diaria f ON f.usuario_id = u.id AND f.data = ?
+    WHERE u.id = ?
+    ''',
+    'registrar_servida': '''
+    INSERT INTO fila_diaria (usuario_id, data, revisoes, novos)
+    VALUES (?, ?, 1 - ?, ?)
+    ON CONFLICT(usuario_id, data) DO UPDATE SET
+        revisoes = revisoes + excluded.revisoes,
+        novos = novos + excluded.novos
+    ''',
+
+    # Avaliação de revisão (marcar_feita e sincronização offline). Um só
+    # comando conclui a revisão, se ainda pendente, do usuário e (flashcard e
+    # quiz) com tempo de resposta, e devolve o estado atual do cartão. Duas
+    # avaliações simultâneas da mesma revisão: só uma encontra feito = 0.
+    # Bancos legados sem card_state usam os valores gravados na própria revisão
+    'concluir_revisao': '''
+    UPDATE revisoes
+    SET feito = 1, quality = ?, nivel_confianca = ?, tempo_resposta = ?
+    WHERE id = ? AND feito = 0
+      AND id_estudo IN (SELECT id FROM estudos WHERE usuario_id = ?)
+      AND (COALESCE(modo_revisao, 'simples') NOT IN ('flashcard', 'quiz') OR ? IS NOT NULL)
+    RETURNING id_estudo,
+              COALESCE((SELECT cs.ef FROM card_state cs WHERE cs.id_estudo = revisoes.id_estudo), ef),
+              COALESCE((SELECT cs.repetition FROM card_state cs WHERE cs.id_estudo = revisoes.id_estudo), repetition),
+              COALESCE((SELECT cs.interval FROM card_state cs WHERE cs.id_estudo = revisoes.id_estudo), interval),
+              COALESCE(modo_revisao, 'simples'),
+              (SELECT cs.data_revisao FROM card_state cs WHERE cs.id_estudo = revisoes.id_estudo),
+              (SELECT COALESCE(e.materia, '') FROM estudos e WHERE e.id = revisoes.id_estudo),
+              (SELECT COALESCE(u.versao_perfis, 0) FROM usuarios u WHERE u.id = ?),
+              COALESCE((SELECT cs.novo FROM card_state cs WHERE cs.id_estudo = revisoes.id_estudo), 0)
+    ''',
+    # Por que concluir_revisao não alterou nada (só no caminho de erro)
+    'revisao_nao_concluida': '''
+    SELECT r.feito, COALESCE(r.modo_revisao, 'simples')
+    FROM revisoes r JOIN estudos e ON e.id = r.id_estudo
+    WHERE r.id = ? AND e.usuario_id = ?
+    ''',
+    'agendar_revisao_sm2': '''
+    INSERT INTO revisoes (id_estudo, data_revisao, tipo, feito, ef, repetition, interval, modo_revisao)
+    VALUES (?, ?, 'SM-2', 0, ?, ?, ?, ?)
+    ''',
+
+    # Modo offline: operações já sincronizadas
+    'operacao_sincronizada': '''
+    SELECT resposta FROM avaliacoes_sincronizadas WHERE usuario_id = ? AND id_operacao = ?
+    ''',
+    'registrar_operacao': '''
+    INSERT INTO avaliacoes_sincronizadas (usuario_id, id_operacao, revisao_id, resposta, data_registro)
+    VALUES (?, ?, ?, ?, ?)
+    ''',
+
+    # Estatísticas (dashboard e /api/dashboard-data)
+    'total_estudos': '''
+    SELECT COUNT(*) FROM estudos WHERE usuario_id = ?
+    ''',
+    'total_concluidas': '''
+    SELECT COALESCE(SUM(concluidas), 0) FROM vw_concluidas_diarias
+    WHERE usuario_id = ?
+    ''',
+    'total_pendentes': '''
+    SELECT COUNT(*) FROM card_state WHERE usuario_id = ?
+    ''',
+    'novos_estudos_7d': '''
+    SELECT COUNT(*) FROM estudos
+    WHERE usuario_id = ? AND data_estudo >= date('now', '-7 days')
+    ''',
+    'pendentes_no_dia': '''
+    SELECT COUNT(*) FROM card_state WHERE usuario_id = ? AND data_revisao = ?
+    ''',
+    'primeiro_estudo': '''
+    SELECT MIN(data_estudo) FROM estudos WHERE usuario_id = ?
+    ''',
+    'concluidas_no_dia': '''
+    SELECT COALESCE(SUM(concluidas), 0) FROM vw_concluidas_diarias
+    WHERE usuario_id = ? AND data = ?
+    ''',
+    'concluidas_no_periodo': '''
+    SELECT COALESCE(SUM(concluidas), 0) FROM vw_concluidas_diarias
+    WHERE usuario_id = ? AND data BETWEEN ? AND ?
+    ''',
+    'concluidas_por_dia': '''
+    SELECT data, SUM(concluidas) FROM vw_concluidas_diarias
+    WHERE usuario_id = ? AND data BETWEEN ? AND ?
+    GROUP BY data
+    ''',
+    # Atividade (atividade.py): custo proporcional aos dias com revisões
+    'acumulado_por_dia': '''
+    SELECT data, concluidas, SUM(concluidas) OVER (ORDER BY data)
+    FROM atividade_diaria
+    WHERE usuario_id = ? AND concluidas > 0
+    ORDER BY data
+    ''',
+    # Sequências de dias seguidos: dias consecutivos têm o mesmo
+    # julianday(data) - ROW_NUMBER(); a atual termina hoje ou ontem.
+    # Parâmetros: usuario_id, hoje, hoje
+    'sequencias_atividade': '''
+    WITH dias AS (
+        SELECT data FROM atividade_diaria
+        WHERE usuario_id = ? AND data <= ? AND concluidas > 0
+    ),
+    sequencias AS (
+        SELECT MAX(data) AS fim, COUNT(*) AS dias
+        FROM (SELECT data, julianday(data) - ROW_NUMBER() OVER (ORDER BY data) AS grupo FROM dias)
+        GROUP BY grupo
+    )
+    SELECT COALESCE(MAX(CASE WHEN fim >= date(?, '-1 day') THEN dias END), 0),
+           COALESCE(MAX(dias), 0),
+           COALESCE(SUM(dias), 0),
+           MAX(fim)
+    FROM sequencias
+    ''',
+    # Versão persistente dos dados do usuário: a sequência de alterações
+    # (alteracoes.py), que toda escrita avança (cadastro, edição, avaliação,
+    # mídia, assinatura de baralho)
+    'versao_dados': '''
+    SELECT COALESCE(seq_alteracoes, 0) FROM usuarios WHERE id = ?
+    ''',
+    'desempenho_materias': '''
+    SELECT materia, SUM(total_revisoes), SUM(concluidas)
+    FROM (
+        SELECT e.materia AS materia,
+               COUNT(r.id) as total_revisoes,
+               SUM(CASE WHEN r.feito = 1 THEN 1 ELSE 0 END) as concluidas
+        FROM estudos e
+        LEFT JOIN revisoes r ON e.id = r.id_estudo
+        WHERE e.usuario_id = ?
+        GROUP BY e.materia
+        UNION ALL
+        -- Revisões já arquivadas contam como concluídas
+        SELECT NULLIF(materia, ''), SUM(concluidas), SUM(concluidas)
+        FROM revisoes_arquivo_diario
+        WHERE usuario_id = ?
+        GROUP BY materia
+    )
+    GROUP BY materia
+    ''',
+    # Desempenho por matéria (analise.py): uma varredura das revisões
+    # avaliadas, agrupada por matéria e tempo de resposta; a mediana do
+    # tempo sai da contagem acumulada desses grupos
+    'analise_materias': '''
+    WITH grupos AS (
+        SELECT COALESCE(e.materia, '') AS materia,
+               r.tempo_resposta AS tempo,
+               COUNT(*) AS avaliadas,
+               SUM(r.quality >= 3) AS acertos,
+               COUNT(r.nivel_confianca) AS com_confianca,
+               SUM(r.nivel_confianca) AS soma_confianca,
+               SUM(CASE WHEN r.nivel_confianca IS NOT NULL THEN r.quality >= 3 END) AS acertos_confiantes,
+               SUM((r.nivel_confianca - 1) / 4.0) AS soma_esperada,
+               SUM(((r.nivel_confianca - 1) / 4.0 - (r.quality >= 3)) * ((r.nivel_confianca - 1) / 4.0 - (r.quality >= 3))) AS soma_brier
+        FROM estudos e
+        JOIN revisoes r ON r.id_estudo = e.id
+        WHERE e.usuario_id = ? AND r.feito = 1 AND r.quality IS NOT NULL
+        GROUP BY 1, 2
+    ),
+    acumulados AS (
+        SELECT *,
+               SUM(CASE WHEN tempo IS NOT NULL THEN avaliadas END) OVER (PARTITION BY materia ORDER BY tempo) AS ate_aqui,
+               SUM(CASE WHEN tempo IS NOT NULL THEN avaliadas END) OVER (PARTITION BY materia) AS com_tempo
+        FROM grupos
+    )
+    SELECT materia,
+           SUM(avaliadas),
+           SUM(acertos),
+           SUM(com_confianca),
+           SUM(soma_confianca) * 1.0 / NULLIF(SUM(com_confianca), 0),
+           SUM(acertos_confiantes),
+           SUM(soma_esperada) / NULLIF(SUM(com_confianca), 0),
+           SUM(soma_brier) / NULLIF(SUM(com_confianca), 0),
+           MAX(tempo_mediano),
+           SUM(cartoes),
+           SUM(soma_ef) / NULLIF(SUM(cartoes), 0)
+    FROM (
+        SELECT materia,
+               SUM(avaliadas) AS avaliadas,
+               SUM(acertos) AS acertos,
+               SUM(com_confianca) AS com_confianca,
+               SUM(soma_confianca) AS soma_confianca,
+               SUM(acertos_confiantes) AS acertos_confiantes,
+               SUM(soma_esperada) AS soma_esperada,
+               SUM(soma_brier) AS soma_brier,
+               -- média dos dois valores centrais (iguais se a contagem for ímpar)
+               (MIN(CASE WHEN ate_aqui >= (com_tempo + 1) / 2 THEN tempo END)
+                + MIN(CASE WHEN ate_aqui >= com_tempo / 2 + 1 THEN tempo END)) / 2.0 AS tempo_mediano,
+               0 AS cartoes,
+               NULL AS soma_ef
+        FROM acumulados
+        GROUP BY materia
+        UNION ALL
+        -- Avaliações arquivadas: só as contagens diárias
+        SELECT COALESCE(materia, ''), SUM(avaliadas), SUM(acertos), 0, 0, 0, 0, 0, NULL, 0, NULL
+        FROM revisoes_arquivo_diario
+        WHERE usuario_id = ?
+        GROUP BY 1
+        UNION ALL
+        SELECT COALESCE(e.materia, ''), 0, 0, 0, 0, 0, 0, 0, NULL, COUNT(*), SUM(cs.ef)
+        FROM card_state cs
+        JOIN estudos e ON e.id = cs.id_estudo
+        WHERE cs.usuario_id = ?
+        GROUP BY 1
+    )
+    GROUP BY materia
+    ORDER BY materia
+    ''',
+}
+
+_metricas = {}
+_lock = threading.Lock()
+
+
+def conectar(caminho, **kwargs):
+    """Abre uma conexão com o cache de statements configurado."""
+    kwargs.setdefault('cached_statements', Config.CACHED_STATEMENTS)
+    return sqlite3.connect(caminho, **kwargs)
+
+
+def executar(cursor, nome, parametros=()):
+    """
+    Executa uma consulta registrada e contabiliza o tempo gasto.
+
+    Returns:
+        O próprio cursor, para encadear fetchone()/fetchall().
+    """
+    sql = CONSULTAS[nome]
+    inicio = time.perf_counter()
+    cursor.execute(sql, parametros)
+    decorrido = time.perf_counter() - inicio
+    with _lock:
+        chamadas, total = _metricas.get(nome, (0, 0.0))
+        _metricas[nome] = (chamadas + 1, total + decorrido)
+    return cursor
+
+
+def metricas():
+    """Chamadas, tempo total e tempo médio (ms) de cada consulta registrada."""
+    with _lock:
+        return {
+            nome: {
+                'chamadas': chamadas,
+                'total_ms': round(total * 1000, 3),
+                'media_ms': round(total * 1000 / chamadas, 4)
+            }
+            for nome, (chamadas, total) in sorted(_metricas.items())
+        }
+
+
+def main():
+    """Compara o custo por chamada com e sem o cache de statements."""
+    repeticoes = 20000
+    print(f"{repeticoes} execuções de 'concluidas_no_dia' em um banco em memória")
+    for tamanho in (0, Config.CACHED_STATEMENTS):
+        conn = conectar(':memory:', cached_statements=tamanho)
+        cursor = conn.cursor()
+        cursor.execute('CREATE TABLE estudos (id INTEGER PRIMARY KEY, usuario_id INTEGER, materia TEXT)')
+        cursor.execute('CREATE TABLE revisoes (id INTEGER PRIMARY KEY, id_estudo INTEGER, data_revisao TEXT, feito INTEGER)')
+        cursor.execute('CREATE TABLE revisoes_arquivo_diario (usuario_id INTEGER, data TEXT, materia TEXT, concluidas INTEGER)')
+        cursor.execute('''
+        CREATE VIEW vw_concluidas_diarias AS
+        SELECT e.usuario_id AS usuario_id, r.data_revisao AS data, e.materia AS materia, COUNT(*) AS concluidas
+        FROM revisoes r JOIN estudos e ON r.id_estudo = e.id
+        WHERE r.feito = 1 GROUP BY 1, 2, 3
+        UNION ALL
+        SELECT usuario_id, data, materia, concluidas FROM revisoes_arquivo_diario
+        ''')
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            cursor.execute(CONSULTAS['concluidas_no_dia'], (1, '2025-01-01')).fetchone()
+        decorrido = time.perf_counter() - inicio
+        conn.close()
+        print(f"cached_statements={tamanho:4d}: {decorrido * 1e6 / repeticoes:7.2f} µs por chamada")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Detecção de estudos duplicados no cadastro e na importação.
+
+Duas camadas:
+
+- Duplicata exata: o conteúdo do cartão (pergunta + resposta + alternativas,
+  ou matéria + tópico para estudos simples) é normalizado (minúsculas, sem
+  acentos, pontuação e espaços repetidos) e vira um hash gravado em
+  `estudos.hash_conteudo`, com índice (usuario_id, hash_conteudo).
+- Quase duplicata (opcional, `Config.SIMILARIDADE_DUPLICATA` > 0): uma
+  assinatura MinHash de 32 posições sobre shingles de 5 caracteres do
+  texto normalizado, calculada em uma única passada (one-permutation
+  hashing). As assinaturas são divididas em 8 bandas de 4 valores e
+  indexadas em `minhash_bandas`; só estudos que coincidem em alguma banda
+  são comparados, e a similaridade (Jaccard estimada) é a fração de
+  posições iguais.
+
+`IndiceDuplicatas` consulta o banco a cada verificação (cadastro
+individual) ou, com `carregar=True`, carrega os hashes e bandas do
+usuário uma vez para a memória (importação em lote), detectando também
+duplicatas dentro do próprio arquivo importado.
+
+Uso (benchmark de importação com duplicatas em um banco temporário):
+    python dedup.py [cartoes]
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import unicodedata
+import zlib
+from array import array
+from bisect import bisect_left
+
+from config import Config
+
+POSICOES = 32
+BANDAS = 8
+LINHAS_POR_BANDA = POSICOES // BANDAS
+TAMANHO_SHINGLE = 5
+_VAZIO = 0xFFFFFFFF
+_DESLOCAMENTO = 32 - (POSICOES - 1).bit_length()
+_MASCARA = (1 << _DESLOCAMENTO) - 1
+
+# Modos de tratamento de duplicatas no cadastro/importação
+MODOS = ('mesclar', 'marcar', 'permitir')
+
+_PALAVRA = re.compile(r'[^\W_]+')
+
+
+class Impressao:
+    """Hash do conteúdo normalizado e assinatura MinHash (ou None) de um estudo."""
+
+    __slots__ = ('hash', 'assinatura')
+
+    def __init__(self, hash_conteudo, assinatura):
+        self.hash = hash_conteudo
+        self.assinatura = assinatura
+
+
+class Duplicata:
+    """Estudo já existente que duplica o conteúdo verificado."""
+
+    __slots__ = ('id_estudo', 'exata', 'similaridade')
+
+    def __init__(self, id_estudo, exata, similaridade):
+        self.id_estudo = id_estudo
+        self.exata = exata
+        self.similaridade = similaridade
+
+    def como_dict(self):
+        return {'id_estudo': self.id_estudo, 'exata': self.exata, 'similaridade': round(self.similaridade, 3)}
+
+
+def criar_tabelas_dedup(cursor):
+    """Cria as colunas, o índice de hash e as tabelas do MinHash (idempotente)."""
+    for coluna in ('hash_conteudo TEXT', 'duplicata_de INTEGER'):
+        try:
+            cursor.execute(f"ALTER TABLE estudos ADD COLUMN {coluna}")
+        except sqlite3.OperationalError:
+            pass
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_estudos_hash
+    ON estudos(usuario_id, hash_conteudo)
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS minhash_assinaturas (
+        id_estudo INTEGER PRIMARY KEY,
+        assinatura BLOB NOT NULL,
+        FOREIGN KEY(id_estudo) REFERENCES estudos(id)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS minhash_bandas (
+        usuario_id INTEGER NOT NULL,
+        banda INTEGER NOT NULL,
+        chave INTEGER NOT NULL,
+        id_estudo INTEGER NOT NULL,
+        PRIMARY KEY (usuario_id, banda, chave, id_estudo)
+    ) WITHOUT ROWID
+    ''')
+
+
+def popular_impressoes(cursor):
+    """
+    Calcula hash e assinatura dos estudos que ainda não têm hash.
+
+    Returns:
+        Quantidade de estudos processados.
+    """
+    cursor.execute('''
+        SELECT id, usuario_id, COALESCE(tipo_conteudo, 'simples'), materia, topico, pergunta, resposta, opcoes
+        FROM estudos WHERE hash_conteudo IS NULL
+    ''')
+    linhas = cursor.fetchall()
+    for id_estudo, usuario_id, tipo_conteudo, materia, topico, pergunta, resposta, opcoes in linhas:
+        impressao = calcular_impressao(tipo_conteudo, materia, topico, pergunta, resposta, opcoes)
+        cursor.execute('UPDATE estudos SET hash_conteudo = ? WHERE id = ?', (impressao.hash, id_estudo))
+        indexar_assinatura(cursor, usuario_id, id_estudo, impressao)
+    return len(linhas)
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos, só letras/dígitos separados por um espaço."""
+    texto = str(texto or '').lower()
+    if not texto.isascii():
+        texto = unicodedata.normalize('NFKD', texto)
+        texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(_PALAVRA.findall(texto))
+
+
+def _texto_cartao(tipo_conteudo, materia, topico, pergunta, resposta, opcoes):
+    if tipo_conteudo in ('flashcard', 'quiz'):
+        partes = [pergunta, resposta]
+        if opcoes:
+            if isinstance(opcoes, str):
+                try:
+                    opcoes = json.loads(opcoes)
+                except ValueError:
+                    opcoes = {'': opcoes}
+            if isinstance(opcoes, dict):
+                partes.extend(opcoes[alt] for alt in sorted(opcoes))
+    else:
+        partes = [materia, topico]
+    return '\x1f'.join(normalizar(p) for p in partes)
+
+
+def _assinatura(texto):
+    """
+    MinHash de uma passada: cada shingle cai em uma posição (5 bits mais
+    altos do hash) e a posição guarda o menor valor que recebeu.
+
+    Com os hashes ordenados, as posições são faixas contíguas e o mínimo de
+    cada uma é achado por bisect (32 buscas, em vez de um laço por shingle).
+    """
+    dados = texto.replace('\x1f', ' ').encode()
+    if not dados:
+        return None
+    shingles = {dados[i:i + TAMANHO_SHINGLE] for i in range(max(1, len(dados) - TAMANHO_SHINGLE + 1))}
+    hashes = sorted(map(zlib.crc32, shingles))
+    minimos = [_VAZIO] * POSICOES
+    for posicao in range(POSICOES):
+        i = bisect_left(hashes, posicao << _DESLOCAMENTO)
+        if i < len(hashes) and hashes[i] >> _DESLOCAMENTO == posicao:
+            minimos[posicao] = hashes[i] & _MASCARA
+    # Posições vazias (textos curtos) copiam a próxima posição preenchida
+    for i in range(POSICOES):
+        if minimos[i] == _VAZIO:
+            j = (i + 1) % POSICOES
+            while minimos[j] == _VAZIO:
+                j = (j + 1) % POSICOES
+            minimos[i] = minimos[j] + (j - i) % POSICOES * 0x10000000
+    return array('I', (m & 0xFFFFFFFF for m in minimos))
+
+
+def calcular_impressao(tipo_conteudo, materia, topico, pergunta, resposta, opcoes):
+    """Hash normalizado e, se a detecção de quase duplicatas estiver ativa, a assinatura."""
+    texto = _texto_cartao(tipo_conteudo, materia, topico, pergunta, resposta, opcoes)
+    hash_conteudo = hashlib.blake2b(f'{tipo_conteudo}\x1e{texto}'.encode(), digest_size=16).hexdigest()
+    assinatura = _assinatura(texto) if Config.SIMILARIDADE_DUPLICATA > 0 else None
+    return Impressao(hash_conteudo, assinatura)
+
+
+def _chaves_bandas(assinatura):
+    return [zlib.crc32(assinatura[b * LINHAS_POR_BANDA:(b + 1) * LINHAS_POR_BANDA].tobytes())
+            for b in range(BANDAS)]
+
+
+def similaridade(a, b):
+    """Jaccard estimada: fração de posições iguais das duas assinaturas."""
+    return sum(1 for x, y in zip(a, b) if x == y) / POSICOES
+
+
+def indexar_assinatura(cursor, usuario_id, id_estudo, impressao):
+    """Grava a assinatura e as bandas de um estudo (sem commit)."""
+    if impressao.assinatura is None:
+        return
+    cursor.execute('INSERT OR REPLACE INTO minhash_assinaturas (id_estudo, assinatura) VALUES (?, ?)',
+                   (id_estudo, impressao.assinatura.tobytes()))
+    cursor.executemany('INSERT OR IGNORE INTO minhash_bandas (usuario_id, banda, chave, id_estudo) VALUES (?, ?, ?, ?)',
+                       [(usuario_id, banda, chave, id_estudo)
+                        for banda, chave in enumerate(_chaves_bandas(impressao.assinatura))])
+
+
+class IndiceDuplicatas:
+    """
+    Verifica duplicatas entre os estudos de um usuário.
+
+    Com `carregar=True` os hashes, bandas e assinaturas do usuário ficam em
+    memória (importação em lote); sem isso, cada verificação consulta os
+    índices do banco (cadastro individual).
+    """
+
+    def __init__(self, cursor, usuario_id, carregar=False, limiar=None):
+        self.cursor = cursor
+        self.usuario_id = usuario_id
+        self.limiar = Config.SIMILARIDADE_DUPLICATA if limiar is None else limiar
+        self.carregado = carregar
+        self._hashes = {}
+        self._bandas = {}
+        self._assinaturas = {}
+        if carregar:
+            self._carregar()
+
+    def _carregar(self):
+        self.cursor.execute('''
+            SELECT hash_conteudo, MIN(id) FROM estudos
+            WHERE usuario_id = ? AND hash_conteudo IS NOT NULL
+            GROUP BY hash_conteudo
+        ''', (self.usuario_id,))
+        self._hashes = dict(self.cursor.fetchall())
+        if self.limiar <= 0:
+            return
+        self.cursor.execute('SELECT banda, chave, id_estudo FROM minhash_bandas WHERE usuario_id = ?', (self.usuario_id,))
+        for banda, chave, id_estudo in self.cursor.fetchall():
+            self._bandas.setdefault((banda, chave), []).append(id_estudo)
+        self.cursor.execute('''
+            SELECT a.id_estudo, a.assinatura FROM minhash_assinaturas a
+            JOIN estudos e ON e.id = a.id_estudo
+            WHERE e.usuario_id = ?
+        ''', (self.usuario_id,))
+        for id_estudo, blob in self.cursor.fetchall():
+            self._assinaturas[id_estudo] = array('I', blob)
+
+    def _por_hash(self, hash_conteudo):
+        if self.carregado:
+            return self._hashes.get(hash_conteudo)
+        self.cursor.execute('SELECT MIN(id) FROM estudos WHERE usuario_id = ? AND hash_conteudo = ?',
+                            (self.usuario_id, hash_conteudo))
+        return self.cursor.fetchone()[0]
+
+    def _candidatos(self, chaves):
+        if self.carregado:
+            candidatos = set()
+            for banda, chave in enumerate(chaves):
+                candidatos.update(self._bandas.get((banda, chave), ()))
+            return {c: self._assinaturas.get(c) for c in candidatos}
+        condicoes = ' OR '.join('(b.banda = ? AND b.chave = ?)' for _ in chaves)
+        parametros = [v for par in enumerate(chaves) for v in par]
+        self.cursor.execute(f'''
+            SELECT DISTINCT a.id_estudo, a.assinatura
+            FROM minhash_bandas b
+            JOIN minhash_assinaturas a ON a.id_estudo = b.id_estudo
+            WHERE b.usuario_id = ? AND ({condicoes})
+        ''', [self.usuario_id] + parametros)
+        return {id_estudo: array('I', blob) for id_estudo, blob in self.cursor.fetchall()}
+
+    def verificar(self, impressao):
+        """
+        Returns:
+            Duplicata (exata ou a quase duplicata mais parecida acima do
+            limiar) ou None.
+        """
+        existente = self._por_hash(impressao.hash)
+        if existente is not None:
+            return Duplicata(existente, True, 1.0)
+        if self.limiar <= 0 or impressao.assinatura is None:
+            return None
+
+        melhor = None
+        for id_estudo, assinatura in self._candidatos(_chaves_bandas(impressao.assinatura)).items():
+            if assinatura is None:
+                continue
+            valor = similaridade(impressao.assinatura, assinatura)
+            if valor >= self.limiar and (melhor is None or valor > melhor.similaridade):
+                melhor = Duplicata(id_estudo, False, valor)
+        return melhor
+
+    def adicionar(self, id_estudo, impressao):
+        """Inclui um estudo recém-inserido no índice em memória (importação em lote)."""
+        if not self.carregado:
+            return
+        self._hashes.setdefault(impressao.hash, id_estudo)
+        if impressao.assinatura is not None and self.limiar > 0:
+            for banda, chave in enumerate(_chaves_bandas(impressao.assinatura)):
+                self._bandas.setdefault((banda, chave), []).append(id_estudo)
+            self._assinaturas[id_estudo] = impressao.assinatura
+
+
+def main():
+    """Importa N cartões (10% duplicatas exatas, 5% quase duplicatas), depois reimporta o mesmo lote."""
+    import os
+    import random
+    import sys
+    import tempfile
+    import time
+    from banco import migrar
+    from consultas import conectar
+    from estudos import cadastrar_estudo
+
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    aleatorio = random.Random(42)
+    vocabulario = [''.join(aleatorio.choice('abcdefghijlmnoprstuv') for _ in range(aleatorio.randint(3, 10)))
+                   for _ in range(20000)]
+
+    def frase(n):
+        return ' '.join(aleatorio.choice(vocabulario) for _ in range(n))
+
+    cartoes = []
+    for i in range(total):
+        sorteio = aleatorio.random()
+        if cartoes and sorteio < 0.10:
+            cartoes.append(aleatorio.choice(cartoes))
+        elif cartoes and sorteio < 0.15:
+            pergunta, resposta = aleatorio.choice(cartoes)
+            # Mesma pergunta com pontuação, caixa e uma palavra diferentes
+            cartoes.append((pergunta.upper() + '?', resposta + ' ' + aleatorio.choice(vocabulario)))
+        else:
+            cartoes.append((frase(12), frase(20)))
+
+    def importar(cursor, usuario_id, modo):
+        inicio = time.perf_counter()
+        indice = IndiceDuplicatas(cursor, usuario_id, carregar=modo != 'permitir')
+        contagem = {'inseridos': 0, 'exatas': 0, 'quase': 0}
+        for pergunta, resposta in cartoes:
+            _, hoje, duplicata = cadastrar_estudo(cursor, indice, 'Benchmark', 'Importação', 'flashcard',
+                                                  pergunta, resposta, modo=modo)
+            if hoje:
+                contagem['inseridos'] += 1
+            if duplicata:
+                contagem['exatas' if duplicata.exata else 'quase'] += 1
+        cursor.connection.commit()
+        decorrido = time.perf_counter() - inicio
+        return decorrido, contagem
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for nome, modo, reimportar in (('sem verificação', 'permitir', False),
+                                       ('com deduplicação', 'mesclar', False),
+                                       ('reimportação', 'mesclar', True)):
+            caminho = os.path.join(tmp, f'{modo}.db')
+            if not reimportar:
+                migrar(caminho)
+            conn = conectar(caminho)
+            cursor = conn.cursor()
+            cursor.execute("INSERT OR IGNORE INTO usuarios (nome, email, senha) VALUES ('Benchmark', 'bench@exemplo.com', 'x')")
+            cursor.execute("SELECT id FROM usuarios WHERE email = 'bench@exemplo.com'")
+            decorrido, contagem = importar(cursor, cursor.fetchone()[0], modo)
+            conn.close()
+            print(f"{nome:18} {total} cartões em {decorrido:6.2f}s ({decorrido * 1e6 / total:6.1f} µs/cartão) | "
+                  f"inseridos {contagem['inseridos']}, duplicatas exatas {contagem['exatas']}, "
+                  f"quase duplicatas marcadas {contagem['quase']}")
+
+if __name__ == "__main__":
+    main()
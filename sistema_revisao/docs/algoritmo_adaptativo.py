@@ -50,14 +50,35 @@ class AlgoritmoAdaptativo:
     # Modificadores para modo intensivo
     FATOR_INTENSIVO = 0.5  # Reduz intervalos pela metade
     
-    def __init__(self, modo_intensivo: bool = False):
+    # Tempo de resposta esperado (segundos)
+    TEMPO_ESPERADO = 60
+    
+    # Constante da classe -> parâmetro do perfil de agendamento (perfis.py)
+    PARAMETROS_PERFIL = {
+        'EF_MIN': 'ef_min',
+        'EF_MAX': 'ef_max_adaptativo',
+        'EF_INICIAL': 'ef_inicial',
+        'INTERVALO_ERRO': 'intervalo_erro',
+        'INTERVALO_DUVIDA': 'intervalo_duvida',
+        'INTERVALO_BOM': 'intervalo_bom',
+        'INTERVALO_PERFEITO': 'intervalo_perfeito',
+        'FATOR_INTENSIVO': 'fator_intensivo',
+        'TEMPO_ESPERADO': 'tempo_esperado',
+    }
+    
+    def __init__(self, modo_intensivo: bool = False, perfil: Dict = None):
         """
         Inicializa o algoritmo.
         
         Args:
             modo_intensivo: Se True, reduz intervalos para revisão intensiva
+            perfil: Perfil de agendamento do usuário/matéria (perfis.py);
+                os valores presentes substituem as constantes da classe
         """
         self.modo_intensivo = modo_intensivo
+        for constante, parametro in self.PARAMETROS_PERFIL.items():
+            if perfil and perfil.get(parametro) is not None:
+                setattr(self, constante, perfil[parametro])
     
     def calcular_proxima_revisao(
         self,
@@ -67,7 +88,7 @@ class AlgoritmoAdaptativo:
         interval: int = 1,
         repetition: int = 0,
         tempo_resposta: int = None,
-        tempo_esperado: int = 60
+        tempo_esperado: int = None
     ) -> Tuple[float, int, int]:
         """
         Calcula a próxima revisão baseada em múltiplos fatores.
@@ -88,7 +109,7 @@ class AlgoritmoAdaptativo:
             interval: Intervalo atual em dias
             repetition: Número de repetições consecutivas corretas
             tempo_resposta: Tempo de resposta em segundos
-            tempo_esperado: Tempo esperado para resposta (padrão 60s)
+            tempo_esperado: Tempo esperado para resposta (padrão do perfil, 60s)
         
         Returns:
             Tupla (novo_ef, novo_intervalo, nova_repetition)
@@ -118,6 +139,8 @@ class AlgoritmoAdaptativo:
         
         # 3. AJUSTAR POR TEMPO DE RESPOSTA (se fornecido)
         if tempo_resposta is not None:
+            if tempo_esperado is None:
+                tempo_esperado = self.TEMPO_ESPERADO
             novo_intervalo = self._ajustar_por_tempo(
                 novo_intervalo, tempo_resposta, tempo_esperado
             )
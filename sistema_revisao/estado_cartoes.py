@@ -0,0 +1,128 @@
+"""
+Estado atual de agendamento dos cartões (tabela `card_state`).
+
+Cada estudo tem exatamente uma linha em `card_state` com o estado SM-2
+corrente (ef, interval, repetition), a data da próxima revisão e o id da
+revisão pendente correspondente em `revisoes`. A tabela `revisoes` passa
+a ser apenas o log: uma linha é criada quando a revisão é agendada e
+recebe quality/confiança/tempo quando é concluída.
+
+A fila do dia é uma única varredura no índice (usuario_id, data_revisao).
+A coluna `novo` marca os cartões ainda não revisados (criados no
+cadastro), que têm cota diária própria (ver limites.py).
+"""
+
+import sqlite3
+
+
+def criar_tabela_card_state(cursor):
+    """Cria a tabela `card_state` e seu índice de fila (idempotente)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS card_state (
+        id_estudo INTEGER PRIMARY KEY,
+        usuario_id INTEGER NOT NULL,
+        ef REAL DEFAULT 2.5,
+        interval INTEGER DEFAULT 1,
+        repetition INTEGER DEFAULT 0,
+        data_revisao TEXT NOT NULL,
+        revisao_id INTEGER,
+        nivel_confianca INTEGER,
+        novo INTEGER DEFAULT 0,
+        FOREIGN KEY(id_estudo) REFERENCES estudos(id),
+        FOREIGN KEY(revisao_id) REFERENCES revisoes(id)
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_card_state_fila
+    ON card_state(usuario_id, data_revisao)
+    ''')
+    try:
+        cursor.execute("ALTER TABLE card_state ADD COLUMN novo INTEGER DEFAULT 0")
+        # Bancos existentes: novo = revisão pendente ainda é a inicial
+        cursor.execute('''
+            UPDATE card_state SET novo = 1
+            WHERE revisao_id IN (SELECT id FROM revisoes WHERE tipo = 'Revisão inicial' AND feito = 0)
+        ''')
+    except sqlite3.OperationalError:
+        pass
+    # Fila com cotas: revisões e novos lidos em ordem, cada um com LIMIT
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_card_state_novos
+    ON card_state(usuario_id, novo, data_revisao)
+    ''')
+
+
+def popular_card_state(cursor):
+    """
+    Cria o estado dos estudos que ainda não têm linha em `card_state`.
+
+    Para bancos legados com várias revisões pendentes por estudo, o estado
+    SM-2 vem da pendente mais recente e a próxima data (com a revisão
+    associada) vem da pendente mais antiga.
+
+    Returns:
+        Quantidade de estudos migrados.
+    """
+    cursor.execute('''
+        INSERT INTO card_state (id_estudo, usuario_id, ef, interval, repetition, data_revisao, revisao_id)
+        SELECT e.id, e.usuario_id,
+               COALESCE(ultima.ef, 2.5), COALESCE(ultima.interval, 1), COALESCE(ultima.repetition, 0),
+               proxima.data_revisao, proxima.id
+        FROM estudos e
+        JOIN revisoes proxima ON proxima.id = (
+            SELECT r.id FROM revisoes r
+            WHERE r.id_estudo = e.id AND r.feito = 0
+            ORDER BY r.data_revisao ASC, r.id ASC LIMIT 1
+        )
+        JOIN revisoes ultima ON ultima.id = (
+            SELECT MAX(r.id) FROM revisoes r
+            WHERE r.id_estudo = e.id AND r.feito = 0
+        )
+        WHERE e.usuario_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM card_state cs WHERE cs.id_estudo = e.id)
+    ''')
+    return cursor.rowcount
+
+
+def remover_pendentes_antigas(cursor):
+    """
+    Apaga as revisões pendentes (feito = 0) de estudos com `card_state`
+    que não são a revisão atual do cartão: as datas fixas (1/3/7/14/30
+    dias) que o cadastro criava antes desta tabela. A fila nunca as serve,
+    e com elas o total de revisões pendentes contaria o mesmo cartão
+    várias vezes. Roda junto com `popular_card_state`.
+
+    Returns:
+        Quantidade de revisões apagadas.
+    """
+    cursor.execute('''
+        DELETE FROM revisoes
+        WHERE feito = 0
+          AND id_estudo IN (SELECT id_estudo FROM card_state)
+          AND id NOT IN (SELECT revisao_id FROM card_state WHERE revisao_id IS NOT NULL)
+    ''')
+    return cursor.rowcount
+
+
+def salvar_card_state(cursor, id_estudo, usuario_id, ef, interval, repetition,
+                      data_revisao, revisao_id, nivel_confianca=None, novo=0):
+    """
+    Grava (insere ou substitui) o estado atual de um cartão.
+
+    Não faz commit: deve rodar na mesma transação que grava a revisão
+    em `revisoes`, para que estado e log fiquem consistentes. `novo` só é
+    1 no cadastro; qualquer reagendamento o zera.
+    """
+    cursor.execute('''
+        INSERT INTO card_state (id_estudo, usuario_id, ef, interval, repetition, data_revisao, revisao_id,
+                                nivel_confianca, novo)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id_estudo) DO UPDATE SET
+            ef = excluded.ef,
+            interval = excluded.interval,
+            repetition = excluded.repetition,
+            data_revisao = excluded.data_revisao,
+            revisao_id = excluded.revisao_id,
+            nivel_confianca = COALESCE(excluded.nivel_confianca, card_state.nivel_confianca),
+            novo = excluded.novo
+    ''', (id_estudo, usuario_id, ef, interval, repetition, data_revisao, revisao_id, nivel_confianca, novo))
@@ -0,0 +1,159 @@
+"""
+Cadastro e edição de estudos.
+
+Usado pela rota /cadastrar e pela importação em lote da CLI
+(`python -m sistema_revisao import`), para que os dois caminhos criem
+exatamente as mesmas linhas. A edição (PUT /api/estudos/<id>) faz a
+cópia na escrita dos cartões de baralhos assinados (baralhos.py).
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+
+from estado_cartoes import salvar_card_state
+from alteracoes import registrar_alteracoes
+from baralhos import copiar_do_baralho
+from dedup import MODOS, calcular_impressao, indexar_assinatura
+
+
+def inserir_estudo(cursor, usuario_id, materia, topico, tipo_conteudo='simples',
+                   pergunta=None, resposta=None, opcoes=None, data_estudo=None,
+                   impressao=None, duplicata_de=None):
+    """
+    Insere o estudo, a revisão inicial (para hoje) e o card_state, e
+    registra os dois registros na sequência de alterações do usuário.
+
+    Não faz commit. `opcoes` (quiz) pode ser um dict ou o JSON já serializado.
+    `impressao` (dedup.calcular_impressao) é calculada se não vier pronta;
+    `duplicata_de` marca o estudo como quase duplicata de outro.
+
+    Returns:
+        (id_estudo, data da revisão inicial)
+    """
+    tipo_conteudo = tipo_conteudo if tipo_conteudo in ('flashcard', 'quiz') else 'simples'
+    data_estudo = data_estudo or datetime.now().strftime("%Y-%m-%d")
+    if isinstance(opcoes, dict):
+        # Sem escapes \uXXXX, para que o índice de busca veja o texto das alternativas
+        opcoes = json.dumps(opcoes, ensure_ascii=False)
+    if impressao is None:
+        impressao = calcular_impressao(tipo_conteudo, materia, topico, pergunta, resposta, opcoes)
+
+    if tipo_conteudo == 'flashcard':
+        cursor.execute('''
+            INSERT INTO estudos (materia, topico, data_estudo, usuario_id, tipo_conteudo, pergunta, resposta,
+                                 hash_conteudo, duplicata_de)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (materia, topico, data_estudo, usuario_id, 'flashcard', pergunta, resposta, impressao.hash, duplicata_de))
+    elif tipo_conteudo == 'quiz':
+        cursor.execute('''
+            INSERT INTO estudos (materia, topico, data_estudo, usuario_id, tipo_conteudo, pergunta, resposta, opcoes,
+                                 hash_conteudo, duplicata_de)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (materia, topico, data_estudo, usuario_id, 'quiz', pergunta, resposta, opcoes, impressao.hash, duplicata_de))
+    else:
+        cursor.execute('''
+            INSERT INTO estudos (materia, topico, data_estudo, usuario_id, tipo_conteudo, hash_conteudo, duplicata_de)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (materia, topico, data_estudo, usuario_id, 'simples', impressao.hash, duplicata_de))
+
+    id_estudo = cursor.lastrowid
+    indexar_assinatura(cursor, usuario_id, id_estudo, impressao)
+
+    # Criar revisão imediata para hoje, para permitir estudar logo após cadastrar.
+    # As revisões seguintes são agendadas pelo SM-2 a cada avaliação (marcar_feita).
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    try:
+        cursor.execute('INSERT INTO revisoes (id_estudo, data_revisao, tipo, modo_revisao) VALUES (?, ?, ?, ?)',
+                       (id_estudo, hoje, 'Revisão inicial', tipo_conteudo))
+    except sqlite3.OperationalError:
+        cursor.execute('INSERT INTO revisoes (id_estudo, data_revisao, tipo) VALUES (?, ?, ?)',
+                       (id_estudo, hoje, 'Revisão inicial'))
+    revisao_id = cursor.lastrowid
+    salvar_card_state(cursor, id_estudo, usuario_id, 2.5, 1, 0, hoje, revisao_id, novo=1)
+    registrar_alteracoes(cursor, usuario_id, [('estudos', id_estudo), ('revisoes', revisao_id)])
+    return id_estudo, hoje
+
+
+def cadastrar_estudo(cursor, indice, materia, topico, tipo_conteudo='simples', pergunta=None,
+                     resposta=None, opcoes=None, data_estudo=None, modo='mesclar'):
+    """
+    Cadastra um estudo passando antes pela verificação de duplicatas.
+
+    Modos:
+        mesclar: duplicata exata não é inserida (devolve o estudo existente);
+                 quase duplicata é inserida e marcada em `duplicata_de`
+        marcar: tudo é inserido; duplicatas (exatas ou não) são marcadas
+        permitir: sem verificação
+
+    Args:
+        indice: IndiceDuplicatas do usuário (carregado em memória para lotes).
+
+    Returns:
+        (id_estudo, data da revisão inicial ou None se não inseriu, Duplicata ou None)
+    """
+    if modo not in MODOS:
+        raise ValueError(f"Modo de duplicatas inválido: {modo} (opções: {', '.join(MODOS)})")
+    tipo_conteudo = tipo_conteudo if tipo_conteudo in ('flashcard', 'quiz') else 'simples'
+    if isinstance(opcoes, dict):
+        opcoes = json.dumps(opcoes, ensure_ascii=False)
+    impressao = calcular_impressao(tipo_conteudo, materia, topico, pergunta, resposta, opcoes)
+    duplicata = indice.verificar(impressao) if modo != 'permitir' else None
+    if duplicata and duplicata.exata and modo == 'mesclar':
+        return duplicata.id_estudo, None, duplicata
+
+    id_estudo, hoje = inserir_estudo(cursor, indice.usuario_id, materia, topico, tipo_conteudo,
+                                     pergunta, resposta, opcoes, data_estudo, impressao,
+                                     duplicata.id_estudo if duplicata else None)
+    indice.adicionar(id_estudo, impressao)
+    return id_estudo, hoje, duplicata
+
+
+CAMPOS_EDITAVEIS = ('materia', 'topico', 'pergunta', 'resposta', 'opcoes')
+
+
+def editar_estudo(cursor, usuario_id, id_estudo, dados):
+    """
+    Altera o conteúdo de um estudo do usuário. Cartão de baralho ainda sem
+    conteúdo próprio é copiado antes (cópia na escrita), então a edição
+    nunca chega ao baralho nem aos outros assinantes. Recalcula o hash e a
+    assinatura de duplicatas. Não faz commit.
+
+    Returns:
+        Dict com o conteúdo resultante e `copiado` (True se houve cópia do
+        baralho), ou None se o estudo não é do usuário.
+
+    Raises:
+        ValueError: nenhum campo editável ou valor inválido.
+    """
+    valores = {}
+    for campo in CAMPOS_EDITAVEIS:
+        if campo not in dados:
+            continue
+        valor = dados[campo]
+        if campo == 'opcoes' and isinstance(valor, dict):
+            valor = json.dumps(valor, ensure_ascii=False)
+        if not isinstance(valor, str):
+            raise ValueError(f'{campo} deve ser texto' + (' ou objeto' if campo == 'opcoes' else ''))
+        valores[campo] = valor
+    if not valores:
+        raise ValueError(f"Informe ao menos um dos campos: {', '.join(CAMPOS_EDITAVEIS)}")
+
+    cursor.execute('SELECT 1 FROM estudos WHERE id = ? AND usuario_id = ?', (id_estudo, usuario_id))
+    if cursor.fetchone() is None:
+        return None
+    copiado = copiar_do_baralho(cursor, usuario_id, id_estudo)
+    atribuicoes = ', '.join(f'{campo} = ?' for campo in valores)
+    cursor.execute(f'UPDATE estudos SET {atribuicoes} WHERE id = ?', (*valores.values(), id_estudo))
+
+    cursor.execute('''
+        SELECT COALESCE(tipo_conteudo, 'simples'), materia, topico, pergunta, resposta, opcoes
+        FROM estudos WHERE id = ?
+    ''', (id_estudo,))
+    tipo_conteudo, materia, topico, pergunta, resposta, opcoes = cursor.fetchone()
+    impressao = calcular_impressao(tipo_conteudo, materia, topico, pergunta, resposta, opcoes)
+    cursor.execute('UPDATE estudos SET hash_conteudo = ? WHERE id = ?', (impressao.hash, id_estudo))
+    indexar_assinatura(cursor, usuario_id, id_estudo, impressao)
+    registrar_alteracoes(cursor, usuario_id, [('estudos', id_estudo)])
+    return {'id': id_estudo, 'tipo_conteudo': tipo_conteudo, 'materia': materia, 'topico': topico,
+            'pergunta': pergunta, 'resposta': resposta, 'opcoes': opcoes, 'copiado': copiado}
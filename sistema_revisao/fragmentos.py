@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Fragmentação opcional do banco por usuário.
+
+Com um banco só, toda avaliação de todo usuário disputa a mesma trava de
+escrita (a do app e a do arquivo SQLite). Com `FRAGMENTOS=N` (N > 0):
+
+- os dados de cada usuário ficam em `FRAGMENTOS_DIR/fragmento_XXX.db`,
+  com XXX = usuario_id % N (`indice_fragmento`). Cada fragmento tem o
+  esquema completo e é migrado na primeira vez que é aberto;
+- o banco de DATABASE_PATH vira o catálogo de contas: login, cadastro e
+  /usuarios. A conta é espelhada no fragmento (mesmo id) no cadastro e
+  no login (`espelhar_usuario`);
+- `PoolFragmentos` guarda uma conexão de escrita e uma trava por
+  fragmento. Avaliações de usuários em fragmentos diferentes gravam em
+  paralelo. Até FRAGMENTOS_ABERTOS conexões ficam abertas, e as menos
+  usadas recentemente e livres são fechadas;
+- no app, `conn` e `cursor` viram encaminhadores (`ConexaoDaThread`)
+  para a conexão vinculada à thread da requisição, então as rotas de
+  escrita não mudam;
+- ferramentas administrativas (`em_paralelo`) percorrem os fragmentos
+  em threads: migração, estatísticas e lembretes.
+
+`fragmentar` copia um banco único existente para os fragmentos. O banco
+original continua como catálogo.
+
+Baralhos compartilhados ficam no fragmento de quem publicou e só podem
+ser assinados por usuários do mesmo fragmento.
+
+Uso (benchmark: avaliações concorrentes de usuários diferentes):
+    python fragmentos.py [usuarios] [avaliacoes_por_usuario]
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from config import Config
+from consultas import conectar
+from limitador import FilaEscrita
+
+
+def ativo():
+    return Config.FRAGMENTOS > 0
+
+
+def indice_fragmento(usuario_id, total=None):
+    """Fragmento do usuário (roteamento por resto da divisão)."""
+    return usuario_id % (total or Config.FRAGMENTOS)
+
+
+def caminho_fragmento(indice, diretorio=None):
+    return os.path.join(diretorio or Config.FRAGMENTOS_DIR, f'fragmento_{indice:03d}.db')
+
+
+def caminhos_fragmentos(diretorio=None, total=None):
+    """Arquivos de fragmento já criados."""
+    caminhos = (caminho_fragmento(i, diretorio) for i in range(total or Config.FRAGMENTOS))
+    return [caminho for caminho in caminhos if os.path.exists(caminho)]
+
+
+class Fragmento:
+    """Conexão de escrita de um fragmento e a trava que a serializa."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.conn = conectar(caminho, check_same_thread=False)
+        self.cursor = self.conn.cursor()
+        self.trava = FilaEscrita()
+        self.em_uso = 0
+        self.ultimo_uso = time.monotonic()
+
+
+class PoolFragmentos:
+    """
+    Conexões de escrita por fragmento, com no máximo `maximo` abertas.
+
+    Ao passar do limite, as menos usadas recentemente que não estão em uso
+    são fechadas (reabertas sob demanda).
+    """
+
+    def __init__(self, maximo=None, diretorio=None, total=None):
+        self.maximo = maximo or Config.FRAGMENTOS_ABERTOS
+        self.diretorio = diretorio
+        self.total = total
+        self._abertos = OrderedDict()
+        self._migrados = set()
+        self._lock = threading.Lock()
+        self._lock_migracao = threading.Lock()
+        self.aberturas = 0
+        self.fechamentos = 0
+
+    def indice(self, usuario_id):
+        return indice_fragmento(usuario_id, self.total)
+
+    def preparar(self, indice):
+        """Caminho do fragmento, criado e migrado na primeira vez (por processo)."""
+        caminho = caminho_fragmento(indice, self.diretorio)
+        if caminho not in self._migrados:
+            with self._lock_migracao:
+                if caminho not in self._migrados:
+                    import banco
+                    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+                    banco.migrar(caminho)
+                    self._migrados.add(caminho)
+        return caminho
+
+    @contextmanager
+    def escrita(self, indice):
+        """Conexão de escrita do fragmento, com a trava dele adquirida."""
+        caminho = self.preparar(indice)
+        with self._lock:
+            fragmento = self._abertos.get(caminho)
+            if fragmento is None:
+                fragmento = self._abertos[caminho] = Fragmento(caminho)
+                self.aberturas += 1
+            self._abertos.move_to_end(caminho)
+            fragmento.em_uso += 1
+            self._fechar(lambda f: len(self._abertos) > self.maximo)
+        try:
+            with fragmento.trava:
+                yield fragmento
+        finally:
+            with self._lock:
+                fragmento.em_uso -= 1
+                fragmento.ultimo_uso = time.monotonic()
+
+    def _fechar(self, excedente):
+        # Do menos para o mais usado recentemente; chamado com self._lock
+        for caminho, fragmento in list(self._abertos.items()):
+            if not excedente(fragmento):
+                break
+            if fragmento.em_uso == 0:
+                fragmento.conn.close()
+                del self._abertos[caminho]
+                self.fechamentos += 1
+
+    def fechar_ociosos(self, segundos):
+        """Fecha as conexões livres sem uso há mais de `segundos`."""
+        limite = time.monotonic() - segundos
+        with self._lock:
+            self._fechar(lambda f: f.ultimo_uso < limite)
+
+    def fechar_todos(self):
+        with self._lock:
+            self._fechar(lambda f: True)
+
+    def abertos(self):
+        with self._lock:
+            return len(self._abertos)
+
+    def filas(self):
+        """Filas de escrita dos fragmentos abertos (métricas)."""
+        with self._lock:
+            return [fragmento.trava for fragmento in self._abertos.values()]
+
+
+class _Encaminhador:
+    """Repassa atributos para o objeto vinculado à thread atual."""
+
+    __slots__ = ('_local', '_nome')
+
+    def __init__(self, local, nome):
+        self._local = local
+        self._nome = nome
+
+    def _alvo(self):
+        alvo = getattr(self._local, self._nome, None)
+        if alvo is None:
+            raise RuntimeError('Nenhuma conexão de escrita vinculada a esta thread')
+        return alvo
+
+    def __getattr__(self, atributo):
+        return getattr(self._alvo(), atributo)
+
+    def __iter__(self):
+        return iter(self._alvo())
+
+
+class ConexaoDaThread:
+    """
+    Conexão e cursor de escrita vinculados à thread da requisição.
+
+    `conn` e `cursor` podem substituir a conexão global do app: cada
+    chamada vai para a conexão vinculada com `vincular` (a do fragmento
+    do usuário da sessão ou a do catálogo).
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self.conn = _Encaminhador(self._local, 'conn')
+        self.cursor = _Encaminhador(self._local, 'cursor')
+
+    @contextmanager
+    def vincular(self, conn, cursor):
+        anterior = getattr(self._local, 'conn', None), getattr(self._local, 'cursor', None)
+        self._local.conn, self._local.cursor = conn, cursor
+        try:
+            yield
+        finally:
+            self._local.conn, self._local.cursor = anterior
+
+
+def espelhar_usuario(pool, cursor_catalogo, usuario_id):
+    """
+    Copia a conta (e as configurações de email) do catálogo para o
+    fragmento do usuário, se ainda não estiver lá.
+
+    Returns:
+        True se copiou.
+    """
+    with pool.escrita(pool.indice(usuario_id)) as fragmento:
+        fragmento.cursor.execute('SELECT 1 FROM usuarios WHERE id = ?', (usuario_id,))
+        if fragmento.cursor.fetchone() is not None:
+            return False
+        cursor_catalogo.execute('SELECT id, nome, email, senha, data_criacao FROM usuarios WHERE id = ?',
+                                (usuario_id,))
+        usuario = cursor_catalogo.fetchone()
+        if usuario is None:
+            return False
+        cursor_catalogo.execute('SELECT usuario_id, email_notificacao, ativo FROM configuracoes_email '
+                                'WHERE usuario_id = ?', (usuario_id,))
+        emails = cursor_catalogo.fetchall()
+        fragmento.cursor.execute('INSERT INTO usuarios (id, nome, email, senha, data_criacao) VALUES (?, ?, ?, ?, ?)',
+                                 usuario)
+        fragmento.cursor.executemany('INSERT INTO configuracoes_email (usuario_id, email_notificacao, ativo) '
+                                     'VALUES (?, ?, ?)', emails)
+        fragmento.conn.commit()
+    return True
+
+
+def em_paralelo(funcao, caminhos, threads=None):
+    """
+    Aplica `funcao(caminho)` a cada fragmento em threads (o sqlite3 libera
+    o GIL durante as consultas). Cada chamada deve abrir a própria conexão.
+
+    Returns:
+        Os resultados, na ordem de `caminhos`.
+    """
+    if not caminhos:
+        return []
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=threads or min(len(caminhos), 8)) as executor:
+        return list(executor.map(funcao, caminhos))
+
+
+def _filtro(tabela, colunas):
+    """Linhas da tabela de origem que pertencem aos usuários do fragmento."""
+    if tabela == 'usuarios':
+        return 'WHERE id IN (SELECT id FROM temp.ids_usuarios)'
+    if 'usuario_id' in colunas:
+        return 'WHERE usuario_id IN (SELECT id FROM temp.ids_usuarios)'
+    if 'id_estudo' in colunas:
+        return 'WHERE id_estudo IN (SELECT id FROM origem.estudos WHERE usuario_id IN (SELECT id FROM temp.ids_usuarios))'
+    return ''   # tabelas compartilhadas (mídias, baralhos): copiadas inteiras
+
+
+def fragmentar(origem, total=None, diretorio=None):
+    """
+    Copia os dados de cada usuário do banco único `origem` para o seu
+    fragmento (que não pode existir ainda). Os triggers ficam desligados
+    durante a cópia (os contadores já vêm prontos da origem) e o índice de
+    busca é reconstruído no fim.
+
+    Returns:
+        {caminho do fragmento: quantidade de usuários}
+    """
+    import banco
+    total = total or Config.FRAGMENTOS
+    if total <= 0:
+        raise ValueError('Informe a quantidade de fragmentos (FRAGMENTOS > 0)')
+    conn_origem = conectar(origem)
+    usuarios = [row[0] for row in conn_origem.execute('SELECT id FROM usuarios ORDER BY id')]
+    conn_origem.close()
+    grupos = {}
+    for usuario_id in usuarios:
+        grupos.setdefault(indice_fragmento(usuario_id, total), []).append(usuario_id)
+
+    resultado = {}
+    for indice, ids in sorted(grupos.items()):
+        caminho = caminho_fragmento(indice, diretorio)
+        if os.path.exists(caminho):
+            raise ValueError(f'{caminho} já existe')
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        banco.migrar(caminho)
+        conn = conectar(caminho)
+        cursor = conn.cursor()
+        cursor.execute('ATTACH DATABASE ? AS origem', (origem,))
+        cursor.execute('CREATE TEMP TABLE ids_usuarios (id INTEGER PRIMARY KEY)')
+        cursor.executemany('INSERT INTO temp.ids_usuarios (id) VALUES (?)', [(i,) for i in ids])
+        cursor.execute("SELECT name FROM main.sqlite_master WHERE type = 'trigger'")
+        for (trigger,) in cursor.fetchall():
+            cursor.execute(f'DROP TRIGGER main.{trigger}')
+        cursor.execute('''
+            SELECT name FROM main.sqlite_master
+            WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name NOT LIKE 'estudos_fts%'
+        ''')
+        for (tabela,) in cursor.fetchall():
+            destino = [row[1] for row in cursor.execute(f'PRAGMA main.table_info({tabela})').fetchall()]
+            existentes = {row[1] for row in cursor.execute(f'PRAGMA origem.table_info({tabela})').fetchall()}
+            colunas = [c for c in destino if c in existentes]
+            if not colunas:
+                continue
+            lista = ', '.join(colunas)
+            cursor.execute(f'INSERT INTO main.{tabela} ({lista}) SELECT {lista} FROM origem.{tabela} '
+                           f'{_filtro(tabela, colunas)}')
+        conn.commit()
+        cursor.execute('DETACH DATABASE origem')
+        conn.close()
+        # Recria os triggers e o índice de busca (com os estudos copiados)
+        conn = conectar(caminho)
+        conn.execute("DROP TABLE IF EXISTS estudos_fts")
+        conn.commit()
+        conn.close()
+        banco.migrar(caminho)
+        resultado[caminho] = len(ids)
+    return resultado
+
+
+def main():
+    import sys
+    import tempfile
+
+    from alteracoes import registrar_alteracoes
+    from consultas import executar
+    from estado_cartoes import salvar_card_state
+    from estudos import inserir_estudo
+    from limites import registrar_servida
+
+    usuarios = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    avaliacoes = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+    hoje = time.strftime("%Y-%m-%d")
+
+    def avaliar(pool, usuario_id, revisoes):
+        # As escritas de avaliar_revisao (app.py), uma transação por avaliação
+        for revisao_id, id_estudo in revisoes:
+            with pool.escrita(pool.indice(usuario_id)) as fragmento:
+                cursor = fragmento.cursor
+                executar(cursor, 'concluir_revisao', (4, 3, 5000, revisao_id, usuario_id, 5000, usuario_id))
+                executar(cursor, 'agendar_revisao_sm2', (id_estudo, hoje, 2.6, 1, 1, 'flashcard'))
+                nova = cursor.lastrowid
+                salvar_card_state(cursor, id_estudo, usuario_id, 2.6, 1, 1, hoje, nova)
+                registrar_alteracoes(cursor, usuario_id, [('revisoes', revisao_id), ('revisoes', nova)])
+                registrar_servida(cursor, usuario_id, True)
+                fragmento.conn.commit()
+
+    print(f"{usuarios} usuários avaliando em paralelo, {avaliacoes} avaliações cada (uma transação por avaliação)")
+    base = None
+    for total in sorted({1, 2, 4, usuarios}):
+        with tempfile.TemporaryDirectory() as tmp:
+            pool = PoolFragmentos(diretorio=tmp, total=total, maximo=usuarios)
+            filas = {}
+            for usuario_id in range(1, usuarios + 1):
+                with pool.escrita(pool.indice(usuario_id)) as fragmento:
+                    cursor = fragmento.cursor
+                    cursor.execute("INSERT INTO usuarios (id, nome, email, senha) VALUES (?, 'Bench', ?, '')",
+                                   (usuario_id, f'bench{usuario_id}@fragmentos'))
+                    estudos = [inserir_estudo(cursor, usuario_id, 'Matéria', f'Tópico {i}', 'flashcard',
+                                              f'Pergunta {i}', f'Resposta {i}')[0] for i in range(avaliacoes)]
+                    cursor.execute(f'''
+                        SELECT revisao_id, id_estudo FROM card_state
+                        WHERE id_estudo IN ({', '.join('?' * len(estudos))})
+                    ''', estudos)
+                    filas[usuario_id] = cursor.fetchall()
+                    fragmento.conn.commit()
+
+            threads = [threading.Thread(target=avaliar, args=(pool, u, filas[u])) for u in filas]
+            inicio = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            decorrido = time.perf_counter() - inicio
+            pool.fechar_todos()
+
+        vazao = usuarios * avaliacoes / decorrido
+        base = base or vazao
+        rotulo = 'banco único' if total == 1 else f'{total} fragmentos'
+        print(f"  {rotulo:14}: {vazao:7.0f} avaliações/s ({vazao / base:4.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Gráficos de desempenho renderizados no servidor.
+
+Os PNGs são gerados com o backend Agg do matplotlib (sem display) e
+guardados em disco em `Config.GRAFICOS_DIR`, com a chave de versão dos
+dados do usuário no nome do arquivo. Enquanto o usuário não cadastra nem
+avalia nada (e o dia não muda), a mesma imagem é reaproveitada: pelo app
+(com cache de longa duração no cliente, já que a URL muda junto com a
+versão) e pelos emails de lembrete, que anexam o arquivo pronto.
+
+Uso (renderiza os gráficos de um usuário no banco configurado):
+    python graficos.py <usuario_id>
+"""
+
+import glob
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from config import Config
+from consultas import executar
+
+TIPOS = ('progresso', 'materias')
+DIAS_PROGRESSO = 30
+
+_lock = threading.Lock()
+
+
+def chave_grafico(cursor, usuario_id):
+    """Chave de cache dos gráficos: dia atual + versão persistente dos dados."""
+    versao = executar(cursor, 'versao_dados', (usuario_id,)).fetchone()[0]
+    return f"{datetime.now().strftime('%Y%m%d')}-{versao}"
+
+
+def _caminho(usuario_id, tipo, chave):
+    # Absoluto: o arquivo é gravado relativo ao diretório atual, mas o
+    # send_file do Flask resolveria um caminho relativo a partir do app
+    return os.path.join(os.path.abspath(Config.GRAFICOS_DIR), str(usuario_id), f"{tipo}-{chave}.png")
+
+
+def _figura():
+    # Figure direta (sem pyplot): não usa estado global nem display
+    from matplotlib.figure import Figure
+    return Figure(figsize=(8, 4), dpi=100)
+
+
+def _desenhar_progresso(cursor, usuario_id):
+    hoje = datetime.now()
+    inicio = (hoje - timedelta(days=DIAS_PROGRESSO - 1)).strftime("%Y-%m-%d")
+    executar(cursor, 'concluidas_por_dia', (usuario_id, inicio, hoje.strftime("%Y-%m-%d")))
+    por_dia = dict(cursor.fetchall())
+    datas = [hoje - timedelta(days=i) for i in range(DIAS_PROGRESSO - 1, -1, -1)]
+    valores = [por_dia.get(d.strftime("%Y-%m-%d"), 0) for d in datas]
+
+    fig = _figura()
+    ax = fig.add_subplot()
+    ax.bar([d.strftime("%d/%m") for d in datas], valores, color='#4e73df')
+    ax.set_title(f"Revisões concluídas nos últimos {DIAS_PROGRESSO} dias")
+    ax.set_ylabel("Revisões")
+    ax.tick_params(axis='x', labelrotation=90, labelsize=7)
+    return fig
+
+
+def _desenhar_materias(cursor, usuario_id):
+    executar(cursor, 'desempenho_materias', (usuario_id, usuario_id))
+    linhas = [(materia or 'Sem matéria', total or 0, concluidas or 0)
+              for materia, total, concluidas in cursor.fetchall()]
+    linhas.sort(key=lambda l: l[1])
+
+    fig = _figura()
+    ax = fig.add_subplot()
+    materias = [l[0] for l in linhas]
+    ax.barh(materias, [l[1] for l in linhas], color='#d1d3e2', label='Total')
+    ax.barh(materias, [l[2] for l in linhas], color='#1cc88a', label='Concluídas')
+    ax.set_title("Revisões por matéria")
+    ax.legend(loc='lower right')
+    return fig
+
+
+_DESENHOS = {
+    'progresso': _desenhar_progresso,
+    'materias': _desenhar_materias,
+}
+
+
+def obter_grafico(cursor, usuario_id, tipo, chave=None):
+    """
+    Caminho do PNG do gráfico `tipo` do usuário, renderizando se ainda
+    não existir no disco para a versão atual dos dados.
+    """
+    if chave is None:
+        chave = chave_grafico(cursor, usuario_id)
+    caminho = _caminho(usuario_id, tipo, chave)
+    if os.path.exists(caminho):
+        return caminho
+
+    with _lock:
+        if os.path.exists(caminho):
+            return caminho
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        fig = _DESENHOS[tipo](cursor, usuario_id)
+        fig.tight_layout()
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        fig.savefig(temporario, format='png')
+        os.replace(temporario, caminho)
+        # Versões anteriores deste gráfico não serão mais pedidas
+        for antigo in glob.glob(_caminho(usuario_id, tipo, '*')):
+            if antigo != caminho:
+                try:
+                    os.remove(antigo)
+                except OSError:
+                    pass
+    return caminho
+
+
+def main():
+    from consultas import conectar
+    if len(sys.argv) < 2:
+        print("Uso: python graficos.py <usuario_id>")
+        return
+    usuario_id = int(sys.argv[1])
+    conn = conectar(Config.DATABASE_PATH)
+    cursor = conn.cursor()
+    for tipo in TIPOS:
+        print(obter_grafico(cursor, usuario_id, tipo))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Conexões de leitura por thread.
+
+As rotas de leitura (fila, dashboard, previsão) não usam a conexão
+global de escrita do app: cada thread do servidor abre a sua própria
+conexão somente leitura. Com o banco em modo WAL, essas leituras rodam em
+paralelo entre si e não esperam a escrita em andamento.
+
+No modo ASGI (asgi.py) cada requisição roda em uma thread própria, então
+o acesso ao SQLite nunca bloqueia o event loop; no fim da requisição a
+thread devolve as suas conexões (`devolver_conexoes`) e a próxima as
+reaproveita em vez de abrir outras.
+"""
+
+import threading
+from collections import OrderedDict
+
+from config import Config
+from consultas import conectar
+
+_local = threading.local()
+_livres = {}   # caminho -> cursores devolvidos por threads que terminaram
+_livres_lock = threading.Lock()
+_caminho = Config.DATABASE_PATH
+_resolver = None
+
+
+def configurar(caminho, resolver=None):
+    """
+    Define o arquivo do banco usado pelas conexões de leitura. Com
+    `resolver`, o arquivo é escolhido a cada chamada (no modo fragmentado,
+    o fragmento do usuário da sessão; ver fragmentos.py).
+    """
+    global _caminho, _resolver
+    _caminho = caminho
+    _resolver = resolver
+
+
+def cursor_leitura(caminho=None):
+    """
+    Cursor da conexão somente leitura da thread atual para `caminho`
+    (padrão: o configurado), aberta sob demanda. Cada thread mantém até
+    FRAGMENTOS_ABERTOS conexões, fechando a usada há mais tempo.
+    """
+    if caminho is None:
+        caminho = _resolver() if _resolver else _caminho
+    cursores = getattr(_local, 'cursores', None)
+    if cursores is None:
+        cursores = _local.cursores = OrderedDict()
+    cursor = cursores.get(caminho)
+    if cursor is not None:
+        cursores.move_to_end(caminho)
+        return cursor
+    with _livres_lock:
+        devolvidos = _livres.get(caminho)
+        cursor = devolvidos.pop() if devolvidos else None
+    if cursor is None:
+        conn = conectar(caminho, check_same_thread=False)
+        conn.execute('PRAGMA query_only = ON')
+        cursor = conn.cursor()
+    cursores[caminho] = cursor
+    while len(cursores) > max(1, Config.FRAGMENTOS_ABERTOS):
+        _, antigo = cursores.popitem(last=False)
+        antigo.connection.close()
+    return cursor
+
+
+def fechar_conexao_leitura():
+    """Fecha as conexões de leitura da thread atual, se houver."""
+    cursores = getattr(_local, 'cursores', None)
+    while cursores:
+        _, cursor = cursores.popitem()
+        cursor.connection.close()
+
+
+def devolver_conexoes():
+    """
+    Passa as conexões de leitura da thread atual para a próxima thread que
+    pedir o mesmo arquivo. Chamada no fim de cada requisição pelo modo
+    ASGI, em que cada requisição tem uma thread nova.
+    """
+    cursores = getattr(_local, 'cursores', None)
+    while cursores:
+        caminho, cursor = cursores.popitem()
+        with _livres_lock:
+            _livres.setdefault(caminho, []).append(cursor)
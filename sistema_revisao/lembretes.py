@@ -3,16 +3,20 @@ import sqlite3
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from email.mime.image import MIMEImage
 from datetime import datetime, timedelta
 import time
 import os
 from dotenv import load_dotenv
+from estado_cartoes import criar_tabela_card_state, popular_card_state
+from graficos import obter_grafico
+import fragmentos
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
 class SistemaLembretes:
-    def __init__(self):
+    def __init__(self, database_path=None):
         # Configurações de email
         self.email_remetente = os.getenv('EMAIL_REMETENTE')
         self.senha_email = os.getenv('SENHA_EMAIL')
@@ -20,21 +24,21 @@ class SistemaLembretes:
         self.smtp_port = int(os.getenv('SMTP_PORT', '587'))
 
         # Configurações do sistema
-        self.database_path = os.getenv('DATABASE_PATH', 'revisao_estudos.db')
+        self.database_path = database_path or os.getenv('DATABASE_PATH', 'revisao_estudos.db')
         self.intervalo_verificacao = int(os.getenv('INTERVALO_VERIFICACAO', '3600'))  # 1 hora por padrão
 
         # Conectar ao banco de dados
         self.conn = sqlite3.connect(self.database_path)
         self.cursor = self.conn.cursor()
+        criar_tabela_card_state(self.cursor)
+        popular_card_state(self.cursor)
+        self.conn.commit()
 
-        print("Sistema de lembretes iniciado...")
-        print(f"Verificando a cada {self.intervalo_verificacao} segundos")
-
-    def enviar_email(self, destinatario, assunto, mensagem):
-        """Envia email usando SMTP"""
+    def enviar_email(self, destinatario, assunto, mensagem, imagens=None):
+        """Envia email usando SMTP (imagens: {content_id: caminho do PNG})"""
         try:
             # Criar mensagem
-            msg = MIMEMultipart()
+            msg = MIMEMultipart('related')
             msg['From'] = self.email_remetente
             msg['To'] = destinatario
             msg['Subject'] = assunto
@@ -42,6 +46,14 @@ class SistemaLembretes:
             # Adicionar corpo do email
             msg.attach(MIMEText(mensagem, 'html'))
 
+            # Imagens embutidas, referenciadas no HTML por cid:<content_id>
+            for content_id, caminho in (imagens or {}).items():
+                with open(caminho, 'rb') as arquivo:
+                    imagem = MIMEImage(arquivo.read(), 'png')
+                imagem.add_header('Content-ID', f'<{content_id}>')
+                imagem.add_header('Content-Disposition', 'inline', filename=os.path.basename(caminho))
+                msg.attach(imagem)
+
             # Conectar ao servidor SMTP
             servidor = smtplib.SMTP(self.smtp_server, self.smtp_port)
             servidor.starttls()
@@ -64,17 +76,25 @@ class SistemaLembretes:
         data_limite = hoje + timedelta(days=dias_aviso)
 
         self.cursor.execute('''
-            SELECT r.id, e.materia, e.topico, r.tipo, r.data_revisao
-            FROM revisoes r
-            JOIN estudos e ON r.id_estudo = e.id
-            WHERE r.feito = 0
-            AND e.usuario_id = ?
-            AND date(r.data_revisao) <= ?
-            ORDER BY r.data_revisao ASC
+            SELECT cs.revisao_id, e.materia, e.topico, r.tipo, cs.data_revisao
+            FROM card_state cs
+            JOIN vw_estudos e ON cs.id_estudo = e.id
+            JOIN revisoes r ON cs.revisao_id = r.id
+            WHERE cs.usuario_id = ?
+            AND cs.data_revisao <= ?
+            ORDER BY cs.data_revisao ASC
         ''', (usuario_id, data_limite.strftime("%Y-%m-%d")))
 
         return self.cursor.fetchall()
 
+    def obter_grafico_progresso(self, usuario_id):
+        """PNG do progresso do usuário (do cache em disco, se já renderizado)"""
+        try:
+            return obter_grafico(self.cursor, usuario_id, 'progresso')
+        except Exception as e:
+            print(f"Gráfico indisponível para o usuário {usuario_id}: {str(e)}")
+            return None
+
     def verificar_e_enviar_lembretes(self):
         """Verifica revisões pendentes e envia lembretes"""
         print(f"\n[{datetime.now()}] Verificando lembretes...")
@@ -129,6 +149,17 @@ class SistemaLembretes:
 
                 mensagem += """
                     </ul>
+                """
+
+                imagens = {}
+                grafico = self.obter_grafico_progresso(usuario_id)
+                if grafico:
+                    imagens['grafico-progresso'] = grafico
+                    mensagem += """
+                    <p><img src="cid:grafico-progresso" alt="Seu progresso" style="max-width: 100%;"></p>
+                    """
+
+                mensagem += """
                     <p>
                         <a href="http://localhost:5000" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">
                             Acessar Sistema
@@ -140,11 +171,29 @@ class SistemaLembretes:
                 """
 
                 # Enviar email
-                if self.enviar_email(email_destino, assunto, mensagem):
+                if self.enviar_email(email_destino, assunto, mensagem, imagens):
                     print(f"Lembrete enviado para {nome} ({email_destino})")
                 else:
                     print(f"Falha ao enviar lembrete para {nome}")
 
+    def verificar_todos(self):
+        """
+        Verifica os lembretes do banco configurado ou, no modo fragmentado,
+        de todos os fragmentos em paralelo (uma conexão por fragmento).
+        """
+        if not fragmentos.ativo():
+            self.verificar_e_enviar_lembretes()
+            return
+
+        def verificar(caminho):
+            sistema = SistemaLembretes(caminho)
+            try:
+                sistema.verificar_e_enviar_lembretes()
+            finally:
+                sistema.conn.close()
+
+        fragmentos.em_paralelo(verificar, fragmentos.caminhos_fragmentos())
+
     def executar(self):
         """Executa o sistema de lembretes em loop"""
         if not self.email_remetente or not self.senha_email:
@@ -152,11 +201,13 @@ class SistemaLembretes:
             print("Configure EMAIL_REMETENTE e SENHA_EMAIL no arquivo .env")
             return
 
+        print("Sistema de lembretes iniciado...")
+        print(f"Verificando a cada {self.intervalo_verificacao} segundos")
         print("Iniciando monitoramento de lembretes...")
 
         try:
             while True:
-                self.verificar_e_enviar_lembretes()
+                self.verificar_todos()
                 time.sleep(self.intervalo_verificacao)
 
         except KeyboardInterrupt:
@@ -0,0 +1,258 @@
+"""
+Limite de taxa e fila de escrita limitada.
+
+As rotas de escrita (login, cadastro de conta, cadastro de estudo e
+avaliação) aceitavam qualquer volume: um cliente com defeito ou um script
+ocupava o único escritor do SQLite e todos os outros esperavam.
+
+- `BaldeTokens`: um balde por (rota, usuário ou IP), com `capacidade`
+  requisições (ou itens de um lote) de rajada, reabastecido a `capacidade / segundos` por
+  segundo. Sem token, a rota responde 429 com Retry-After. Os limites
+  vêm de `LIMITES_TAXA` ("rota=N/segundos,..."). O balde fica na memória
+  do processo; outro objeto com o mesmo `consumir` (ex.: um backend
+  compartilhado entre os workers) pode substituí-lo.
+- `FilaEscrita`: trava de escrita com no máximo `FILA_ESCRITA_MAX`
+  requisições esperando e no máximo `FILA_ESCRITA_ESPERA` segundos de
+  espera. Acima disso levanta `FilaCheia` (503 com Retry-After) em vez de
+  acumular requisições até o timeout do servidor. Usada no lugar de
+  `threading.Lock` na trava global (app.py) e nas dos fragmentos.
+
+Os contadores (permitidas, rejeitadas, em espera, tempo de espera) saem
+em /api/metricas/escrita.
+"""
+
+import math
+import threading
+import time
+
+from config import Config
+
+
+class FilaCheia(Exception):
+    """A fila de escrita está cheia ou a espera passou do limite."""
+
+    def __init__(self, motivo, retry_after=1):
+        super().__init__(motivo)
+        self.retry_after = retry_after
+
+
+def ler_limites(texto):
+    """
+    Converte "login=10/60,cadastrar=60/60" em {'login': (10, 60.0), ...}.
+    Entradas com N <= 0 ficam sem limite.
+
+    Raises:
+        ValueError: se alguma entrada estiver mal formada.
+    """
+    limites = {}
+    for entrada in (texto or '').split(','):
+        entrada = entrada.strip()
+        if not entrada:
+            continue
+        try:
+            rota, valor = entrada.split('=')
+            capacidade, segundos = valor.split('/')
+            capacidade, segundos = int(capacidade), float(segundos)
+        except ValueError:
+            raise ValueError(f"Limite inválido em LIMITES_TAXA: {entrada!r} (use rota=N/segundos)")
+        if capacidade > 0 and segundos > 0:
+            limites[rota.strip()] = (capacidade, segundos)
+    return limites
+
+
+class BaldeTokens:
+    """Baldes de tokens por chave, na memória do processo."""
+
+    def __init__(self, maximo_chaves=100000):
+        self.maximo_chaves = maximo_chaves
+        self._baldes = {}   # chave -> (tokens, última atualização, capacidade, tokens por segundo)
+        self._lock = threading.Lock()
+
+    def consumir(self, chave, capacidade, segundos, custo=1, agora=None):
+        """
+        Tenta gastar `custo` tokens (no máximo a capacidade) do balde da chave.
+
+        Returns:
+            0.0 se permitido, senão os segundos até haver tokens suficientes.
+        """
+        agora = time.monotonic() if agora is None else agora
+        por_segundo = capacidade / segundos
+        custo = min(custo, capacidade)
+        with self._lock:
+            tokens, atualizado = self._baldes.get(chave, (capacidade, agora))[:2]
+            tokens = min(capacidade, tokens + (agora - atualizado) * por_segundo)
+            if tokens >= custo:
+                self._baldes[chave] = (tokens - custo, agora, capacidade, por_segundo)
+                if len(self._baldes) > self.maximo_chaves:
+                    self._podar(agora)
+                return 0.0
+            self._baldes[chave] = (tokens, agora, capacidade, por_segundo)
+            return (custo - tokens) / por_segundo
+
+    def _podar(self, agora):
+        # Baldes que já estariam cheios equivalem a chaves ausentes; chamado com self._lock
+        cheios = [chave for chave, (tokens, atualizado, capacidade, por_segundo) in self._baldes.items()
+                  if tokens + (agora - atualizado) * por_segundo >= capacidade]
+        for chave in cheios:
+            del self._baldes[chave]
+
+
+class LimitadorTaxa:
+    """Limites por rota sobre um backend de baldes, com contadores por rota."""
+
+    def __init__(self, limites=None, backend=None):
+        self.limites = ler_limites(Config.LIMITES_TAXA) if limites is None else limites
+        self.backend = backend or BaldeTokens()
+        self._contadores = {}   # rota -> [permitidas, rejeitadas]
+        self._lock = threading.Lock()
+
+    def verificar(self, rota, identidade, custo=1):
+        """
+        Consome `custo` tokens da rota para a identidade (usuário ou IP);
+        um lote de N avaliações custa N.
+
+        Returns:
+            None se permitido (ou rota sem limite), senão o Retry-After em
+            segundos inteiros.
+        """
+        limite = self.limites.get(rota)
+        if limite is None:
+            return None
+        espera = self.backend.consumir(f'{rota}:{identidade}', *limite, custo=custo)
+        with self._lock:
+            contadores = self._contadores.setdefault(rota, [0, 0])
+            contadores[espera > 0] += 1
+        return max(1, math.ceil(espera)) if espera > 0 else None
+
+    def metricas(self):
+        with self._lock:
+            return {rota: {'permitidas': p, 'rejeitadas': r} for rota, (p, r) in self._contadores.items()}
+
+
+class FilaEscrita:
+    """
+    Trava (usável com `with`) que rejeita em vez de esperar sem limite.
+
+    Args:
+        maximo: Requisições esperando pela trava; a seguinte é rejeitada
+            na hora. 0 = sem limite.
+        espera: Segundos máximos de espera pela trava.
+    """
+
+    def __init__(self, maximo=None, espera=None):
+        self.maximo = Config.FILA_ESCRITA_MAX if maximo is None else maximo
+        self.espera = Config.FILA_ESCRITA_ESPERA if espera is None else espera
+        self._trava = threading.Lock()
+        self._lock = threading.Lock()
+        self.em_espera = 0
+        self.pico_espera = 0
+        self.admitidas = 0
+        self.rejeitadas_cheia = 0
+        self.rejeitadas_tempo = 0
+        self.tempo_espera = 0.0
+        self.maior_espera = 0.0
+
+    def __enter__(self):
+        with self._lock:
+            if self.maximo and self.em_espera >= self.maximo:
+                self.rejeitadas_cheia += 1
+                raise FilaCheia('Fila de escrita cheia', max(1, math.ceil(self.espera)))
+            self.em_espera += 1
+            self.pico_espera = max(self.pico_espera, self.em_espera)
+        inicio = time.perf_counter()
+        obtida = self._trava.acquire(timeout=self.espera)
+        esperado = time.perf_counter() - inicio
+        with self._lock:
+            self.em_espera -= 1
+            if obtida:
+                self.admitidas += 1
+                self.tempo_espera += esperado
+                self.maior_espera = max(self.maior_espera, esperado)
+            else:
+                self.rejeitadas_tempo += 1
+        if not obtida:
+            raise FilaCheia('Tempo de espera pela escrita esgotado', max(1, math.ceil(self.espera)))
+        return self
+
+    def __exit__(self, *excecao):
+        self._trava.release()
+        return False
+
+    def metricas(self):
+        with self._lock:
+            return {
+                'em_espera': self.em_espera,
+                'pico_espera': self.pico_espera,
+                'admitidas': self.admitidas,
+                'rejeitadas_cheia': self.rejeitadas_cheia,
+                'rejeitadas_tempo': self.rejeitadas_tempo,
+                'espera_media_ms': self.tempo_espera / self.admitidas * 1000 if self.admitidas else 0.0,
+                'maior_espera_ms': self.maior_espera * 1000,
+            }
+
+
+def somar_metricas(filas):
+    """Contadores de várias filas (ex.: uma por fragmento) somados."""
+    total = {'em_espera': 0, 'pico_espera': 0, 'admitidas': 0, 'rejeitadas_cheia': 0, 'rejeitadas_tempo': 0,
+             'espera_media_ms': 0.0, 'maior_espera_ms': 0.0}
+    tempo_total = 0.0
+    for fila in filas:
+        m = fila.metricas()
+        for chave in ('em_espera', 'admitidas', 'rejeitadas_cheia', 'rejeitadas_tempo'):
+            total[chave] += m[chave]
+        total['pico_espera'] = max(total['pico_espera'], m['pico_espera'])
+        total['maior_espera_ms'] = max(total['maior_espera_ms'], m['maior_espera_ms'])
+        tempo_total += m['espera_media_ms'] * m['admitidas']
+    if total['admitidas']:
+        total['espera_media_ms'] = tempo_total / total['admitidas']
+    return total
+
+
+def main():
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    clientes = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    requisicoes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    escrita_ms = 2.0
+
+    balde = BaldeTokens()
+    n = 200000
+    inicio = time.perf_counter()
+    for i in range(n):
+        balde.consumir(f'marcar_feita:{i % 1000}', 120, 60.0)
+    print(f"BaldeTokens.consumir: {(time.perf_counter() - inicio) / n * 1e6:.2f} µs/chamada")
+
+    print(f"\n{clientes} clientes x {requisicoes} escritas de {escrita_ms:.0f} ms")
+    for nome, trava in (('trava sem limite', threading.Lock()),
+                        ('fila limitada (16, 0.2 s)', FilaEscrita(maximo=16, espera=0.2))):
+        latencias = []
+        rejeitadas = [0]
+        lock = threading.Lock()
+
+        def cliente(_):
+            for _ in range(requisicoes):
+                inicio = time.perf_counter()
+                try:
+                    with trava:
+                        time.sleep(escrita_ms / 1000)
+                except FilaCheia:
+                    with lock:
+                        rejeitadas[0] += 1
+                    continue
+                with lock:
+                    latencias.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(clientes) as executor:
+            list(executor.map(cliente, range(clientes)))
+        total = time.perf_counter() - inicio
+        latencias.sort()
+        p50 = latencias[len(latencias) // 2] * 1000
+        p99 = latencias[int(len(latencias) * 0.99)] * 1000
+        print(f"  {nome:26}: {len(latencias):5} atendidas (p50 {p50:6.1f} ms, p99 {p99:6.1f} ms), "
+              f"{rejeitadas[0]:5} rejeitadas, {total:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
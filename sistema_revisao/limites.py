@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Limites diários da fila: revisões por dia e cartões novos por dia.
+
+Todo estudo cadastrado cria uma revisão inicial para hoje, então quem
+cadastra ou importa muito acumula uma fila sem fim. Cada usuário tem
+dois limites (`usuarios.limite_revisoes_dia` e `limite_novos_dia`; NULL
+usa os padrões de config.py, 0 desativa):
+
+- `fila_diaria` conta, por usuário e dia, os cartões já avaliados
+  (revisões e novos separados), incrementada na avaliação;
+- a fila é montada com duas consultas ('fila_revisoes' e 'fila_novos'),
+  cada uma com LIMIT pela cota que resta no dia. O índice
+  (usuario_id, novo, data_revisao) de card_state entrega as linhas em
+  ordem, então o custo depende da cota e não do acúmulo.
+
+Cada consulta pede uma linha a mais que a cota só para saber se ficou
+algo para amanhã.
+
+Uso (benchmark da montagem da fila com acúmulo crescente):
+    python limites.py
+"""
+
+import sqlite3
+import time
+from datetime import datetime
+
+from config import Config
+from consultas import executar
+
+LIMITE_MAXIMO = 10000
+
+
+def criar_tabelas_limites(cursor):
+    """Cria as colunas de limite e o contador diário (idempotente)."""
+    for coluna in ('limite_revisoes_dia', 'limite_novos_dia'):
+        try:
+            cursor.execute(f"ALTER TABLE usuarios ADD COLUMN {coluna} INTEGER")
+        except sqlite3.OperationalError:
+            pass
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS fila_diaria (
+        usuario_id INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        revisoes INTEGER DEFAULT 0,
+        novos INTEGER DEFAULT 0,
+        PRIMARY KEY (usuario_id, data)
+    ) WITHOUT ROWID
+    ''')
+
+
+def obter_cota(cursor, usuario_id, hoje=None):
+    """
+    Limites do usuário e o que já foi avaliado hoje.
+
+    Returns:
+        Dict com limite_revisoes, limite_novos (0 = sem limite),
+        revisoes_feitas, novos_feitos e as cotas restantes (None = sem limite).
+    """
+    hoje = hoje or datetime.now().strftime("%Y-%m-%d")
+    row = executar(cursor, 'cota_do_dia', (Config.LIMITE_REVISOES_DIA, Config.LIMITE_NOVOS_DIA,
+                                           hoje, usuario_id)).fetchone()
+    limite_revisoes, limite_novos, revisoes_feitas, novos_feitos = row or (
+        Config.LIMITE_REVISOES_DIA, Config.LIMITE_NOVOS_DIA, 0, 0)
+    return {
+        'limite_revisoes': limite_revisoes,
+        'limite_novos': limite_novos,
+        'revisoes_feitas': revisoes_feitas,
+        'novos_feitos': novos_feitos,
+        'revisoes_restantes': max(0, limite_revisoes - revisoes_feitas) if limite_revisoes else None,
+        'novos_restantes': max(0, limite_novos - novos_feitos) if limite_novos else None,
+    }
+
+
+def _ler(cursor, nome, usuario_id, ate, limite):
+    """Até `limite` linhas da consulta (None = todas) e se sobrou alguma."""
+    if limite is None:
+        return executar(cursor, nome, (usuario_id, ate, -1)).fetchall(), False
+    if limite <= 0:
+        return [], executar(cursor, nome, (usuario_id, ate, 1)).fetchone() is not None
+    linhas = executar(cursor, nome, (usuario_id, ate, limite + 1)).fetchall()
+    return linhas[:limite], len(linhas) > limite
+
+
+def montar_fila(cursor, usuario_id, ate, pre_prova=False, maximo=None, hoje=None):
+    """
+    Fila do usuário até a data `ate`, respeitando as cotas do dia.
+
+    Args:
+        pre_prova: ordena as revisões priorizando baixa confiança.
+        maximo: teto extra de cartões de cada tipo (ex.: fila offline).
+
+    Returns:
+        (linhas, info): revisões seguidas dos novos, nas colunas de
+        'fila_revisoes'; `info` é a cota do dia mais `revisoes_adiadas` e
+        `novos_adiados` (True se ficaram cartões além da cota).
+    """
+    cota = obter_cota(cursor, usuario_id, hoje)
+    limite_revisoes = _menor(cota['revisoes_restantes'], maximo)
+    limite_novos = _menor(cota['novos_restantes'], maximo)
+    revisoes, revisoes_adiadas = _ler(cursor, 'fila_revisoes_pre_prova' if pre_prova else 'fila_revisoes',
+                                      usuario_id, ate, limite_revisoes)
+    novos, novos_adiados = _ler(cursor, 'fila_novos', usuario_id, ate, limite_novos)
+    cota['revisoes_adiadas'] = revisoes_adiadas and limite_revisoes == cota['revisoes_restantes']
+    cota['novos_adiados'] = novos_adiados and limite_novos == cota['novos_restantes']
+    return revisoes + novos, cota
+
+
+def _menor(a, b):
+    if a is None:
+        return b
+    return a if b is None else min(a, b)
+
+
+def registrar_servida(cursor, usuario_id, novo, hoje=None):
+    """Conta um cartão avaliado hoje na cota do usuário. Não faz commit."""
+    hoje = hoje or datetime.now().strftime("%Y-%m-%d")
+    executar(cursor, 'registrar_servida', (usuario_id, hoje, 1 if novo else 0, 1 if novo else 0))
+
+
+def salvar_limites(cursor, usuario_id, dados):
+    """
+    Grava os limites enviados (`limite_revisoes_dia`, `limite_novos_dia`;
+    None volta ao padrão, 0 desativa). Não faz commit.
+
+    Raises:
+        ValueError: se algum valor for inválido.
+    """
+    valores = {}
+    for campo in ('limite_revisoes_dia', 'limite_novos_dia'):
+        if campo not in dados:
+            continue
+        valor = dados[campo]
+        if valor is not None and (isinstance(valor, bool) or not isinstance(valor, int)
+                                  or not 0 <= valor <= LIMITE_MAXIMO):
+            raise ValueError(f'{campo} deve ser um inteiro entre 0 e {LIMITE_MAXIMO} (ou null para o padrão)')
+        valores[campo] = valor
+    if not valores:
+        raise ValueError('Informe limite_revisoes_dia e/ou limite_novos_dia')
+    atribuicoes = ', '.join(f'{campo} = ?' for campo in valores)
+    cursor.execute(f'UPDATE usuarios SET {atribuicoes} WHERE id = ?', (*valores.values(), usuario_id))
+
+
+def main():
+    import os
+    import tempfile
+
+    import banco
+    from consultas import conectar
+
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    print(f"Montagem da fila (limites {Config.LIMITE_REVISOES_DIA} revisões / {Config.LIMITE_NOVOS_DIA} novos)")
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'limites.db')
+        banco.migrar(caminho)
+        conn = conectar(caminho)
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO usuarios (nome, email, senha) VALUES ('Bench', 'bench@limites', '')")
+        usuario_id = cursor.lastrowid
+        total = 0
+        for acumulo in (1000, 10000, 100000):
+            # Metade revisões atrasadas, metade cartões novos
+            novos = acumulo - total
+            cursor.executemany('INSERT INTO estudos (materia, topico, data_estudo, usuario_id) VALUES (?, ?, ?, ?)',
+                               [('Matéria', f'Tópico {total + i}', hoje, usuario_id) for i in range(novos)])
+            cursor.execute('''
+                INSERT INTO revisoes (id_estudo, data_revisao, tipo, feito)
+                SELECT id, '2020-01-01', 'Revisão inicial', 0 FROM estudos
+                WHERE usuario_id = ? AND id NOT IN (SELECT id_estudo FROM card_state)
+            ''', (usuario_id,))
+            cursor.execute('''
+                INSERT INTO card_state (id_estudo, usuario_id, data_revisao, revisao_id, novo)
+                SELECT r.id_estudo, ?, date('2020-01-01', '+' || (r.id % 1000) || ' days'), r.id, r.id % 2
+                FROM revisoes r WHERE r.id_estudo NOT IN (SELECT id_estudo FROM card_state)
+            ''', (usuario_id,))
+            conn.commit()
+            total = acumulo
+
+            tempos = {}
+            for nome, limitada in (('sem limite', False), ('com limite', True)):
+                cursor.execute('UPDATE usuarios SET limite_revisoes_dia = ?, limite_novos_dia = ? WHERE id = ?',
+                               (None if limitada else 0, None if limitada else 0, usuario_id))
+                inicio = time.perf_counter()
+                for _ in range(5):
+                    linhas, _ = montar_fila(cursor, usuario_id, hoje)
+                tempos[nome] = ((time.perf_counter() - inicio) / 5, len(linhas))
+            print(f"  acúmulo {acumulo:>7}: " + ', '.join(
+                f"{nome} {tempo * 1000:8.2f} ms ({linhas} cartões)" for nome, (tempo, linhas) in tempos.items()))
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
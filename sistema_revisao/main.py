@@ -1,8 +1,10 @@
 import sqlite3
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
 
 def gerar_grafico_desempenho():
+    # Importado aqui: o matplotlib só é necessário para o gráfico
+    import matplotlib.pyplot as plt
+
     cursor.execute('''
     SELECT resultado, COUNT(*) FROM desempenho
     GROUP BY resultado
@@ -36,41 +38,38 @@ def gerar_grafico_desempenho():
     plt.savefig("grafico_desempenho.png")
     plt.show()
 
-# Conectar ou criar o banco de dados
-conn = sqlite3.connect("revisao_estudos.db")
-cursor = conn.cursor()
-
 # Criar as tabelas
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS estudos (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    materia TEXT NOT NULL,
-    topico TEXT NOT NULL,
-    data_estudo TEXT NOT NULL
-)
-''')
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS revisoes (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    id_estudo INTEGER,
-    data_revisao TEXT NOT NULL,
-    tipo TEXT NOT NULL,
-    feito INTEGER DEFAULT 0,
-    FOREIGN KEY (id_estudo) REFERENCES estudos(id)
-)
-''')
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS desempenho (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    id_revisao INTEGER,
-    resultado TEXT,
-    data_registro TEXT,
-    FOREIGN KEY (id_revisao) REFERENCES revisoes(id)
-)
-''')
-conn.commit()
+def criar_tabelas():
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS estudos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        materia TEXT NOT NULL,
+        topico TEXT NOT NULL,
+        data_estudo TEXT NOT NULL
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS revisoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_estudo INTEGER,
+        data_revisao TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        feito INTEGER DEFAULT 0,
+        FOREIGN KEY (id_estudo) REFERENCES estudos(id)
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS desempenho (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_revisao INTEGER,
+        resultado TEXT,
+        data_registro TEXT,
+        FOREIGN KEY (id_revisao) REFERENCES revisoes(id)
+    )
+    ''')
+    conn.commit()
 
 # Função para cadastrar novo estudo
 def cadastrar_estudo():
@@ -188,5 +187,10 @@ def main():
         else:
             print("Opção inválida.")
 
-main()
-conn.close()
\ No newline at end of file
+if __name__ == "__main__":
+    # Conectar ou criar o banco de dados
+    conn = sqlite3.connect("revisao_estudos.db")
+    cursor = conn.cursor()
+    criar_tabelas()
+    main()
+    conn.close()
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Imagens e áudios anexados aos cartões.
+
+Os arquivos ficam fora do SQLite, em um repositório endereçado pelo
+conteúdo em `Config.MIDIA_DIR`: o nome de cada arquivo é o hash SHA-256
+dos bytes (em subpastas pelos 4 primeiros caracteres). O mesmo arquivo
+enviado duas vezes, por qualquer usuário, é guardado uma vez só.
+
+No banco ficam só os metadados (`midias`) e os vínculos com os estudos
+(`estudos_midias`), então o conteúdo dos cartões continua pequeno: a fila
+e a API devolvem o hash e o tipo, e o arquivo é pedido à parte.
+
+Como o conteúdo de um hash nunca muda, `/midia/<hash>` responde com o
+próprio hash como ETag forte e cache imutável, e aceita requisições
+condicionais e de intervalo (Range) pelo `send_file`, o que permite
+avançar um áudio sem baixar tudo. As miniaturas das imagens são geradas
+com Pillow na primeira vez que são pedidas e ficam em disco.
+
+Uso (benchmark de gravação, deduplicação e miniaturas):
+    python midia.py [arquivos]
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from config import Config
+
+BLOCO = 64 * 1024
+LARGURAS_MINIATURA = (160, 320, 640)
+# Arquivos gravados (ou reenviados) há menos que isto não são apagados por
+# `remover_orfas`: o envio grava o arquivo antes do vínculo
+CARENCIA_ORFAS = 3600
+CAMPOS = ('pergunta', 'resposta')
+
+# Tipo detectado pelos primeiros bytes (o tipo enviado pelo cliente é ignorado)
+_ASSINATURAS = (
+    (b'\x89PNG\r\n\x1a\n', 0, 'image/png'),
+    (b'\xff\xd8\xff', 0, 'image/jpeg'),
+    (b'GIF87a', 0, 'image/gif'),
+    (b'GIF89a', 0, 'image/gif'),
+    (b'WEBP', 8, 'image/webp'),
+    (b'ID3', 0, 'audio/mpeg'),
+    (b'\xff\xfb', 0, 'audio/mpeg'),
+    (b'\xff\xf3', 0, 'audio/mpeg'),
+    (b'OggS', 0, 'audio/ogg'),
+    (b'WAVE', 8, 'audio/wav'),
+    (b'ftypM4A', 4, 'audio/mp4'),
+)
+_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+_lock_miniaturas = threading.Lock()
+
+
+class MidiaInvalida(ValueError):
+    """Arquivo vazio, grande demais ou de tipo não aceito."""
+
+
+def criar_tabelas_midia(cursor):
+    """Cria as tabelas de metadados e vínculos (idempotente)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS midias (
+        hash TEXT PRIMARY KEY,
+        tipo TEXT NOT NULL,
+        tamanho INTEGER NOT NULL,
+        data_criacao TEXT
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS estudos_midias (
+        id_estudo INTEGER NOT NULL,
+        hash TEXT NOT NULL,
+        campo TEXT NOT NULL DEFAULT 'pergunta',
+        PRIMARY KEY (id_estudo, hash, campo)
+    ) WITHOUT ROWID
+    ''')
+    # Permissão de acesso e limpeza: quem usa este hash
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_estudos_midias_hash ON estudos_midias(hash)')
+
+
+def hash_valido(texto):
+    return bool(_HASH.match(texto or ''))
+
+
+def _raiz():
+    # Absoluta: o send_file do Flask resolveria um caminho relativo a
+    # partir do app, e não do diretório atual, onde o arquivo é gravado
+    return os.path.abspath(Config.MIDIA_DIR)
+
+
+def _caminho_miniatura(hash_midia, largura):
+    return os.path.join(_raiz(), 'miniaturas', hash_midia[:2], f'{hash_midia}-{largura}.jpg')
+
+
+def caminho_blob(hash_midia):
+    return os.path.join(_raiz(), hash_midia[:2], hash_midia[2:4], hash_midia)
+
+
+def detectar_tipo(inicio):
+    """Tipo MIME pelos primeiros bytes, ou None se não for imagem/áudio aceito."""
+    for assinatura, posicao, tipo in _ASSINATURAS:
+        if inicio[posicao:posicao + len(assinatura)] == assinatura:
+            return tipo
+    return None
+
+
+def guardar_blob(fluxo, tamanho_max=None):
+    """
+    Grava o conteúdo de `fluxo` no repositório, calculando o hash durante
+    a cópia (sem carregar o arquivo inteiro na memória).
+
+    Returns:
+        (hash, tipo, tamanho, novo): `novo` é False se o arquivo já existia.
+
+    Raises:
+        MidiaInvalida: vazio, maior que `tamanho_max` ou tipo não aceito.
+    """
+    tamanho_max = tamanho_max or Config.MIDIA_TAMANHO_MAX
+    temporarios = os.path.join(_raiz(), 'tmp')
+    os.makedirs(temporarios, exist_ok=True)
+    soma = hashlib.sha256()
+    tamanho = 0
+    tipo = None
+    descritor, temporario = tempfile.mkstemp(dir=temporarios)
+    try:
+        with os.fdopen(descritor, 'wb') as saida:
+            while True:
+                bloco = fluxo.read(BLOCO)
+                if not bloco:
+                    break
+                if tamanho == 0:
+                    tipo = detectar_tipo(bloco[:16])
+                    if tipo is None:
+                        raise MidiaInvalida('Tipo de arquivo não aceito (use PNG, JPEG, GIF, WebP, MP3, OGG, WAV ou M4A)')
+                tamanho += len(bloco)
+                if tamanho > tamanho_max:
+                    raise MidiaInvalida(f'Arquivo maior que {tamanho_max // (1024 * 1024)} MB')
+                soma.update(bloco)
+                saida.write(bloco)
+        if tamanho == 0:
+            raise MidiaInvalida('Arquivo vazio')
+
+        hash_midia = soma.hexdigest()
+        destino = caminho_blob(hash_midia)
+        if os.path.exists(destino):
+            os.remove(temporario)
+            # Reenvio: renova a data do arquivo para a carência de `remover_orfas`
+            os.utime(destino)
+            return hash_midia, tipo, tamanho, False
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(temporario, destino)
+        return hash_midia, tipo, tamanho, True
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def anexar_midia(cursor, id_estudo, fluxo, campo='pergunta'):
+    """
+    Guarda o arquivo e o vincula ao estudo. Não faz commit.
+
+    Returns:
+        Dict da mídia (hash, tipo, tamanho, campo).
+    """
+    if campo not in CAMPOS:
+        raise MidiaInvalida(f"Campo deve ser um de: {', '.join(CAMPOS)}")
+    hash_midia, tipo, tamanho, _ = guardar_blob(fluxo)
+    cursor.execute('''
+        INSERT OR IGNORE INTO midias (hash, tipo, tamanho, data_criacao) VALUES (?, ?, ?, ?)
+    ''', (hash_midia, tipo, tamanho, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    cursor.execute('INSERT OR IGNORE INTO estudos_midias (id_estudo, hash, campo) VALUES (?, ?, ?)',
+                   (id_estudo, hash_midia, campo))
+    return {'hash': hash_midia, 'tipo': tipo, 'tamanho': tamanho, 'campo': campo}
+
+
+def desanexar_midia(cursor, id_estudo, hash_midia, campo=None):
+    """
+    Remove o vínculo (o arquivo fica para outros estudos que o usem; ver
+    `remover_orfas`). Não faz commit.
+    """
+    if campo:
+        cursor.execute('DELETE FROM estudos_midias WHERE id_estudo = ? AND hash = ? AND campo = ?',
+                       (id_estudo, hash_midia, campo))
+    else:
+        cursor.execute('DELETE FROM estudos_midias WHERE id_estudo = ? AND hash = ?', (id_estudo, hash_midia))
+    return cursor.rowcount > 0
+
+
+def midias_por_revisao(cursor, revisao_ids):
+    """
+    Mídias dos estudos das revisões `revisao_ids`, em uma consulta: as
+    vinculadas ao estudo e, para cartões de baralho ainda sem conteúdo
+    próprio, as do cartão publicado (baralhos.py).
+
+    Returns:
+        {revisao_id: [{'hash', 'tipo', 'campo'}, ...]}
+    """
+    if not revisao_ids:
+        return {}
+    marcadores = ', '.join('?' * len(revisao_ids))
+    cursor.execute(f'''
+        SELECT v.revisao_id, v.hash, m.tipo, v.campo
+        FROM (
+            SELECT r.id AS revisao_id, em.hash AS hash, em.campo AS campo
+            FROM revisoes r
+            JOIN estudos_midias em ON em.id_estudo = r.id_estudo
+            WHERE r.id IN ({marcadores})
+            UNION
+            SELECT r.id, cm.hash, cm.campo
+            FROM revisoes r
+            JOIN estudos e ON e.id = r.id_estudo AND e.tipo_conteudo IS NULL
+            JOIN cartoes_baralho_midias cm ON cm.cartao_id = e.cartao_baralho_id
+            WHERE r.id IN ({marcadores})
+        ) v
+        JOIN midias m ON m.hash = v.hash
+        ORDER BY v.revisao_id, v.campo, v.hash
+    ''', list(revisao_ids) * 2)
+    resultado = {}
+    for revisao_id, hash_midia, tipo, campo in cursor.fetchall():
+        resultado.setdefault(revisao_id, []).append({'hash': hash_midia, 'tipo': tipo, 'campo': campo})
+    return resultado
+
+
+def tipo_se_permitido(cursor, usuario_id, hash_midia):
+    """Tipo da mídia se algum estudo do usuário (ou cartão de baralho assinado) a usa, senão None."""
+    cursor.execute('''
+        SELECT m.tipo FROM midias m
+        WHERE m.hash = ? AND (EXISTS (
+            SELECT 1 FROM estudos_midias em JOIN estudos e ON e.id = em.id_estudo
+            WHERE em.hash = m.hash AND e.usuario_id = ?
+        ) OR EXISTS (
+            SELECT 1 FROM cartoes_baralho_midias cm JOIN estudos e ON e.cartao_baralho_id = cm.cartao_id
+            WHERE cm.hash = m.hash AND e.usuario_id = ?
+        ))
+    ''', (hash_midia, usuario_id, usuario_id))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def obter_miniatura(hash_midia, largura):
+    """
+    Caminho da miniatura JPEG da imagem, gerada na primeira chamada.
+
+    Returns:
+        Caminho do arquivo, ou None se o Pillow não estiver instalado ou
+        o arquivo não for uma imagem legível.
+    """
+    caminho = _caminho_miniatura(hash_midia, largura)
+    if os.path.exists(caminho):
+        return caminho
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    with _lock_miniaturas:
+        if os.path.exists(caminho):
+            return caminho
+        try:
+            with Image.open(caminho_blob(hash_midia)) as imagem:
+                imagem.draft('RGB', (largura, largura))   # JPEG: decodifica já reduzido
+                imagem = imagem.convert('RGB')
+                imagem.thumbnail((largura, largura * 4))
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                temporario = f"{caminho}.{os.getpid()}.tmp"
+                imagem.save(temporario, format='JPEG', quality=85, optimize=True)
+        except OSError:
+            return None
+        os.replace(temporario, caminho)
+    return caminho
+
+
+_SEM_VINCULO = '''
+    NOT EXISTS (SELECT 1 FROM estudos_midias em WHERE em.hash = midias.hash)
+    AND NOT EXISTS (SELECT 1 FROM cartoes_baralho_midias cm WHERE cm.hash = midias.hash)
+'''
+
+
+def remover_orfas(conexoes, carencia=CARENCIA_ORFAS, agora=None):
+    """
+    Apaga metadados e arquivos de mídias sem nenhum estudo (nem cartão
+    de baralho) vinculado.
+
+    `conexoes` são todos os bancos que gravam em MIDIA_DIR (com
+    fragmentos, cada um deles): o diretório é comum, então um arquivo só
+    é apagado quando nenhum banco o vincula.
+
+    Roda com uma transação BEGIN IMMEDIATE em cada banco, a trava de
+    escrita do SQLite, que vale entre processos: nenhum vínculo é gravado
+    enquanto isso. Cada mídia é conferida de novo em todos os bancos logo
+    antes de o arquivo ser apagado, e os arquivos gravados há menos de
+    `carencia` segundos ficam, porque um envio em andamento pode ter
+    gravado o arquivo e ainda não o vínculo. Faz commit.
+
+    Returns:
+        Quantidade de mídias removidas.
+    """
+    agora = time.time() if agora is None else agora
+    cursores = []
+    try:
+        # Sempre na mesma ordem, para dois processos não se travarem
+        for conn in conexoes:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursores.append(cursor)
+        candidatas = set()
+        for cursor in cursores:
+            cursor.execute(f'SELECT hash FROM midias WHERE {_SEM_VINCULO}')
+            candidatas.update(hash_midia for (hash_midia,) in cursor.fetchall())
+        removidas = 0
+        for hash_midia in sorted(candidatas):
+            blob = caminho_blob(hash_midia)
+            if os.path.exists(blob) and agora - os.path.getmtime(blob) < carencia:
+                continue
+            vinculada = False
+            for cursor in cursores:
+                cursor.execute('SELECT 1 FROM estudos_midias WHERE hash = ? '
+                               'UNION ALL SELECT 1 FROM cartoes_baralho_midias WHERE hash = ? LIMIT 1',
+                               (hash_midia, hash_midia))
+                if cursor.fetchone():
+                    vinculada = True
+                    break
+            if vinculada:
+                continue
+            for cursor in cursores:
+                cursor.execute(f'DELETE FROM midias WHERE hash = ? AND {_SEM_VINCULO}', (hash_midia,))
+            for largura in LARGURAS_MINIATURA:
+                miniatura = _caminho_miniatura(hash_midia, largura)
+                if os.path.exists(miniatura):
+                    os.remove(miniatura)
+            if os.path.exists(blob):
+                os.remove(blob)
+            removidas += 1
+        for conn in conexoes:
+            conn.commit()
+    except BaseException:
+        for conn in conexoes:
+            conn.rollback()
+        raise
+    return removidas
+
+
+def main():
+    import io
+    import sys
+    import time
+
+    from PIL import Image
+
+    arquivos = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        Config.MIDIA_DIR = tmp
+        # Imagens de ~1 MP; cada uma enviada duas vezes
+        imagens = []
+        for i in range(arquivos // 2):
+            buffer = io.BytesIO()
+            Image.new('RGB', (1200, 900), ((i * 37) % 256, (i * 91) % 256, 128)).save(buffer, format='JPEG', quality=95)
+            imagens.append(buffer.getvalue())
+        envios = imagens + imagens
+
+        inicio = time.perf_counter()
+        novos = sum(guardar_blob(io.BytesIO(dados))[3] for dados in envios)
+        gravacao = time.perf_counter() - inicio
+        total_mb = sum(len(d) for d in envios) / 1e6
+        em_disco = sum(os.path.getsize(os.path.join(raiz, nome))
+                       for raiz, _, nomes in os.walk(tmp) for nome in nomes) / 1e6
+
+        hashes = [hashlib.sha256(dados).hexdigest() for dados in imagens]
+        inicio = time.perf_counter()
+        for hash_midia in hashes:
+            obter_miniatura(hash_midia, 320)
+        fria = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        for hash_midia in hashes:
+            obter_miniatura(hash_midia, 320)
+        quente = time.perf_counter() - inicio
+
+    print(f"{len(envios)} envios ({total_mb:.1f} MB), {novos} arquivos gravados, {em_disco:.1f} MB em disco")
+    print(f"  gravação com hash: {gravacao * 1000 / len(envios):.2f} ms/arquivo ({total_mb / gravacao:.0f} MB/s)")
+    print(f"  miniatura 320px, primeira vez: {fria * 1000 / len(hashes):.2f} ms")
+    print(f"  miniatura 320px, em disco:     {quente * 1000 / len(hashes):.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
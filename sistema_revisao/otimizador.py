@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Otimizador offline dos parâmetros de agendamento a partir do histórico.
+
+Para cada usuário, ajusta uma curva de esquecimento às revisões já
+feitas e grava o resultado no perfil de agendamento geral do usuário
+(perfis.py).
+
+Modelo: a chance de lembrar um cartão t dias depois da revisão anterior é
+    R(t) = exp(-t / S),   S = exp(a + b * n + c * (q - 4))
+onde n é a quantidade de acertos seguidos do cartão (coluna `repetition`
+da revisão) e q a quality da revisão anterior. Acerto = quality >= 3.
+A verossimilhança negativa é convexa em (a, b, c), então o ajuste usa
+Newton com busca linear em NumPy, sem SciPy.
+
+Dos parâmetros ajustados saem os intervalos que atingem a retenção alvo
+(I = S * -ln(R_alvo)): `intervalo_1`/`intervalo_2` do SM-2 e os
+`intervalo_*` do AlgoritmoAdaptativo. `fator_intensivo` vem da retenção
+alvo do modo intensivo (ln R_intensivo / ln R_alvo), e os limites de tempo
+vêm dos quantis do tempo de resposta do usuário.
+
+O histórico de cada usuário é lido em blocos (fetchmany) e acumulado com
+NumPy em histogramas de tamanho fixo (acertos/erros por n, q e t), então a
+memória não cresce com o tamanho do banco. Os usuários são divididos entre
+processos; só o processo principal escreve no banco.
+
+Uso:
+    python otimizador.py [--processos N] [--simular] [--retencao 0.9]
+    python otimizador.py --sintetico 1000000   (benchmark em banco temporário)
+"""
+
+import argparse
+import json
+import math
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+import numpy as np
+
+BLOCO = 50000          # linhas por fetchmany
+MIN_OBSERVACOES = 50   # revisões com intervalo conhecido para ajustar um usuário
+N_MAX = 16             # acertos seguidos (acima disso, somados no último)
+T_MAX = 365            # dias desde a revisão anterior (idem)
+TEMPO_MAX = 600        # segundos de resposta considerados nos quantis
+
+RETENCAO_ALVO = 0.9
+RETENCAO_INTENSIVA = 0.95
+
+# Priori fraca (a, b, c) para usuários com pouco histórico ou sem erros
+_PRIORI = np.array([2.0, 0.5, 0.2])
+_PESO_PRIORI = 1.0
+
+
+def _conectar_leitura(caminho):
+    conn = sqlite3.connect(f'file:{caminho}?mode=ro', uri=True)
+    conn.execute('PRAGMA query_only = ON')
+    return conn
+
+
+def _arquivadas(cursor, usuario_id):
+    """
+    Revisões arquivadas (arquivo.py) do usuário, em ordem por estudo.
+
+    Yields:
+        (id_estudo, ordinal do dia, quality, tempo_resposta, repetition)
+    """
+    from arquivo import desempacotar
+
+    cursor.execute('''
+        SELECT id_estudo, dados FROM revisoes_arquivo
+        WHERE usuario_id = ?
+        ORDER BY id_estudo, id
+    ''', (usuario_id,))
+    while True:
+        linhas = cursor.fetchmany(256)
+        if not linhas:
+            break
+        for id_estudo, blob in linhas:
+            for r in desempacotar(blob):
+                yield (id_estudo, datetime.strptime(r['data_revisao'], "%Y-%m-%d").toordinal(),
+                       r['quality'], r['tempo_resposta'], r['repetition'])
+
+
+class Histogramas:
+    """Acertos/erros por (n, q anterior, t) e tempos de resposta, de tamanho fixo."""
+
+    FORMATO = (N_MAX, 6, T_MAX + 1)
+
+    def __init__(self):
+        self.acertos = np.zeros(self.FORMATO, dtype=np.int64)
+        self.erros = np.zeros(self.FORMATO, dtype=np.int64)
+        self.tempos = np.zeros(TEMPO_MAX + 1, dtype=np.int64)
+        self.lidas = 0
+
+    def somar(self, quality, tempo, repetition, dias, quality_anterior):
+        """Soma arrays NumPy; dias/quality_anterior < 0 = sem revisão anterior."""
+        self.lidas += len(quality)
+        validos = tempo >= 0
+        self.tempos += np.bincount(np.minimum(tempo[validos], TEMPO_MAX), minlength=TEMPO_MAX + 1)
+        usar = (quality_anterior >= 0) & (dias > 0)
+        indices = np.ravel_multi_index((np.clip(repetition[usar], 0, N_MAX - 1),
+                                        quality_anterior[usar],
+                                        np.minimum(dias[usar], T_MAX)), self.FORMATO)
+        acerto = quality[usar] >= 3
+        tamanho = self.acertos.size
+        self.acertos += np.bincount(indices[acerto], minlength=tamanho).reshape(self.FORMATO)
+        self.erros += np.bincount(indices[~acerto], minlength=tamanho).reshape(self.FORMATO)
+
+
+def _somar_bloco(histogramas, ids, dias, quality, tempo, repetition, anterior, ultima_arquivada):
+    """
+    Soma um bloco ordenado por (estudo, data) nos histogramas.
+
+    A revisão anterior de cada linha é a linha de cima se for do mesmo
+    estudo; a primeira linha do bloco usa `anterior` (última linha do bloco
+    de antes) e a primeira revisão quente de um estudo arquivado usa
+    `ultima_arquivada`.
+
+    Returns:
+        A última linha do bloco (id_estudo, dia, quality), para o próximo.
+    """
+    ids_antes = np.r_[anterior[0], ids[:-1]]
+    dias_antes = np.r_[anterior[1], dias[:-1]]
+    quality_antes = np.r_[anterior[2], quality[:-1]]
+    mesmo = ids == ids_antes
+    intervalo = np.where(mesmo, dias - dias_antes, -1)
+    quality_anterior = np.where(mesmo, quality_antes, -1)
+    if ultima_arquivada:
+        for i in np.nonzero(~mesmo)[0]:
+            previa = ultima_arquivada.get(int(ids[i]))
+            if previa:
+                intervalo[i], quality_anterior[i] = dias[i] - previa[0], previa[1]
+    histogramas.somar(quality, tempo, repetition, intervalo, quality_anterior)
+    return ids[-1], dias[-1], quality[-1]
+
+
+def acumular(cursor, usuario_id):
+    """
+    Lê o histórico do usuário em blocos e acumula os histogramas.
+
+    Cada bloco do fetchmany vira arrays NumPy (datas convertidas por
+    datetime64), sem laço em Python por revisão.
+    """
+    histogramas = Histogramas()
+    sem_anterior = (-1, 0, -1)
+
+    # Arquivo: mais antigo que a tabela quente para o mesmo estudo. Também
+    # em blocos de BLOCO eventos; fica na memória só a última revisão
+    # arquivada de cada estudo
+    eventos = (e for e in _arquivadas(cursor, usuario_id) if e[2] is not None)
+    ultima_arquivada = {}
+    anterior = sem_anterior
+    while True:
+        bloco = list(islice(eventos, BLOCO))
+        if not bloco:
+            break
+        ids, dias, quality, tempo, repetition = (np.array(c, dtype=np.int64) for c in zip(*(
+            (e[0], e[1], e[2], -1 if e[3] is None else e[3], e[4] or 0) for e in bloco)))
+        anterior = _somar_bloco(histogramas, ids, dias, quality, tempo, repetition, anterior, None)
+        ultima_arquivada.update(zip(ids.tolist(), zip(dias.tolist(), quality.tolist())))
+
+    cursor.execute('''
+        SELECT r.id_estudo, r.data_revisao, r.quality,
+               COALESCE(r.tempo_resposta, -1), COALESCE(r.repetition, 0)
+        FROM estudos e
+        JOIN revisoes r ON r.id_estudo = e.id
+        WHERE e.usuario_id = ? AND r.feito = 1 AND r.quality IS NOT NULL
+        ORDER BY r.id_estudo, r.data_revisao, r.id
+    ''', (usuario_id,))
+    anterior = sem_anterior
+    while True:
+        linhas = cursor.fetchmany(BLOCO)
+        if not linhas:
+            break
+        ids, datas, quality, tempo, repetition = zip(*linhas)
+        # Ordinal do Python = dias desde 1970 (datetime64) + 719163
+        dias = np.array(datas, dtype='datetime64[D]').astype(np.int64) + 719163
+        anterior = _somar_bloco(histogramas, np.array(ids), dias, np.array(quality), np.array(tempo),
+                                np.array(repetition), anterior, ultima_arquivada)
+    return histogramas
+
+
+def _nll(theta, X, t, s, f):
+    """Verossimilhança negativa (com a priori), gradiente e Hessiana."""
+    eta = X @ theta
+    x = np.clip(t * np.exp(-eta), 1e-12, 700.0)
+    em1 = np.expm1(x)
+    # log R = -x; log(1 - R) = log(-expm1(-x))
+    valor = np.sum(s * x) - np.sum(f * np.log(-np.expm1(-x)))
+    # Derivadas em relação a eta: d(-log R)/d eta = -x, d(-log(1-R))/d eta = x/(e^x - 1)
+    razao = x / em1
+    g_eta = -s * x + f * razao
+    h_eta = s * x + f * x * (razao + (razao - 1) / em1)
+    diferenca = theta - _PRIORI
+    valor += _PESO_PRIORI * diferenca @ diferenca
+    gradiente = X.T @ g_eta + 2 * _PESO_PRIORI * diferenca
+    hessiana = (X.T * h_eta) @ X + 2 * _PESO_PRIORI * np.eye(len(theta))
+    return valor, gradiente, hessiana
+
+
+def ajustar(acertos, erros, iteracoes=50):
+    """
+    Ajusta (a, b, c) por Newton com busca linear.
+
+    Returns:
+        (theta, observações usadas) ou (None, observações) se houver poucas.
+    """
+    total = acertos + erros
+    n, q, t = np.nonzero(total)
+    observacoes = int(total.sum())
+    if observacoes < MIN_OBSERVACOES:
+        return None, observacoes
+    X = np.column_stack([np.ones(len(n)), n, q - 4]).astype(float)
+    tt = t.astype(float)
+    s = acertos[n, q, t].astype(float)
+    f = erros[n, q, t].astype(float)
+
+    theta = _PRIORI.copy()
+    valor, gradiente, hessiana = _nll(theta, X, tt, s, f)
+    for _ in range(iteracoes):
+        passo = np.linalg.solve(hessiana, -gradiente)
+        escala = 1.0
+        while escala > 1e-6:
+            candidato = theta + escala * passo
+            novo = _nll(candidato, X, tt, s, f)
+            if novo[0] <= valor:
+                break
+            escala /= 2
+        else:
+            break
+        melhora = valor - novo[0]
+        theta = candidato
+        valor, gradiente, hessiana = novo
+        if melhora < 1e-9 * max(1.0, abs(valor)):
+            break
+    return theta, observacoes
+
+
+def _quantil(histograma, fracao):
+    acumulado = np.cumsum(histograma)
+    return int(np.searchsorted(acumulado, fracao * acumulado[-1]))
+
+
+def derivar_parametros(theta, tempos, retencao=RETENCAO_ALVO, retencao_intensiva=RETENCAO_INTENSIVA):
+    """Parâmetros do perfil (perfis.py) a partir do ajuste e dos tempos de resposta."""
+    a, b, c = theta
+
+    def intervalo(n, q, minimo, maximo):
+        dias = math.exp(min(a + b * n + c * (q - 4), 50)) * -math.log(retencao)
+        return int(min(maximo, max(minimo, round(dias))))
+
+    parametros = {
+        'intervalo_1': intervalo(1, 4, 1, 30),
+        'intervalo_2': intervalo(2, 4, 1, 90),
+        'intervalo_duvida': intervalo(1, 3, 1, 90),
+        'intervalo_bom': intervalo(1, 4, 1, 180),
+        'intervalo_perfeito': intervalo(1, 5, 1, 365),
+        'fator_intensivo': round(min(1.0, max(0.1, math.log(retencao_intensiva) / math.log(retencao))), 3),
+    }
+    if tempos.sum() >= MIN_OBSERVACOES:
+        rapido, mediano, lento = (_quantil(tempos, p) for p in (0.2, 0.5, 0.8))
+        if rapido < lento:
+            parametros.update(tempo_rapido=rapido, tempo_lento=lento)
+        parametros['tempo_esperado'] = max(1, mediano)
+    return parametros
+
+
+def otimizar_usuario(caminho, usuario_id, retencao=RETENCAO_ALVO):
+    """
+    Lê o histórico de um usuário (conexão própria, só leitura) e ajusta o modelo.
+
+    Returns:
+        Dict com usuario_id, revisões lidas, observações, theta, parâmetros
+        (None se não houver dados suficientes) e tempos de leitura/ajuste.
+    """
+    conn = _conectar_leitura(caminho)
+    try:
+        inicio = time.perf_counter()
+        histogramas = acumular(conn.cursor(), usuario_id)
+        meio = time.perf_counter()
+        theta, observacoes = ajustar(histogramas.acertos, histogramas.erros)
+        fim = time.perf_counter()
+    finally:
+        conn.close()
+    return {
+        'usuario_id': usuario_id,
+        'lidas': histogramas.lidas,
+        'observacoes': observacoes,
+        'theta': None if theta is None else [round(float(v), 4) for v in theta],
+        'parametros': None if theta is None else derivar_parametros(theta, histogramas.tempos, retencao),
+        'tempo_leitura': meio - inicio,
+        'tempo_ajuste': fim - meio,
+    }
+
+
+def otimizar(caminho, processos=None, gravar=True, retencao=RETENCAO_ALVO, usuarios=None):
+    """
+    Otimiza todos os usuários (ou os de `usuarios`) em paralelo e grava os perfis.
+
+    Returns:
+        Lista de resultados (otimizar_usuario) e o tempo total.
+    """
+    from perfis import criar_tabela_perfis, salvar_perfil
+
+    inicio = time.perf_counter()
+    conn = sqlite3.connect(caminho, timeout=30)
+    cursor = conn.cursor()
+    criar_tabela_perfis(cursor)
+    conn.commit()
+    if usuarios is None:
+        cursor.execute('SELECT id FROM usuarios ORDER BY id')
+        usuarios = [row[0] for row in cursor.fetchall()]
+
+    processos = processos or os.cpu_count() or 1
+    resultados = []
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        pendentes = executor.map(otimizar_usuario, [caminho] * len(usuarios), usuarios,
+                                 [retencao] * len(usuarios), chunksize=max(1, len(usuarios) // (processos * 4)))
+        for resultado in pendentes:
+            resultados.append(resultado)
+            if gravar and resultado['parametros']:
+                # Mantém os valores editados à mão que o otimizador não ajusta
+                cursor.execute("SELECT parametros FROM perfis_agendamento WHERE usuario_id = ? AND materia = ''",
+                               (resultado['usuario_id'],))
+                row = cursor.fetchone()
+                atuais = json.loads(row[0]) if row else {}
+                salvar_perfil(cursor, resultado['usuario_id'], '', dict(atuais, **resultado['parametros']))
+                if len(resultados) % 100 == 0:
+                    conn.commit()
+    conn.commit()
+    conn.close()
+    return resultados, time.perf_counter() - inicio
+
+
+def gerar_sintetico(caminho, revisoes, usuarios=20, theta=(1.5, 0.6, 0.25), semente=7):
+    """
+    Cria um banco com histórico simulado pelo próprio modelo (parâmetros
+    conhecidos), para medir o otimizador e conferir se recupera `theta`.
+    """
+    from banco import migrar
+
+    migrar(caminho)
+    rng = np.random.default_rng(semente)
+    a, b, c = theta
+    conn = sqlite3.connect(caminho)
+    cursor = conn.cursor()
+    por_usuario = revisoes // usuarios
+    base = datetime(2020, 1, 1).toordinal()
+    for u in range(usuarios):
+        cursor.execute('INSERT INTO usuarios (nome, email, senha) VALUES (?, ?, ?)',
+                       (f'Sintético {u}', f'sintetico{u}@exemplo.com', 'x'))
+        usuario_id = cursor.lastrowid
+        linhas = []
+        estudos = max(1, por_usuario // 10)
+        cursor.executemany('INSERT INTO estudos (materia, topico, data_estudo, usuario_id) VALUES (?, ?, ?, ?)',
+                           [('Sintético', f'T{i}', '2020-01-01', usuario_id) for i in range(estudos)])
+        cursor.execute('SELECT id FROM estudos WHERE usuario_id = ?', (usuario_id,))
+        for (id_estudo,) in cursor.fetchall():
+            dia, n, q = base + int(rng.integers(0, 30)), 0, 4
+            linhas.append((id_estudo, dia, q, 0))
+            for _ in range(9):
+                estabilidade = math.exp(a + b * min(n, N_MAX - 1) + c * (q - 4))
+                intervalo = max(1, int(estabilidade * rng.uniform(0.05, 0.8)))
+                dia += intervalo
+                lembrou = rng.random() < math.exp(-intervalo / estabilidade)
+                q = int(rng.integers(3, 6)) if lembrou else int(rng.integers(0, 3))
+                linhas.append((id_estudo, dia, q, n))
+                n = n + 1 if lembrou else 0
+        cursor.executemany('''
+            INSERT INTO revisoes (id_estudo, data_revisao, tipo, feito, quality, tempo_resposta, repetition)
+            VALUES (?, ?, 'SM-2', 1, ?, ?, ?)
+        ''', [(id_estudo, f'{datetime.fromordinal(dia):%Y-%m-%d}', q, int(rng.integers(2, 40)), n)
+              for id_estudo, dia, q, n in linhas])
+    conn.commit()
+    conn.close()
+
+
+def relatorio(resultados, decorrido):
+    """Mostra usuários ajustados e o tempo por 1M de revisões."""
+    lidas = sum(r['lidas'] for r in resultados)
+    ajustados = [r for r in resultados if r['parametros']]
+    leitura = sum(r['tempo_leitura'] for r in resultados)
+    ajuste = sum(r['tempo_ajuste'] for r in resultados)
+    print(f"Usuários: {len(resultados)} ({len(ajustados)} ajustados), revisões lidas: {lidas}")
+    if lidas:
+        milhao = 1e6 / lidas
+        print(f"Tempo total: {decorrido:.2f}s -> {decorrido * milhao:.2f}s por 1M revisões "
+              f"(CPU somada nos processos: leitura {leitura * milhao:.2f}s + ajuste {ajuste * milhao:.3f}s por 1M)")
+    for r in ajustados[:5]:
+        print(f"  usuário {r['usuario_id']}: theta={r['theta']} {r['parametros']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ajusta os perfis de agendamento a partir do histórico')
+    parser.add_argument('--processos', type=int, default=None, help='processos (padrão: núcleos)')
+    parser.add_argument('--simular', action='store_true', help='só mostra o resultado, sem gravar perfis')
+    parser.add_argument('--retencao', type=float, default=RETENCAO_ALVO, help='retenção alvo (0.7 a 0.97)')
+    parser.add_argument('--sintetico', type=int, metavar='REVISOES',
+                        help='gera um banco temporário com N revisões simuladas e otimiza')
+    args = parser.parse_args()
+    if not 0.7 <= args.retencao <= 0.97:
+        parser.error('--retencao deve estar entre 0.7 e 0.97')
+
+    if args.sintetico:
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            caminho = os.path.join(tmp, 'otimizador.db')
+            inicio = time.perf_counter()
+            gerar_sintetico(caminho, args.sintetico)
+            print(f"Banco sintético com {args.sintetico} revisões em {time.perf_counter() - inicio:.1f}s "
+                  f"(theta real: [1.5, 0.6, 0.25])")
+            relatorio(*otimizar(caminho, args.processos, not args.simular, args.retencao))
+        return
+
+    caminho = os.getenv('DATABASE_PATH', 'revisao_estudos.db')
+    relatorio(*otimizar(caminho, args.processos, not args.simular, args.retencao))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Perfis de agendamento por usuário e por matéria.
+
+Os parâmetros do SM-2 (limites do EF, dois primeiros intervalos), os
+fatores de confiança, os limites de tempo de resposta e as constantes do
+`AlgoritmoAdaptativo` deixam de ser fixos no código: cada usuário pode
+ter um perfil geral (matéria '') e perfis por matéria, gravados em
+`perfis_agendamento` como JSON só com os valores alterados. O perfil
+efetivo é PADRAO <- perfil geral do usuário <- perfil da matéria.
+
+Os perfis ficam em cache no processo. Cada edição avança
+`usuarios.versao_perfis`, que vem junto na consulta da revisão avaliada
+('concluir_revisao'): a avaliação confere a versão sem consulta
+extra, e outros processos (workers) recarregam o perfil na próxima
+avaliação depois de uma edição.
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+# Valores padrão: os mesmos que estavam fixos em app.py e no AlgoritmoAdaptativo
+PADRAO = {
+    # SM-2 (app.sm2)
+    'ef_min': 1.3,
+    'ef_max': None,            # sem teto no SM-2 clássico
+    'intervalo_1': 1,          # dias após a primeira resposta correta
+    'intervalo_2': 6,          # dias após a segunda
+    # Ajuste pelo nível de confiança 1..5
+    'fator_confianca': [0.5, 0.75, 1.0, 1.15, 1.3],
+    # Ajuste pelo tempo de resposta (segundos)
+    'tempo_rapido': 5,
+    'tempo_lento': 30,
+    'fator_rapido': 1.10,
+    'fator_lento': 0.90,
+    # AlgoritmoAdaptativo (previsão e simulações)
+    'ef_max_adaptativo': 2.5,
+    'ef_inicial': 2.5,
+    'intervalo_erro': 1,
+    'intervalo_duvida': 3,
+    'intervalo_bom': 7,
+    'intervalo_perfeito': 14,
+    'fator_intensivo': 0.5,
+    'tempo_esperado': 60,
+}
+
+# Faixas aceitas na edição: (tipo, mínimo, máximo)
+_FAIXAS = {
+    'ef_min': (float, 1.0, 2.5),
+    'ef_max': (float, 1.3, 5.0),
+    'intervalo_1': (int, 1, 30),
+    'intervalo_2': (int, 1, 90),
+    'fator_confianca': (float, 0.1, 3.0),
+    'tempo_rapido': (int, 0, 600),
+    'tempo_lento': (int, 1, 3600),
+    'fator_rapido': (float, 0.5, 2.0),
+    'fator_lento': (float, 0.5, 2.0),
+    'ef_max_adaptativo': (float, 1.3, 5.0),
+    'ef_inicial': (float, 1.3, 5.0),
+    'intervalo_erro': (int, 1, 30),
+    'intervalo_duvida': (int, 1, 90),
+    'intervalo_bom': (int, 1, 180),
+    'intervalo_perfeito': (int, 1, 365),
+    'fator_intensivo': (float, 0.1, 1.0),
+    'tempo_esperado': (int, 1, 3600),
+}
+
+
+def criar_tabela_perfis(cursor):
+    """Cria a tabela de perfis e a versão por usuário (idempotente)."""
+    try:
+        cursor.execute("ALTER TABLE usuarios ADD COLUMN versao_perfis INTEGER DEFAULT 0")
+    except sqlite3.OperationalError:
+        pass
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS perfis_agendamento (
+        usuario_id INTEGER NOT NULL,
+        materia TEXT NOT NULL DEFAULT '',
+        parametros TEXT NOT NULL,
+        data_atualizacao TEXT,
+        PRIMARY KEY (usuario_id, materia)
+    ) WITHOUT ROWID
+    ''')
+
+
+def validar_parametros(parametros):
+    """
+    Confere nomes, tipos e faixas dos parâmetros de um perfil.
+
+    Returns:
+        (dict normalizado, mensagem de erro ou None)
+    """
+    if not isinstance(parametros, dict):
+        return None, 'Parâmetros devem ser um objeto JSON'
+    normalizados = {}
+    for nome, valor in parametros.items():
+        if nome not in _FAIXAS:
+            return None, f'Parâmetro desconhecido: {nome}'
+        tipo, minimo, maximo = _FAIXAS[nome]
+        if valor is None and nome == 'ef_max':
+            normalizados[nome] = None
+            continue
+        valores = valor if nome == 'fator_confianca' else [valor]
+        if nome == 'fator_confianca' and (not isinstance(valor, list) or len(valor) != 5):
+            return None, 'fator_confianca deve ser uma lista com 5 valores (confiança 1 a 5)'
+        convertidos = []
+        for v in valores:
+            if isinstance(v, bool) or not isinstance(v, (int, float)):
+                return None, f'{nome} deve ser numérico'
+            v = tipo(v)
+            if not minimo <= v <= maximo:
+                return None, f'{nome} deve estar entre {minimo} e {maximo}'
+            convertidos.append(v)
+        normalizados[nome] = convertidos if nome == 'fator_confianca' else convertidos[0]
+
+    efetivo = dict(PADRAO, **normalizados)
+    if efetivo['tempo_rapido'] >= efetivo['tempo_lento']:
+        return None, 'tempo_rapido deve ser menor que tempo_lento'
+    if efetivo['ef_max'] is not None and efetivo['ef_max'] < efetivo['ef_min']:
+        return None, 'ef_max deve ser maior ou igual a ef_min'
+    return normalizados, None
+
+
+class CachePerfis:
+    """Perfis efetivos por usuário (todas as matérias), com a versão lida do banco."""
+
+    def __init__(self):
+        self._perfis = {}   # usuario_id -> (versao, {materia: perfil efetivo})
+        self._lock = threading.Lock()
+
+    def _carregar(self, cursor, usuario_id):
+        cursor.execute('SELECT COALESCE(versao_perfis, 0) FROM usuarios WHERE id = ?', (usuario_id,))
+        row = cursor.fetchone()
+        versao = row[0] if row else 0
+        cursor.execute('SELECT materia, parametros FROM perfis_agendamento WHERE usuario_id = ?', (usuario_id,))
+        armazenados = {materia: json.loads(parametros) for materia, parametros in cursor.fetchall()}
+        geral = dict(PADRAO, **armazenados.pop('', {}))
+        perfis = {materia: dict(geral, **parametros) for materia, parametros in armazenados.items()}
+        perfis[''] = geral
+        with self._lock:
+            self._perfis[usuario_id] = (versao, perfis)
+        return versao, perfis
+
+    def obter(self, cursor, usuario_id, materia='', versao=None):
+        """
+        Perfil efetivo do usuário para a matéria.
+
+        Args:
+            versao: `usuarios.versao_perfis` já lida pelo chamador. Se
+                diferente da guardada, o cache do usuário é recarregado; se
+                None, vale o que estiver em cache.
+        """
+        if usuario_id is None:
+            return PADRAO
+        with self._lock:
+            guardado = self._perfis.get(usuario_id)
+        if guardado is None or (versao is not None and guardado[0] != versao):
+            guardado = self._carregar(cursor, usuario_id)
+        perfis = guardado[1]
+        return perfis.get(materia or '', perfis[''])
+
+    def invalidar(self, usuario_id):
+        with self._lock:
+            self._perfis.pop(usuario_id, None)
+
+
+cache_perfis = CachePerfis()
+
+
+def salvar_perfil(cursor, usuario_id, materia, parametros):
+    """
+    Grava (substitui) o perfil do usuário para a matéria ('' = geral) e
+    avança a versão de perfis do usuário. Não faz commit.
+
+    Raises:
+        ValueError: se algum parâmetro for inválido.
+    """
+    normalizados, erro = validar_parametros(parametros)
+    if erro:
+        raise ValueError(erro)
+    cursor.execute('''
+        INSERT INTO perfis_agendamento (usuario_id, materia, parametros, data_atualizacao)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(usuario_id, materia) DO UPDATE SET
+            parametros = excluded.parametros,
+            data_atualizacao = excluded.data_atualizacao
+    ''', (usuario_id, materia or '', json.dumps(normalizados), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    _avancar_versao(cursor, usuario_id)
+    return normalizados
+
+
+def remover_perfil(cursor, usuario_id, materia):
+    """Remove o perfil (volta ao geral/padrão). Não faz commit."""
+    cursor.execute('DELETE FROM perfis_agendamento WHERE usuario_id = ? AND materia = ?',
+                   (usuario_id, materia or ''))
+    removido = cursor.rowcount > 0
+    if removido:
+        _avancar_versao(cursor, usuario_id)
+    return removido
+
+
+def listar_perfis(cursor, usuario_id):
+    """Perfis gravados do usuário (só os valores alterados), por matéria."""
+    cursor.execute('SELECT materia, parametros, data_atualizacao FROM perfis_agendamento WHERE usuario_id = ? ORDER BY materia',
+                   (usuario_id,))
+    return [{'materia': materia, 'parametros': json.loads(parametros), 'data_atualizacao': data}
+            for materia, parametros, data in cursor.fetchall()]
+
+
+def _avancar_versao(cursor, usuario_id):
+    cursor.execute('UPDATE usuarios SET versao_perfis = COALESCE(versao_perfis, 0) + 1 WHERE id = ?', (usuario_id,))
+    cache_perfis.invalidar(usuario_id)
@@ -0,0 +1,86 @@
+"""
+Previsão da carga futura de revisões.
+
+Monta um histograma de calendário em memória (matéria x dia) a partir de
+uma única consulta agrupada sobre as revisões pendentes (`card_state`).
+Opcionalmente projeta os reagendamentos futuros de cada cartão usando os
+intervalos esperados do `AlgoritmoAdaptativo` (com o perfil de
+agendamento de cada matéria), supondo uma resposta típica (quality 4,
+confiança neutra).
+"""
+
+from datetime import datetime, timedelta
+
+from docs.algoritmo_adaptativo import AlgoritmoAdaptativo
+from perfis import cache_perfis
+
+DIAS_PREVISAO = 90
+
+# Resposta suposta para projetar os próximos intervalos
+QUALITY_ESPERADA = 4
+CONFIANCA_ESPERADA = 3
+
+
+def calcular_previsao(cursor, usuario_id, dias=DIAS_PREVISAO, projetar=False):
+    """
+    Calcula a quantidade esperada de revisões por dia e por matéria.
+
+    Args:
+        cursor: Cursor do banco de dados
+        usuario_id: Usuário dono dos estudos
+        dias: Tamanho da janela (a partir de hoje)
+        projetar: Se True, inclui as revisões futuras geradas pelos
+            reagendamentos dos cartões dentro da janela
+
+    Returns:
+        Dict com as datas da janela, o histograma por matéria e o total
+        por dia. Revisões atrasadas contam no dia de hoje.
+    """
+    hoje = datetime.now().date()
+    limite = (hoje + timedelta(days=dias - 1)).strftime("%Y-%m-%d")
+
+    cursor.execute('''
+        SELECT COALESCE(e.materia, ''), cs.data_revisao,
+               ROUND(COALESCE(cs.ef, 2.5), 2), COALESCE(cs.interval, 1), COALESCE(cs.repetition, 0),
+               COUNT(*)
+        FROM card_state cs
+        JOIN estudos e ON cs.id_estudo = e.id
+        WHERE cs.usuario_id = ? AND cs.data_revisao <= ?
+        GROUP BY 1, 2, 3, 4, 5
+    ''', (usuario_id, limite))
+
+    linhas = cursor.fetchall()
+    algoritmos = {}   # matéria -> AlgoritmoAdaptativo com o perfil de agendamento da matéria
+    histograma = {}
+    for materia, data_revisao, ef, interval, repetition, quantidade in linhas:
+        linha = histograma.get(materia)
+        if linha is None:
+            linha = histograma[materia] = [0] * dias
+            if projetar:
+                algoritmos[materia] = AlgoritmoAdaptativo(perfil=cache_perfis.obter(cursor, usuario_id, materia))
+        algoritmo = algoritmos.get(materia)
+        dia = max(0, (datetime.strptime(data_revisao, "%Y-%m-%d").date() - hoje).days)
+        linha[dia] += quantidade
+
+        # Cartões com o mesmo estado seguem a mesma trajetória esperada
+        while projetar:
+            ef, interval, repetition = algoritmo.calcular_proxima_revisao(
+                quality=QUALITY_ESPERADA,
+                nivel_confianca=CONFIANCA_ESPERADA,
+                ef=ef,
+                interval=interval,
+                repetition=repetition
+            )
+            dia += interval
+            if dia >= dias:
+                break
+            linha[dia] += quantidade
+
+    datas = [(hoje + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(dias)]
+    total = [sum(valores) for valores in zip(*histograma.values())] if histograma else [0] * dias
+    return {
+        'datas': datas,
+        'materias': histograma,
+        'total': total,
+        'projetado': projetar
+    }
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Servidor de produção (gunicorn com workers pré-forkados).
+
+O processo mestre carrega a configuração, aplica as migrações uma única
+vez e compila todos os templates antes do fork; os workers herdam o app
+já aquecido. As conexões SQLite não podem atravessar um fork, então cada
+worker abre as suas (escrita e leitura) logo depois do fork, antes de
+aceitar a primeira requisição.
+
+Uso:
+    python servidor.py
+
+Variáveis de ambiente: FLASK_CONFIG (padrão 'production'), SECRET_KEY,
+DATABASE_PATH, HOST, PORT, WEB_CONCURRENCY (workers).
+"""
+
+import os
+
+from gunicorn.app.base import BaseApplication
+
+import app as modulo_app
+from config import config
+
+
+def _post_fork(server, worker):
+    # Abre as conexões do worker e deixa a de leitura pronta
+    modulo_app.preaquecer()
+
+
+class ServidorProducao(BaseApplication):
+    """Aplicação gunicorn que carrega e aquece o app no processo mestre."""
+
+    def __init__(self, config_name):
+        self.config_name = config_name
+        super().__init__()
+
+    def load_config(self):
+        configuracao = config[self.config_name]
+        self.cfg.set('bind', f'{configuracao.HOST}:{configuracao.PORT}')
+        self.cfg.set('workers', configuracao.WORKERS)
+        self.cfg.set('preload_app', True)
+        self.cfg.set('post_fork', _post_fork)
+
+    def load(self):
+        app = modulo_app.create_app(self.config_name, migrar=True, conectar_banco=False)
+        modulo_app.compilar_templates()
+        return app
+
+
+def main():
+    ServidorProducao(os.getenv('FLASK_CONFIG', 'production')).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Sessões guardadas no servidor.
+
+A sessão padrão do Flask é um cookie assinado com todo o conteúdo
+(usuario_id, nome, email, modo pré-prova, fator e tema), reenviado em
+cada requisição, inclusive nas de mídia e sincronização. Aqui o cookie
+leva só um identificador opaco (`secrets.token_urlsafe`), e o conteúdo
+fica na tabela `sessoes` do banco principal (o catálogo, no modo
+fragmentado), indexada pelo SHA-256 do identificador: quem lê o banco
+não consegue montar um cookie válido. A tabela e as colunas de
+preferências são criadas em banco.py, que não importa o Flask.
+
+Cada requisição lê a sessão pela chave primária, sem cache no processo:
+um logout (ou uma troca de preferências) tratado por um worker vale na
+hora em todos os outros. A gravação só acontece quando a sessão muda ou
+quando falta menos da metade da validade para expirar. As sessões
+expiradas são apagadas nos logins, no máximo uma vez por hora.
+
+As preferências (modo pré-prova, fator, tema e data da prova) ficam em
+colunas de `usuarios`: são carregadas na sessão no login e, quando
+mudam, são copiadas para as outras sessões abertas do usuário. Com isso
+sobrevivem ao logout e valem em todos os dispositivos.
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import timedelta
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from consultas import conectar
+
+# Chave da sessão -> coluna de `usuarios`
+PREFERENCIAS = {
+    'pre_exam_mode': 'modo_intensivo',
+    'pre_exam_factor': 'fator_pre_prova',
+    'theme': 'tema',
+    'data_prova': 'data_prova',
+}
+FATOR_PADRAO = 0.6
+# Intervalo mínimo entre as remoções de sessões expiradas (feitas nos logins)
+SEGUNDOS_LIMPEZA = 3600
+
+
+def carregar_preferencias(cursor, usuario_id):
+    """Preferências do usuário com as chaves usadas na sessão."""
+    cursor.execute('SELECT modo_intensivo, fator_pre_prova, tema, data_prova FROM usuarios WHERE id = ?',
+                   (usuario_id,))
+    row = cursor.fetchone() or (0, None, None, None)
+    return {
+        'pre_exam_mode': bool(row[0]),
+        'pre_exam_factor': row[1] if row[1] is not None else FATOR_PADRAO,
+        'theme': row[2] or 'light',
+        'data_prova': row[3],
+    }
+
+
+def salvar_preferencias(cursor, usuario_id, preferencias):
+    """Grava em `usuarios` as preferências informadas (chaves da sessão). Não faz commit."""
+    colunas = [(PREFERENCIAS[chave], valor) for chave, valor in preferencias.items() if chave in PREFERENCIAS]
+    if not colunas:
+        return
+    atribuicoes = ', '.join(f"{coluna} = ?" for coluna, _ in colunas)
+    valores = [int(valor) if isinstance(valor, bool) else valor for _, valor in colunas]
+    cursor.execute(f'UPDATE usuarios SET {atribuicoes} WHERE id = ?', valores + [usuario_id])
+
+
+def _chave(sid):
+    return hashlib.sha256(sid.encode()).hexdigest()
+
+
+class ArmazemSessoes:
+    """
+    Tabela `sessoes` num arquivo SQLite, com conexão própria por processo.
+
+    Qualquer objeto com os mesmos métodos (obter, salvar, remover,
+    atualizar_usuario, remover_expiradas) pode substituí-lo na
+    `InterfaceSessoes`.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _conexao(self):
+        # Aberta no primeiro uso e reaberta depois de um fork (workers de produção)
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = conectar(self.caminho, check_same_thread=False)
+            self._pid = os.getpid()
+        return self._conn
+
+    def obter(self, chave):
+        """(usuario_id, dados, expira) da sessão ou None."""
+        with self._lock:
+            row = self._conexao().execute('SELECT usuario_id, dados, expira FROM sessoes WHERE chave = ?',
+                                          (chave,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), row[2]
+
+    def salvar(self, chave, usuario_id, dados, expira):
+        with self._lock:
+            conn = self._conexao()
+            conn.execute('''
+                INSERT INTO sessoes (chave, usuario_id, dados, expira) VALUES (?, ?, ?, ?)
+                ON CONFLICT(chave) DO UPDATE SET
+                    usuario_id = excluded.usuario_id, dados = excluded.dados, expira = excluded.expira
+            ''', (chave, usuario_id, json.dumps(dados), expira))
+            conn.commit()
+
+    def remover(self, chave):
+        with self._lock:
+            conn = self._conexao()
+            conn.execute('DELETE FROM sessoes WHERE chave = ?', (chave,))
+            conn.commit()
+
+    def atualizar_usuario(self, usuario_id, valores):
+        """Copia `valores` para todas as sessões do usuário. Retorna as chaves alteradas."""
+        with self._lock:
+            conn = self._conexao()
+            linhas = conn.execute('SELECT chave, dados FROM sessoes WHERE usuario_id = ?', (usuario_id,)).fetchall()
+            conn.executemany('UPDATE sessoes SET dados = ? WHERE chave = ?',
+                             [(json.dumps(dict(json.loads(dados), **valores)), chave) for chave, dados in linhas])
+            conn.commit()
+        return [chave for chave, _ in linhas]
+
+    def remover_expiradas(self, agora=None):
+        with self._lock:
+            conn = self._conexao()
+            removidas = conn.execute('DELETE FROM sessoes WHERE expira < ?', (agora or time.time(),)).rowcount
+            conn.commit()
+        return removidas
+
+    def fechar(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+class SessaoServidor(CallbackDict, SessionMixin):
+    """Conteúdo da sessão; `sid` é o identificador do cookie (None até a primeira gravação)."""
+
+    def __init__(self, dados=None, sid=None, usuario_id=None, expira=None):
+        def ao_alterar(_):
+            self.modified = True
+            self.accessed = True
+        super().__init__(dados, ao_alterar)
+        self.sid = sid
+        self.usuario_carregado = usuario_id
+        self.expira = expira
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, chave):
+        self.accessed = True
+        return super().__getitem__(chave)
+
+    def get(self, chave, padrao=None):
+        self.accessed = True
+        return super().get(chave, padrao)
+
+
+class InterfaceSessoes(SessionInterface):
+    """`session_interface` do Flask com o conteúdo no `ArmazemSessoes`."""
+
+    def __init__(self, armazem):
+        self.armazem = armazem
+        self._ultima_limpeza = 0.0
+
+    def _validade(self, app):
+        return app.permanent_session_lifetime.total_seconds()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return SessaoServidor()
+        guardada = self.armazem.obter(_chave(sid))
+        if guardada is None or guardada[2] < time.time():
+            return SessaoServidor()
+        usuario_id, dados, expira = guardada
+        return SessaoServidor(dict(dados), sid=sid, usuario_id=usuario_id, expira=expira)
+
+    def save_session(self, app, session, response):
+        nome = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.sid is not None:
+                self.armazem.remover(_chave(session.sid))
+            if session.modified or session.sid is not None:
+                response.delete_cookie(nome, domain=domain, path=path)
+                response.vary.add('Cookie')
+            return
+
+        agora = time.time()
+        validade = self._validade(app)
+        renovar = session.expira is None or session.expira - agora < validade / 2
+        # Login (troca de usuário na sessão) ganha identificador novo: evita fixação de sessão
+        novo_sid = session.sid is None or session.get('usuario_id') != session.usuario_carregado
+        if not (session.modified or renovar or novo_sid):
+            return
+
+        if novo_sid:
+            if agora - self._ultima_limpeza > SEGUNDOS_LIMPEZA:
+                self._ultima_limpeza = agora
+                self.armazem.remover_expiradas(agora)
+            if session.sid is not None:
+                self.armazem.remover(_chave(session.sid))
+            session.sid = secrets.token_urlsafe(32)
+            session.usuario_carregado = session.get('usuario_id')
+        chave = _chave(session.sid)
+        expira = agora + validade if renovar or novo_sid else session.expira
+        self.armazem.salvar(chave, session.get('usuario_id'), dict(session), expira)
+
+        if novo_sid or renovar:
+            response.set_cookie(nome, session.sid, expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+            response.vary.add('Cookie')
+
+    def propagar(self, usuario_id, valores):
+        """Copia `valores` (ex.: preferências) para todas as sessões abertas do usuário."""
+        self.armazem.atualizar_usuario(usuario_id, valores)
+
+
+def main():
+    import tempfile
+    from types import SimpleNamespace
+
+    import banco
+    from flask import Flask
+
+    app = Flask(__name__)
+    app.secret_key = 'benchmark'
+    dados = {'usuario_id': 123456, 'usuario_nome': 'Maria Aparecida dos Santos',
+             'usuario_email': 'maria.aparecida@exemplo.com.br', 'pre_exam_mode': True,
+             'pre_exam_factor': 0.65, 'theme': 'dark', 'data_prova': '2026-11-30'}
+    assinado = app.session_interface.get_signing_serializer(app).dumps(dados)
+    print("Tamanho do cookie de sessão")
+    print(f"  cookie assinado (padrão do Flask): {len(assinado)} bytes")
+    print(f"  identificador opaco:               {len(secrets.token_urlsafe(32))} bytes")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'sessoes.db')
+        banco.migrar(caminho)
+        armazem = ArmazemSessoes(caminho)
+        n = 10000
+        sids = [secrets.token_urlsafe(32) for _ in range(n)]
+        expira = time.time() + timedelta(days=31).total_seconds()
+        inicio = time.perf_counter()
+        for i, sid in enumerate(sids):
+            armazem.salvar(_chave(sid), i, dict(dados, usuario_id=i), expira)
+        print(f"\nGravação de {n} sessões: {(time.perf_counter() - inicio) / n * 1e6:.1f} µs/sessão")
+
+        print(f"Abertura de sessão ({n} requisições)")
+        with app.app_context():
+            requisicoes = [SimpleNamespace(cookies={'session': sid}) for sid in sids]
+            interface = InterfaceSessoes(armazem)
+            inicio = time.perf_counter()
+            for requisicao in requisicoes:
+                sessao = interface.open_session(app, requisicao)
+            assert sessao['usuario_id'] == n - 1
+            print(f"  tabela sessoes:  {(time.perf_counter() - inicio) / n * 1e6:7.1f} µs/requisição")
+            requisicao = SimpleNamespace(cookies={'session': assinado})
+            inicio = time.perf_counter()
+            for _ in range(n):
+                app.session_interface.open_session(app, requisicao)
+            print(f"  cookie assinado: {(time.perf_counter() - inicio) / n * 1e6:7.1f} µs/requisição")
+        armazem.fechar()
+
+
+if __name__ == '__main__':
+    main()
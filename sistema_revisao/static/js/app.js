@@ -172,61 +172,199 @@ function enviarQualidade(quality) {
     // Interação detectada?
     const interagiu = !!flashcardViewed[revisaoAtual] || !!quizAnswered[revisaoAtual] || suggestedQuality !== null;
 
+    const avaliacao = { revisao_id: revisaoAtual, quality: quality, nivel_confianca: nivelConfianca, tempo_resposta: tempoResposta, interagiu: interagiu };
+
+    // Sem conexão: guarda a avaliação para sincronizar depois
+    if (!navigator.onLine) {
+        avaliarOffline(avaliacao);
+        return;
+    }
+
     // 1. Envia para o backend
     fetch(`/marcar/${revisaoAtual}`, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ quality: quality, nivel_confianca: nivelConfianca, tempo_resposta: tempoResposta, interagiu: interagiu })
+        body: JSON.stringify(avaliacao)
     })
     .then(response => response.json())
     .then(data => {
         if (data.status === 'ok') {
-            // 2. Fecha o modal
-            const modalElement = document.getElementById('modalAvaliacao');
-            const modal = bootstrap.Modal.getInstance(modalElement);
-            modal.hide();
-            
-            // 3. Mostra feedback com a próxima revisão
-            alert(`✅ Revisão concluída!\n\nPróxima revisão: ${data.proxima_revisao}\nIntervalo: ${data.intervalo_dias} dias`);
-            
-            // 4. Remove o card da tela com animação (usando data-revisao-id)
-            const card = document.querySelector(`.card[data-revisao-id="${revisaoAtual}"]`);
-            if (card) {
-                card.style.transition = 'all 0.3s ease';
-                card.style.opacity = '0';
-                card.style.transform = 'translateX(-100%)';
-            
-                setTimeout(() => {
-                    card.remove();
-                    
-                    // Recarrega se não houver mais revisões
-                    const cards = document.querySelectorAll('.card');
-                    if (cards.length === 0) {
-                        location.reload();
-                    }
-                }, 300);
-            }
-            
-            // 5. Limpeza de estado desta revisão
-            const doneId = revisaoAtual;
-            delete startTimes[doneId];
-            delete flashcardViewed[doneId];
-            delete quizAnswered[doneId];
-            revisaoAtual = null;
+            // 2-5. Fecha o modal, mostra a próxima revisão e remove o card
+            concluirCartaoNaTela(revisaoAtual, `✅ Revisão concluída!\n\nPróxima revisão: ${data.proxima_revisao}\nIntervalo: ${data.intervalo_dias} dias`);
+        } else if (data.status === 'ignorada') {
+            // Envio repetido (duplo clique, outra aba): a revisão já foi contada uma vez
+            concluirCartaoNaTela(revisaoAtual, 'Esta revisão já tinha sido concluída.');
         } else {
             alert('Erro: ' + data.mensagem);
         }
     })
     .catch(error => {
+        if (error instanceof TypeError) {
+            // Falha de rede: a conexão caiu no meio do envio
+            avaliarOffline(avaliacao);
+            return;
+        }
         console.error('Erro:', error);
         alert('Erro ao marcar como feita. Tente novamente.');
     });
 }
 
+// Fecha o modal, avisa o usuário e remove o card da tela
+function concluirCartaoNaTela(revisaoId, mensagem) {
+    const modalElement = document.getElementById('modalAvaliacao');
+    const modal = bootstrap.Modal.getInstance(modalElement);
+    if (modal) modal.hide();
+
+    alert(mensagem);
+
+    // Remove o card da tela com animação (usando data-revisao-id)
+    const card = document.querySelector(`.card[data-revisao-id="${revisaoId}"]`);
+    if (card) {
+        card.style.transition = 'all 0.3s ease';
+        card.style.opacity = '0';
+        card.style.transform = 'translateX(-100%)';
+    
+        setTimeout(() => {
+            card.remove();
+            
+            // Recarrega se não houver mais revisões (só com conexão)
+            const cards = document.querySelectorAll('.card');
+            if (cards.length === 0 && navigator.onLine) {
+                location.reload();
+            }
+        }, 300);
+    }
+    
+    // Limpeza de estado desta revisão
+    delete startTimes[revisaoId];
+    delete flashcardViewed[revisaoId];
+    delete quizAnswered[revisaoId];
+    revisaoAtual = null;
+}
+
+// Registra a avaliação no IndexedDB e agenda a sincronização
+function avaliarOffline(avaliacao) {
+    if (typeof registrarAvaliacaoOffline !== 'function') {
+        alert('Sem conexão. Tente novamente quando estiver online.');
+        return;
+    }
+    registrarAvaliacaoOffline(avaliacao)
+        .then(() => {
+            agendarSincronizacao();
+            concluirCartaoNaTela(avaliacao.revisao_id, '📴 Sem conexão: avaliação salva no aparelho e será enviada quando a conexão voltar.');
+        })
+        .catch(error => {
+            console.error('Erro:', error);
+            alert('Erro ao salvar a avaliação offline. Tente novamente.');
+        });
+}
+
+// Pede ao service worker para sincronizar quando houver conexão (Background Sync);
+// sem suporte, o evento 'online' da página faz o envio
+function agendarSincronizacao() {
+    if (!('serviceWorker' in navigator)) return;
+    navigator.serviceWorker.ready
+        .then(reg => reg.sync ? reg.sync.register(TAG_SYNC) : null)
+        .catch(() => {});
+}
+
+// Envia avaliações pendentes e renova os cartões guardados para uso offline
+function sincronizarERenovar() {
+    if (typeof sincronizarAvaliacoes !== 'function' || !navigator.onLine) return;
+    sincronizarAvaliacoes()
+        .then(() => prefetchCartoes())
+        .catch(error => console.warn('Sincronização offline adiada:', error));
+}
+
+function escaparHtml(texto) {
+    const div = document.createElement('div');
+    div.textContent = texto == null ? '' : String(texto);
+    return div.innerHTML;
+}
+
+// Sem conexão, a página vem do cache do service worker: esconde os cards já
+// avaliados offline e mostra os cartões guardados que venceram desde então
+function aplicarEstadoOffline() {
+    if (typeof avaliacoesPendentes !== 'function') return;
+    avaliacoesPendentes().then(pendentes => {
+        pendentes.forEach(a => {
+            const card = document.querySelector(`.card[data-revisao-id="${a.revisao_id}"]`);
+            if (card) card.remove();
+        });
+        if (navigator.onLine) return;
+
+        const container = document.getElementById('cartoes-offline');
+        if (!container) return;
+        const hoje = new Date().toISOString().slice(0, 10);
+        return listarCartoesOffline().then(cartoes => {
+            cartoes
+                .filter(c => c.data_revisao <= hoje && !document.querySelector(`.card[data-revisao-id="${c.revisao_id}"]`))
+                .forEach(c => container.insertAdjacentHTML('beforeend', renderizarCartaoOffline(c)));
+        });
+    }).catch(error => console.warn('IndexedDB indisponível:', error));
+}
+
+function renderizarCartaoOffline(c) {
+    const id = Number(c.revisao_id);
+    let conteudo = '';
+    if (c.tipo_conteudo === 'flashcard') {
+        conteudo = `
+            <div class="mt-2">
+                <div class="fw-semibold">Pergunta:</div>
+                <div class="text-body">${escaparHtml(c.pergunta)}</div>
+                <button class="btn btn-primary mt-2 w-100 btn-show-answer" type="button" data-bs-toggle="collapse" data-bs-target="#resp-off-${id}" data-revisao-id="${id}">
+                    <i class="bi bi-eye"></i> Mostrar resposta
+                </button>
+                <div class="collapse mt-2" id="resp-off-${id}">
+                    <div class="card card-body p-2">
+                        <div class="fw-semibold">Resposta:</div>
+                        <div class="text-body">${escaparHtml(c.resposta)}</div>
+                    </div>
+                </div>
+                <div class="d-flex gap-2 mt-2">
+                    <button class="btn btn-outline-danger w-50 btn-flash-suggest" type="button" data-revisao-id="${id}" data-quality="0"><i class="bi bi-x-circle"></i> Errei</button>
+                    <button class="btn btn-outline-success w-50 btn-flash-suggest" type="button" data-revisao-id="${id}" data-quality="4"><i class="bi bi-check-circle"></i> Acertei</button>
+                </div>
+            </div>`;
+    } else if (c.tipo_conteudo === 'quiz' && c.opcoes) {
+        const grupo = `quiz-off-${id}`;
+        const correta = escaparHtml(JSON.stringify(c.resposta));
+        conteudo = `
+            <div class="mt-2">
+                <div class="fw-semibold">Pergunta (Quiz):</div>
+                <div class="text-body">${escaparHtml(c.pergunta)}</div>
+                <div id="${grupo}" class="d-grid gap-2 mt-2">
+                    ${['A', 'B', 'C', 'D'].map(alt => `<button class="btn btn-outline-secondary btn-quiz" data-alt="${alt}" type="button" data-revisao-id="${id}" data-correta="${correta}" data-group-id="${grupo}">${alt}) ${escaparHtml(c.opcoes[alt])}</button>`).join('')}
+                </div>
+                <div id="${grupo}-fb" class="mt-2"></div>
+            </div>`;
+    }
+    return `
+        <div class="card study-card urgent-card mb-3" data-revisao-id="${id}">
+            <div class="card-body">
+                <h5 class="card-title mb-0 fw-bold">${escaparHtml(c.materia)}</h5>
+                <p class="card-text text-muted mb-1">${escaparHtml(c.topico)} - ${escaparHtml(c.tipo)}</p>
+                ${conteudo}
+                <span class="badge bg-secondary"><i class="bi bi-wifi-off"></i> Offline</span>
+                <button type="button" class="btn btn-success text-white w-100 mt-2 btn-marcar" data-revisao-id="${id}" data-modo="${escaparHtml(c.tipo_conteudo)}">
+                    <i class="bi bi-check-circle-fill me-2"></i> Marcar como Feita
+                </button>
+            </div>
+        </div>`;
+}
+
 // Adicionar event listeners quando o DOM carregar
 document.addEventListener('DOMContentLoaded', function() {
+    // Modo offline (PWA): service worker, cartões guardados e sincronização
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register('/sw.js').catch(error => console.warn('Service worker não registrado:', error));
+    }
+    aplicarEstadoOffline();
+    sincronizarERenovar();
+    window.addEventListener('online', sincronizarERenovar);
+
     // Listener para formulário de cadastro
     const form = document.querySelector('form[action="/cadastrar"]');
     if (form) {
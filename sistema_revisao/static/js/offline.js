@@ -0,0 +1,117 @@
+// Modo offline: cartões pré-carregados e avaliações pendentes no IndexedDB.
+// Usado pela página (app.js) e pelo service worker (sw.js, via importScripts),
+// por isso não acessa o DOM.
+const OFFLINE_DB = 'sm2track-offline';
+const OFFLINE_DB_VERSAO = 1;
+const CARTOES_PREFETCH = 50;  // próximos cartões guardados para revisar sem conexão
+const LOTE_SYNC = 100;        // avaliações enviadas por requisição de sincronização
+const TAG_SYNC = 'sincronizar-avaliacoes';
+
+function abrirBancoOffline() {
+    return new Promise((resolve, reject) => {
+        const req = indexedDB.open(OFFLINE_DB, OFFLINE_DB_VERSAO);
+        req.onupgradeneeded = () => {
+            const db = req.result;
+            if (!db.objectStoreNames.contains('cartoes')) {
+                db.createObjectStore('cartoes', { keyPath: 'revisao_id' });
+            }
+            if (!db.objectStoreNames.contains('avaliacoes')) {
+                db.createObjectStore('avaliacoes', { keyPath: 'id_operacao' });
+            }
+        };
+        req.onsuccess = () => resolve(req.result);
+        req.onerror = () => reject(req.error);
+    });
+}
+
+// Executa `operacao(store)` em uma transação; resolve com o resultado da requisição retornada (se houver)
+function transacaoOffline(nomeStore, modo, operacao) {
+    return abrirBancoOffline().then(db => new Promise((resolve, reject) => {
+        const tx = db.transaction(nomeStore, modo);
+        const req = operacao(tx.objectStore(nomeStore));
+        tx.oncomplete = () => {
+            db.close();
+            resolve(req ? req.result : undefined);
+        };
+        tx.onerror = () => {
+            db.close();
+            reject(tx.error);
+        };
+    }));
+}
+
+function gerarIdOperacao() {
+    if (self.crypto && self.crypto.randomUUID) return self.crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+// Baixa os próximos N cartões (com pergunta/resposta/opções) e substitui os guardados
+function prefetchCartoes(n = CARTOES_PREFETCH) {
+    return fetch(`/api/fila/offline?n=${n}`, { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.cartoes) return 0;
+            return avaliacoesPendentes().then(pendentes => {
+                // Cartões já avaliados offline e ainda não sincronizados ficam de fora
+                const avaliados = new Set(pendentes.map(a => a.revisao_id));
+                return transacaoOffline('cartoes', 'readwrite', store => {
+                    store.clear();
+                    data.cartoes.filter(c => !avaliados.has(c.revisao_id)).forEach(c => store.put(c));
+                });
+            }).then(() => data.cartoes.length);
+        });
+}
+
+function listarCartoesOffline() {
+    return transacaoOffline('cartoes', 'readonly', store => store.getAll());
+}
+
+function avaliacoesPendentes() {
+    return transacaoOffline('avaliacoes', 'readonly', store => store.getAll());
+}
+
+// Guarda uma avaliação feita sem conexão e tira o cartão da fila local
+function registrarAvaliacaoOffline(avaliacao) {
+    const registro = Object.assign({
+        id_operacao: gerarIdOperacao(),
+        avaliado_em: new Date().toISOString()
+    }, avaliacao);
+    return transacaoOffline('avaliacoes', 'readwrite', store => { store.put(registro); })
+        .then(() => transacaoOffline('cartoes', 'readwrite', store => { store.delete(registro.revisao_id); }))
+        .then(() => registro);
+}
+
+// Envia as avaliações pendentes em lotes. O servidor é idempotente por
+// id_operacao, então um lote reenviado (ex.: resposta perdida) não duplica nada.
+let sincronizacaoEmAndamento = null;
+function sincronizarAvaliacoes() {
+    if (sincronizacaoEmAndamento) return sincronizacaoEmAndamento;
+
+    const enviarLote = (enviadas) => avaliacoesPendentes().then(pendentes => {
+        if (!pendentes.length) return enviadas;
+        const lote = pendentes.slice(0, LOTE_SYNC);
+        return fetch('/api/sync/avaliacoes', {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ avaliacoes: lote })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.status !== 'ok') throw new Error(data.mensagem || 'Falha na sincronização');
+            const processadas = data.resultados.map(r => r.id_operacao);
+            return transacaoOffline('avaliacoes', 'readwrite', store => {
+                processadas.forEach(id => store.delete(id));
+            }).then(() => enviarLote(enviadas + processadas.length));
+        });
+    });
+
+    sincronizacaoEmAndamento = enviarLote(0).finally(() => { sincronizacaoEmAndamento = null; });
+    return sincronizacaoEmAndamento;
+}
+
+// Remove os dados offline (ao sair da conta)
+function limparDadosOffline() {
+    return transacaoOffline('cartoes', 'readwrite', store => { store.clear(); })
+        .then(() => transacaoOffline('avaliacoes', 'readwrite', store => { store.clear(); }));
+}
@@ -0,0 +1,103 @@
+// Service worker do SM2track (servido em /sw.js).
+// - Guarda o app shell para abrir a página de revisões sem conexão
+// - Mantém os próximos cartões no IndexedDB e sincroniza as avaliações offline
+importScripts('/static/js/offline.js');
+
+const CACHE_SHELL = 'sm2track-shell-v1';
+const SHELL_LOCAL = [
+    '/',
+    '/static/js/app.js',
+    '/static/js/offline.js',
+    '/static/manifest.json',
+    '/static/favicon.ico',
+    '/static/favicon-32x32.png',
+    '/static/favicon-16x16.png',
+    '/static/apple-touch-icon.png'
+];
+const SHELL_CDN = [
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js',
+    'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.1/font/bootstrap-icons.css'
+];
+
+self.addEventListener('install', (event) => {
+    event.waitUntil(
+        caches.open(CACHE_SHELL).then(cache => Promise.all([
+            // A página inicial só é guardada se o usuário estiver logado (sem redirect)
+            ...SHELL_LOCAL.map(url => fetch(url, { credentials: 'same-origin' }).then(response => {
+                if (response.ok && !response.redirected) return cache.put(url, response);
+            }).catch(() => {})),
+            ...SHELL_CDN.map(url => cache.add(new Request(url, { mode: 'no-cors' })).catch(() => {}))
+        ])).then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then(nomes => Promise.all(nomes.filter(n => n !== CACHE_SHELL).map(n => caches.delete(n))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+
+    if (url.origin === self.location.origin) {
+        // APIs e gráficos sempre vão à rede (cache próprio no servidor)
+        if (url.pathname.startsWith('/api/') || url.pathname.startsWith('/grafico/')) return;
+
+        if (url.pathname === '/logout') {
+            // Dados do usuário não ficam no aparelho depois de sair
+            event.waitUntil(caches.delete(CACHE_SHELL).then(() => limparDadosOffline()).catch(() => {}));
+            return;
+        }
+
+        if (request.mode === 'navigate') {
+            // Páginas: rede primeiro; sem conexão, a última versão guardada
+            event.respondWith(
+                fetch(request).then(response => {
+                    if (url.pathname === '/' && response.ok && !response.redirected) {
+                        const copia = response.clone();
+                        caches.open(CACHE_SHELL).then(cache => cache.put('/', copia));
+                    }
+                    return response;
+                }).catch(() => caches.match(request).then(r => r || caches.match('/')))
+            );
+            return;
+        }
+
+        if (!url.pathname.startsWith('/static/')) return;
+    } else if (!SHELL_CDN.includes(request.url)) {
+        return;
+    }
+
+    // Arquivos estáticos: cache primeiro
+    event.respondWith(
+        caches.match(request).then(guardada => guardada || fetch(request).then(response => {
+            if (response.ok || response.type === 'opaque') {
+                const copia = response.clone();
+                caches.open(CACHE_SHELL).then(cache => cache.put(request, copia));
+            }
+            return response;
+        }))
+    );
+});
+
+// Background Sync: o navegador chama quando a conexão volta
+self.addEventListener('sync', (event) => {
+    if (event.tag === TAG_SYNC) {
+        event.waitUntil(sincronizarAvaliacoes().then(() => prefetchCartoes()));
+    }
+});
+
+self.addEventListener('message', (event) => {
+    const dados = event.data || {};
+    if (dados.tipo === 'prefetch') {
+        event.waitUntil(prefetchCartoes(dados.n || CARTOES_PREFETCH).catch(() => {}));
+    } else if (dados.tipo === 'sincronizar') {
+        event.waitUntil(sincronizarAvaliacoes().then(() => prefetchCartoes()).catch(() => {}));
+    }
+});